@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 from auth_app.models import Account, Organization, Transaction, UserStat
 from utils.current_period import get_current_period
 from utils.custom_permissions import IsSystemAdmin
+from utils.ledger import write_ledger_entries
 
 User = get_user_model()
 
@@ -29,6 +30,7 @@ class EmitDistributionThanks(APIView):
             user_stats = UserStat.objects.filter(period=period, user_id__in=users_pk)
             with transaction.atomic():
                 emit_counter = 0
+                ledger_entries = []
                 for account in accounts:
                     user = users.get(pk=account.owner_id)
                     emit_transaction = Transaction.objects.create(
@@ -47,11 +49,14 @@ class EmitDistributionThanks(APIView):
                     account.amount += emit_transaction.amount
                     account.save(update_fields=['amount'])
                     emit_counter += emit_transaction.amount
+                    ledger_entries.append((account.pk, emit_transaction.amount, emit_transaction.pk))
+                    ledger_entries.append((emit_account.pk, -emit_transaction.amount, emit_transaction.pk))
                     stat = user_stats.get(user_id=user.pk)
                     stat.distr_initial = emit_transaction.amount
                     stat.save(update_fields=['distr_initial'])
                 emit_account.amount -= emit_counter
                 emit_account.save(update_fields=['amount'])
+                write_ledger_entries(ledger_entries)
                 if emit_counter:
                     return Response(status=status.HTTP_201_CREATED)
                 return Response(status=status.HTTP_200_OK)
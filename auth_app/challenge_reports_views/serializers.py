@@ -3,17 +3,24 @@ from datetime import datetime
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction as tr
+from django.db.models import F
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from auth_app.challenges_views.service import complete_challenge
 from auth_app.comments_views.service import create_comment
-from auth_app.models import (ChallengeReport, Event, EventTypes,
-                             ChallengeParticipant, Account, Transaction, UserStat)
+from auth_app.models import (ChallengeReport, Event, Challenge,
+                             ChallengeParticipant, Account, Transaction)
+from auth_app.service import change_accounts_amounts, change_user_stat
 from auth_app.tasks import send_multiple_notifications
-from utils.challenges_logic import check_if_new_reports_exists
+from utils.challenge_algos import get_distribution_algorithm
+from utils.challenges_logic import (change_challenge_reports_counters, set_challenge_user_status,
+                                   get_challenge_prize)
 from utils.crop_photos import crop_image
 from utils.current_period import get_current_period
 from utils.fcm_services import get_fcm_tokens_list
+from utils.event_types import get_event_type, WINNER_EVENT_TYPE
+from utils.feed import create_feed_items
 from utils.handle_image import change_filename
 from utils.notification_services import get_notification_message_for_challenge_author_get_report, create_notification, \
     get_notification_message_for_challenge_winner
@@ -62,6 +69,9 @@ class CreateChallengeReportSerializer(serializers.ModelSerializer):
                 state='S',
                 photo=photo
             )
+            change_challenge_reports_counters(challenge.pk, new_state=challenge_report_instance.state)
+            set_challenge_user_status(challenge.pk, user.pk, can_send_report=False,
+                                      report_state=challenge_report_instance.state)
             if challenge_report_instance.photo.name is not None:
                 challenge_report_instance.photo.name = change_filename(challenge_report_instance.photo.name)
                 challenge_report_instance.save(update_fields=['photo'])
@@ -106,116 +116,100 @@ class CheckChallengeReportSerializer(serializers.ModelSerializer):
         fields = ['state', 'text']
 
     def validate(self, validated_data):
-
         state = validated_data['state']
-        text = self.instance.text
-        reason = validated_data['text']
-        validated_data['text'] = text
         challenge_report = self.instance
-        user_participant = challenge_report.participant.user_participant
         reviewer = self.context['request'].user
         challenge_creator = challenge_report.challenge.creator
 
+        # состояние отчёта и челленджа повторно проверяется под блокировкой в update()
         if challenge_report.state in ['W', 'D']:
             raise ValidationError("Отчет уже отклонен или уже выдана награда")
         if reviewer != challenge_creator:
             raise ValidationError("Отправивший запрос не является создателем челленджа")
         if 'C' in challenge_report.challenge.states and state == 'W':
             raise ValidationError("Челлендж уже завершен")
-        if (reason is not None and reason != '') and state == 'D':
-            content_type = "ChallengeReport"
-            create_comment(content_type, challenge_report.id, reason, None, reviewer, None, None, None, None, None)
-
-        if state == 'W':
-            with tr.atomic():
-                challenge = challenge_report.challenge
-                organization_id = challenge.creator.profile.organization_id
-                winners_count = challenge.winners_count
-                challenge.winners_count = winners_count + 1
-                challenge.save(update_fields=["winners_count"])
-
-                if challenge.parameters[0]["id"] == 2:
-                    max_winners = challenge.parameters[0]["value"]
-                    prize = challenge.parameters[1]["value"]
-                else:
-                    max_winners = challenge.parameters[1]["value"]
-                    prize = challenge.parameters[0]["value"]
-
-                participant = ChallengeParticipant.objects.get(user_participant=user_participant, challenge=challenge)
-                participant.total_received += prize
-                participant.save(update_fields=['total_received'])
-
-                sender_account = Account.objects.get(challenge=challenge, account_type='D')
-                sender_account.amount -= prize
-                recipient_account = Account.objects.get(owner=user_participant, account_type='I')
-                recipient_account.amount += prize
-
-                current_period = get_current_period(organization_id)
-                transaction = Transaction.objects.create(
-                    is_anonymous=False,
-                    sender_account=sender_account,
-                    from_challenge=challenge,
-                    recipient_account=recipient_account,
-                    amount=prize,
-                    transaction_class='W',
-                    status='R',
-                    period=current_period,
-                    challenge_report=self.instance
-                )
-                Event.objects.create(
-                    event_type=EventTypes.objects.get(name='Новый победитель челленджа'),
-                    event_object_id=self.instance.pk,
-                    object_selector='R',
-                    time=datetime.now(),
-                    scope_id=organization_id
-                )
+        if (state == 'W' and
+                get_distribution_algorithm(challenge_report.challenge.distribution_type)['reward_time'] != 'ongoing'):
+            raise ValidationError("Награды в этом челлендже выдаются при подведении итогов")
+        return {'state': state, 'text': validated_data.get('text')}
+
+    def update(self, instance, validated_data):
+        """
+        Проверка отчёта в одной транзакции: блокируется челлендж, затем отчёт - в том же порядке,
+        что и при проверке нескольких отчётов, - поэтому награда не может быть выдана дважды
+        """
+        state = validated_data['state']
+        reason = validated_data.get('text')
+        reviewer = self.context['request'].user
+        with tr.atomic():
+            challenge = Challenge.objects.select_for_update().get(pk=instance.challenge_id)
+            challenge_report = (ChallengeReport.objects
+                                .select_for_update(of=('self',))
+                                .select_related('participant__user_participant')
+                                .get(pk=instance.pk))
+            if challenge_report.state in ['W', 'D']:
+                raise ValidationError("Отчет уже отклонен или уже выдана награда")
+            if state == 'W':
+                if 'C' in challenge.states:
+                    raise ValidationError("Челлендж уже завершен")
+                self.award_winner(challenge, challenge_report)
+            if reason and state == 'D':
+                create_comment("ChallengeReport", challenge_report.id, reason, None, reviewer,
+                               None, None, None, None, None)
+
+            old_state = challenge_report.state
+            challenge_report.state = state
+            challenge_report.save(update_fields=['state', 'updated_at'])
+            change_challenge_reports_counters(challenge.pk, old_state, state)
+            set_challenge_user_status(challenge.pk, challenge_report.participant.user_participant_id,
+                                      report_state=state)
+        return challenge_report
+
+    def award_winner(self, challenge, challenge_report):
+        user_participant = challenge_report.participant.user_participant
+        organization_id = challenge.creator.profile.organization_id
+        winners_count = challenge.winners_count
+        challenge.winners_count = winners_count + 1
+        challenge.save(update_fields=["winners_count"])
+
+        max_winners, prize = get_challenge_prize(challenge)
+
+        ChallengeParticipant.objects.filter(user_participant=user_participant, challenge=challenge).update(
+            total_received=F('total_received') + prize)
+
+        sender_account = Account.objects.only('id').get(challenge=challenge, account_type='D')
+        recipient_account = Account.objects.only('id').get(owner=user_participant, account_type='I',
+                                                           challenge_id=None)
+
+        current_period = get_current_period(organization_id)
+        transaction = Transaction.objects.create(
+            is_anonymous=False,
+            sender_account=sender_account,
+            from_challenge=challenge,
+            recipient_account=recipient_account,
+            amount=prize,
+            transaction_class='W',
+            status='R',
+            period=current_period,
+            challenge_report=challenge_report
+        )
+        event = Event.objects.create(
+            event_type=get_event_type(WINNER_EVENT_TYPE),
+            event_object_id=challenge_report.pk,
+            object_selector='R',
+            time=datetime.now(),
+            scope_id=organization_id
+        )
+        create_feed_items([event])
+
+        self.create_and_send_winner_report_notifications(challenge, challenge_report, prize, user_participant)
+
+        balances = change_accounts_amounts({sender_account.pk: -prize, recipient_account.pk: prize},
+                                           transaction)
+        change_user_stat(user_participant.pk, current_period, awarded_from_challenges=prize)
 
-                self.create_and_send_winner_report_notifications(challenge, challenge_report, prize, user_participant)
-
-                sender_account.transaction = transaction
-                sender_account.save(update_fields=['amount', 'transaction'])
-                recipient_account.transaction = transaction
-                recipient_account.save(update_fields=['amount', 'transaction'])
-
-                receiver_user_stat = UserStat.objects.get(user=user_participant, period=current_period)
-                receiver_user_stat.awarded_from_challenges += prize
-                receiver_user_stat.save(update_fields=['awarded_from_challenges'])
-
-                if max_winners == winners_count + 1:
-                    challenge.states = ['P', 'C']
-                    challenge.save(update_fields=["states"])
-
-                    if sender_account.amount > 0:
-                        remain = sender_account.amount
-                        sender_account.amount -= remain
-                        sender_account.save(update_fields=['amount'])
-                        recipient_account = Transaction.objects.get(to_challenge=challenge).sender_account
-                        transaction = Transaction.objects.create(
-                            is_anonymous=False,
-                            sender_account=sender_account,
-                            from_challenge=challenge,
-                            recipient_account=recipient_account,
-                            amount=remain,
-                            transaction_class='F',
-                            status='R',
-                            period=current_period,
-                        )
-
-                        participant = ChallengeParticipant.objects.get(user_participant=reviewer, challenge=challenge)
-                        participant.total_received += remain
-                        participant.save(update_fields=['total_received'])
-
-                        user_stat = UserStat.objects.get(user=reviewer, period=current_period)
-                        user_stat.returned_from_challenges += remain
-                        user_stat.save(update_fields=['returned_from_challenges'])
-
-                        recipient_account.transaction = transaction
-                        recipient_account.amount += remain
-                        recipient_account.save(update_fields=['amount', 'transaction'])
-
-        new_reports_exists = check_if_new_reports_exists(reviewer)
-        validated_data['new_reports_exists'] = new_reports_exists
-        return {"state": state, 'new_reports_exists': new_reports_exists}
+        if max_winners == winners_count + 1:
+            complete_challenge(challenge, current_period, sender_account, balances[sender_account.pk])
 
     @staticmethod
     def create_and_send_winner_report_notifications(challenge, challenge_report, prize, user_participant):
@@ -0,0 +1,304 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import transaction as tr
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from auth_app.challenges_views.service import complete_challenge
+from auth_app.comments_views.service import create_comment
+from auth_app.models import (Account, Challenge, ChallengeParticipant, ChallengeReport, ChallengeUserStatus, Event,
+                             Notification, ReportTypes, Transaction, UserStat)
+from auth_app.service import InsufficientFundsError
+from auth_app.tasks import send_multiple_notifications
+from utils.challenge_algos import calculate_awards, get_distribution_algorithm
+from utils.challenge_list_cache import invalidate_challenge_list_cache
+from utils.challenges_logic import check_if_new_reports_exists, get_challenge_prize, get_reports_counters_deltas
+from utils.current_period import get_current_period
+from utils.event_types import get_event_type, WINNER_EVENT_TYPE
+from utils.fcm_services import get_users_tokens_map
+from utils.feed import create_feed_items
+from utils.ledger import write_ledger_entries
+from utils.notification_services import get_notification_message_for_challenge_winner
+from utils.timelines import push_transactions_to_timelines
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+MAX_REVIEWED_REPORTS = 500
+
+
+def review_challenge_reports(challenge_id: int, reviewer: User, reviews: List[Dict]) -> Dict:
+    """
+    Проверка организатором нескольких отчётов челленджа за один запрос.
+    reviews - [{'id': id отчёта, 'state': новое состояние, 'text': причина отклонения}].
+    Фонд челленджа блокируется один раз, награды победителям проводятся транзакциями,
+    событиями и уведомлениями, созданными пачкой; счётчики челленджа меняются одним UPDATE
+    """
+    reviews = validate_reviews(reviews)
+    with tr.atomic():
+        challenge = lock_reviewed_challenge(challenge_id, reviewer)
+        reports = list(ChallengeReport.objects
+                       .select_for_update(of=('self',))
+                       .select_related('participant')
+                       .filter(challenge_id=challenge.pk, pk__in=reviews.keys())
+                       .order_by('pk'))
+        if len(reports) != len(reviews):
+            missing = sorted(set(reviews) - {report.pk for report in reports})
+            raise ValidationError(f"Отчёты с id {missing} не найдены в этом челлендже")
+        if any(report.state in ['W', 'D'] for report in reports):
+            raise ValidationError("Отчет уже отклонен или уже выдана награда")
+
+        winners_reports = [report for report in reports if reviews[report.pk]['state'] == 'W']
+        max_winners, prize = get_challenge_prize(challenge)
+        if winners_reports:
+            if 'C' in challenge.states:
+                raise ValidationError("Челлендж уже завершен")
+            if get_distribution_algorithm(challenge.distribution_type)['reward_time'] != 'ongoing':
+                raise ValidationError("Награды в этом челлендже выдаются при подведении итогов")
+            if challenge.winners_count + len(winners_reports) > max_winners:
+                raise ValidationError(f"Осталось мест победителей: {max_winners - challenge.winners_count}")
+
+        transitions = []
+        now = timezone.now()
+        for report in reports:
+            transitions.append((report.state, reviews[report.pk]['state']))
+            report.state = reviews[report.pk]['state']
+            report.updated_at = now
+        ChallengeReport.objects.bulk_update(reports, ['state', 'updated_at'])
+
+        counters = get_reports_counters_deltas(transitions)
+        if winners_reports:
+            counters['winners_count'] = len(winners_reports)
+        if counters:
+            Challenge.objects.filter(pk=challenge.pk).update(
+                **{field: F(field) + delta for field, delta in counters.items()})
+
+        reports_by_state = {}
+        for report in reports:
+            reports_by_state.setdefault(report.state, []).append(report.participant.user_participant_id)
+        for state, users_ids in reports_by_state.items():
+            (ChallengeUserStatus.objects
+             .filter(challenge_id=challenge.pk, user_id__in=users_ids)
+             .update(report_state=state))
+
+        for report in reports:
+            reason = reviews[report.pk].get('text')
+            if reason and report.state == 'D':
+                create_comment("ChallengeReport", report.pk, reason, None, reviewer, None, None, None, None, None)
+
+        if winners_reports:
+            award_challenge_winners(challenge, [(report, prize) for report in winners_reports],
+                                    complete=challenge.winners_count + len(winners_reports) == max_winners)
+        invalidate_challenge_list_cache(challenge.organization_id)
+
+    return {
+        'reports': [{'id': report.pk, 'state': report.state} for report in reports],
+        'new_reports_exists': check_if_new_reports_exists(reviewer.pk)
+    }
+
+
+def lock_reviewed_challenge(challenge_id: int, reviewer: User) -> Challenge:
+    challenge = Challenge.objects.select_for_update().filter(pk=challenge_id).first()
+    if challenge is None:
+        raise ValidationError("Челлендж не найден")
+    if reviewer.pk != challenge.creator_id:
+        raise ValidationError("Отправивший запрос не является создателем челленджа")
+    return challenge
+
+
+def finalize_challenge(challenge_id: int, reviewer: User) -> Dict:
+    """
+    Подведение итогов челленджа организатором: выдача наград по алгоритму распределения и завершение
+    """
+    with tr.atomic():
+        challenge = lock_reviewed_challenge(challenge_id, reviewer)
+        if 'C' in challenge.states:
+            raise ValidationError("Челлендж уже завершен")
+        awarded_amount = distribute_challenge_rewards(challenge)
+    return {'challenge_id': challenge_id, 'awarded_reports': awarded_amount}
+
+
+def validate_reviews(reviews: List[Dict]) -> Dict[int, Dict]:
+    if not isinstance(reviews, list) or not reviews:
+        raise ValidationError("Необходимо передать список отчётов")
+    if len(reviews) > MAX_REVIEWED_REPORTS:
+        raise ValidationError(f"За один запрос можно проверить не больше {MAX_REVIEWED_REPORTS} отчётов")
+    validated_reviews = {}
+    for review in reviews:
+        if not isinstance(review, dict):
+            raise ValidationError("Некорректный формат списка отчётов")
+        try:
+            report_id = int(review.get('id'))
+        except (TypeError, ValueError):
+            raise ValidationError("Передан некорректный id отчёта")
+        if review.get('state') not in ReportTypes.values:
+            raise ValidationError(f"Передано некорректное состояние отчёта с id {report_id}")
+        if report_id in validated_reviews:
+            raise ValidationError(f"Отчёт с id {report_id} передан несколько раз")
+        validated_reviews[report_id] = review
+    return validated_reviews
+
+
+def distribute_challenge_rewards(challenge: Challenge) -> int:
+    """
+    Подведение итогов челленджа: награды всем подтверждённым и ещё не награждённым отчётам
+    вычисляются одним проходом алгоритмом распределения челленджа (utils.challenge_algos) и выдаются
+    пачкой, после чего челлендж завершается с возвратом остатка фонда.
+    Вызывается в транзакции под блокировкой строки челленджа. Возвращает количество наград
+    """
+    reports = list(ChallengeReport.objects
+                   .select_for_update(of=('self',))
+                   .select_related('participant')
+                   .filter(challenge_id=challenge.pk, state='A')
+                   .order_by('updated_at', 'pk'))
+    fund_account = (Account.objects
+                    .select_for_update()
+                    .only('id', 'amount')
+                    .get(challenge=challenge, account_type='D'))
+    amounts = calculate_awards(challenge.distribution_type, challenge.parameters, int(fund_account.amount),
+                               [report.points for report in reports], challenge.winners_count)
+    awards = [(report, amount) for report, amount in zip(reports, amounts) if amount > 0]
+    if not awards:
+        complete_challenge(challenge, fund_account=fund_account)
+        return 0
+
+    now = timezone.now()
+    for report, amount in awards:
+        report.state = 'W'
+        report.updated_at = now
+    ChallengeReport.objects.bulk_update([report for report, amount in awards], ['state', 'updated_at'])
+    Challenge.objects.filter(pk=challenge.pk).update(winners_count=F('winners_count') + len(awards))
+    (ChallengeUserStatus.objects
+     .filter(challenge_id=challenge.pk, user_id__in=[report.participant.user_participant_id for report, _ in awards])
+     .update(report_state='W'))
+    award_challenge_winners(challenge, awards, complete=True, fund_account=fund_account)
+    invalidate_challenge_list_cache(challenge.organization_id)
+    return len(awards)
+
+
+def award_challenge_winners(challenge: Challenge, awards: List[Tuple[ChallengeReport, int]], complete: bool,
+                            fund_account: Optional[Account] = None) -> None:
+    """
+    Выдача наград победителям из фонда челленджа фиксированным количеством запросов.
+    awards - [(отчёт, размер награды)]. Списание с фонда - одним условным UPDATE, зачисления,
+    суммы участников и статистика - через bulk_update с F-выражениями.
+    Вызывается под блокировкой строки челленджа
+    """
+    organization_id = challenge.organization_id
+    current_period = get_current_period(organization_id)
+    if fund_account is None:
+        fund_account = (Account.objects
+                        .select_for_update()
+                        .only('id', 'amount')
+                        .get(challenge=challenge, account_type='D'))
+    winners_ids = {report.participant.user_participant_id for report, _ in awards}
+    recipient_accounts = {account.owner_id: account
+                          for account in Account.objects.filter(owner_id__in=winners_ids, account_type='I',
+                                                                challenge_id=None)
+                          .only('id', 'owner_id')}
+    if len(recipient_accounts) != len(winners_ids):
+        raise ValidationError("Не найдены счета победителей")
+
+    transactions = Transaction.objects.bulk_create([
+        Transaction(
+            is_anonymous=False,
+            sender_account=fund_account,
+            from_challenge=challenge,
+            recipient_account=recipient_accounts[report.participant.user_participant_id],
+            amount=amount,
+            transaction_class='W',
+            status='R',
+            period=current_period,
+            challenge_report=report
+        ) for report, amount in awards])
+
+    total = sum(amount for _, amount in awards)
+    if not (Account.objects
+            .filter(pk=fund_account.pk, amount__gte=total)
+            .update(amount=F('amount') - total, transaction=transactions[-1])):
+        logger.info(f"Недостаточно средств в фонде челленджа с id {challenge.pk} для выдачи {total}")
+        raise InsufficientFundsError()
+    recipients_deltas = {}
+    recipients_last_transaction = {}
+    ledger_entries = []
+    for _transaction in transactions:
+        recipient_account = _transaction.recipient_account
+        recipients_deltas[recipient_account] = recipients_deltas.get(recipient_account, 0) + _transaction.amount
+        recipients_last_transaction[recipient_account] = _transaction
+        ledger_entries.append((fund_account.pk, -_transaction.amount, _transaction.pk))
+        ledger_entries.append((recipient_account.pk, _transaction.amount, _transaction.pk))
+    for account, delta in recipients_deltas.items():
+        account.amount = F('amount') + delta
+        account.transaction = recipients_last_transaction[account]
+    Account.objects.bulk_update(recipients_deltas.keys(), fields=['amount', 'transaction'])
+    write_ledger_entries(ledger_entries)
+    push_transactions_to_timelines(transactions)
+
+    participants_deltas = {}
+    users_deltas = {}
+    for report, amount in awards:
+        participants_deltas[report.participant] = participants_deltas.get(report.participant, 0) + amount
+        user_id = report.participant.user_participant_id
+        users_deltas[user_id] = users_deltas.get(user_id, 0) + amount
+    for participant, delta in participants_deltas.items():
+        participant.total_received = F('total_received') + delta
+    ChallengeParticipant.objects.bulk_update(participants_deltas.keys(), fields=['total_received'])
+    user_stats = list(UserStat.objects.filter(user_id__in=users_deltas.keys(), period=current_period)
+                      .only('id', 'user_id'))
+    for user_stat in user_stats:
+        user_stat.awarded_from_challenges = F('awarded_from_challenges') + users_deltas[user_stat.user_id]
+    UserStat.objects.bulk_update(user_stats, fields=['awarded_from_challenges'])
+
+    events = Event.objects.bulk_create([
+        Event(
+            event_type=get_event_type(WINNER_EVENT_TYPE),
+            event_object_id=report.pk,
+            object_selector='R',
+            time=datetime.now(),
+            scope_id=organization_id
+        ) for report, _ in awards])
+    create_feed_items(events)
+    create_and_send_winners_notifications(challenge, awards)
+
+    if complete:
+        complete_challenge(challenge, current_period, fund_account, fund_account.amount - total)
+
+
+def create_and_send_winners_notifications(challenge: Challenge, awards: List[Tuple[ChallengeReport, int]]) -> None:
+    """
+    Уведомления победителям: записи создаются одним запросом,
+    push-уведомления отправляются через очередь после фиксации транзакции в БД
+    """
+    notification_theme, notification_text = get_notification_message_for_challenge_winner(challenge.name)
+    tokens = get_users_tokens_map({report.participant.user_participant_id for report, _ in awards})
+    notifications = []
+    pushes = []
+    for report, amount in awards:
+        user_id = report.participant.user_participant_id
+        notification_data = {
+            "challenge_id": challenge.pk,
+            "challenge_name": challenge.name,
+            "challenge_report_id": report.pk,
+            "prize": amount
+        }
+        notifications.append(Notification(
+            user_id=user_id,
+            object_id=report.pk,
+            type='W',
+            theme=notification_theme,
+            text=notification_text,
+            data=notification_data,
+            from_user=challenge.creator_id
+        ))
+        user_tokens = tokens.get(user_id)
+        if user_tokens:
+            pushes.append((user_tokens, {key: str(value) for key, value in notification_data.items()}))
+    Notification.objects.bulk_create(notifications)
+    for user_tokens, push_data in pushes:
+        tr.on_commit(
+            lambda user_tokens=user_tokens, push_data=push_data:
+            send_multiple_notifications.delay(notification_theme, notification_text, user_tokens, push_data))
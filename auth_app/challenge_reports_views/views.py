@@ -9,6 +9,7 @@ from auth_app.models import ChallengeReport
 from utils.challenges_logic import check_if_new_reports_exists
 from utils.query_debugger import query_debugger
 from .serializers import ChallengeReportSerializer
+from .service import review_challenge_reports, finalize_challenge
 from .serializers import CreateChallengeReportSerializer, CheckChallengeReportSerializer
 
 
@@ -39,6 +40,34 @@ class CheckChallengeReportView(UpdateAPIView):
                         status=status.HTTP_400_BAD_REQUEST)
 
 
+class ReviewChallengeReportsView(APIView):
+    """
+    Проверка организатором нескольких отчётов челленджа за один запрос
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [authentication.SessionAuthentication,
+                              authentication.TokenAuthentication]
+
+    @classmethod
+    def post(cls, request, *args, **kwargs):
+        response = review_challenge_reports(kwargs.get('pk'), request.user, request.data.get('reports'))
+        return Response(response)
+
+
+class FinalizeChallengeView(APIView):
+    """
+    Подведение итогов челленджа: выдача наград по алгоритму распределения и завершение
+    """
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [authentication.SessionAuthentication,
+                              authentication.TokenAuthentication]
+
+    @classmethod
+    def post(cls, request, *args, **kwargs):
+        response = finalize_challenge(kwargs.get('pk'), request.user)
+        return Response(response)
+
+
 class ChallengeReportDetailAPIView(APIView):
     """
     Возвращает детали отчета
@@ -1,21 +1,34 @@
 import logging
 from datetime import datetime
+from typing import Optional, Tuple
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction as tr
+from django.db.models import F
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
-from auth_app.models import (Account, Event, Challenge, UserStat,
-                             ChallengeParticipant, Transaction,
-                             EventTypes)
+from auth_app.models import (Account, Event, Challenge, ChallengeState,
+                             ChallengeParticipant, Transaction)
+from auth_app.service import lock_user_accounts, change_accounts_amounts, change_user_stat
 from utils.crop_photos import crop_image
+from utils.challenge_algos import get_distribution_algorithm
+from utils.challenge_list_cache import invalidate_challenge_list_cache
+from utils.challenges_logic import set_challenge_user_status
 from utils.current_period import get_current_period
+from utils.event_types import get_event_type, CHALLENGE_EVENT_TYPE
+from utils.feed import create_feed_items
 from utils.handle_image import change_filename
+from utils.ledger import write_ledger_entries
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
 
+CHALLENGE_TRANSITIONS_CHUNK_SIZE = 100
+CHALLENGE_SCHEDULE_FIELDS = ('registration_start_at', 'registration_end_at',
+                             'reports_start_at', 'reports_end_at', 'end_at')
+
 
 def create_challenge(creator, name, end_at, description, start_balance, photo, parameter_id, parameter_value):
     period = get_current_period(creator.profile.organization_id)
@@ -43,33 +56,20 @@ def create_challenge(creator, name, end_at, description, start_balance, photo, p
         parameters = [{"id": parameter_id, "value": parameter_value},
                       {"id": 2 / parameter_id, "value": start_balance // parameter_value, "is_calc": True}]
 
-    sender_distr_account = Account.objects.filter(
-        owner=creator, account_type='D', challenge_id=None).first()
-    current_account_amount = sender_distr_account.amount
-    from_income = False
-    account_to_save = sender_distr_account
-    if current_account_amount - start_balance < 0:
-        sender_income_account = Account.objects.filter(
-            owner=creator, account_type='I', challenge_id=None).first()
-        current_account_amount = sender_income_account.amount
-        account_to_save = sender_income_account
-        from_income = True
-    if current_account_amount - start_balance < 0:
-        logger.info(f"Попытка {creator} создать челлендж с фондом на сумму больше имеющейся на счету")
-        raise ValidationError("Нельзя добавить в фонд больше, чем есть на счету")
-
     with tr.atomic():
-        user_stat = UserStat.objects.get(user=creator, period=period)
+        creator_accounts = lock_user_accounts(creator.pk, ['D', 'I'])
+        account_to_save = creator_accounts.get('D')
+        from_income = False
+        if account_to_save.amount - start_balance < 0:
+            account_to_save = creator_accounts.get('I')
+            from_income = True
+        if account_to_save.amount - start_balance < 0:
+            logger.info(f"Попытка {creator} создать челлендж с фондом на сумму больше имеющейся на счету")
+            raise ValidationError("Нельзя добавить в фонд больше, чем есть на счету")
         if not from_income:
-            sender_distr_account.amount -= start_balance
-            user_stat.sent_to_challenges += start_balance
-            sender_distr_account.save(update_fields=['amount'])
-            user_stat.save(update_fields=['sent_to_challenges'])
+            change_user_stat(creator.pk, period, sent_to_challenges=start_balance)
         else:
-            sender_income_account.amount -= start_balance
-            user_stat.sent_to_challenges_from_income += start_balance
-            sender_income_account.save(update_fields=['amount'])
-            user_stat.save(update_fields=['sent_to_challenges_from_income'])
+            change_user_stat(creator.pk, period, sent_to_challenges_from_income=start_balance)
 
         challenge = Challenge.objects.create(
             creator=creator,
@@ -78,21 +78,27 @@ def create_challenge(creator, name, end_at, description, start_balance, photo, p
             description=description,
             end_at=end_at,
             states=states,
+            next_transition_at=end_at,
             challenge_mode=challenge_modes,
             start_balance=start_balance,
             parameters=parameters,
             photo=photo,
             organization_id=creator.profile.organization_id
         )
+        if challenge.photo.name is not None:
+            challenge.photo.name = change_filename(challenge.photo.name)
+            challenge.save(update_fields=['photo'])
+            crop_image(challenge.photo.name, f"{settings.BASE_DIR}/media/", to_square=False)
 
         if 'P' in challenge.states:
-            Event.objects.create(
-                event_type=EventTypes.objects.get(name='Создан челлендж'),
+            event = Event.objects.create(
+                event_type=get_event_type(CHALLENGE_EVENT_TYPE),
                 event_object_id=challenge.pk,
                 object_selector='Q',
                 time=datetime.now(),
                 scope_id=creator.profile.organization_id
             )
+            create_feed_items([event])
 
         participant = ChallengeParticipant.objects.create(
             user_participant=creator,
@@ -101,6 +107,7 @@ def create_challenge(creator, name, end_at, description, start_balance, photo, p
             contribution=start_balance,
             mode=['A', 'O']
         )
+        set_challenge_user_status(challenge.pk, creator.pk, is_creator=True, is_organizer=True)
         recipient_account = Account.objects.create(
             owner=creator,
             account_type='D',
@@ -120,8 +127,122 @@ def create_challenge(creator, name, end_at, description, start_balance, photo, p
         )
         recipient_account.transaction = transaction
         recipient_account.save(update_fields=['transaction'])
-        if challenge.photo.name is not None:
-            challenge.photo.name = change_filename(challenge.photo.name)
-            challenge.save(update_fields=['photo'])
-            crop_image(challenge.photo.name, f"{settings.BASE_DIR}/media/", to_square=False)
+        change_accounts_amounts({account_to_save.pk: -start_balance}, transaction)
+        write_ledger_entries([(recipient_account.pk, start_balance, transaction.pk)])
         return {"challenge_created": True}
+
+
+def complete_challenge(challenge: Challenge, current_period=None, fund_account: Optional[Account] = None,
+                       remain: Optional[int] = None) -> None:
+    """
+    Завершение челленджа с возвратом остатка фонда на счёт, с которого фонд был внесён.
+    Вызывается в транзакции под блокировкой строки челленджа - при выдаче последней награды
+    и планировщиком состояний при наступлении end_at
+    """
+    challenge.states = ['P', 'C']
+    challenge.state = ChallengeState.COMPLETED
+    challenge.next_transition_at = None
+    challenge.save(update_fields=['states', 'state', 'next_transition_at'])
+
+    if fund_account is None:
+        fund_account = Account.objects.only('id', 'amount').get(challenge=challenge, account_type='D')
+    if remain is None:
+        remain = fund_account.amount
+    if remain <= 0:
+        return
+    if current_period is None:
+        current_period = get_current_period(challenge.organization_id)
+    recipient_account = Transaction.objects.get(to_challenge=challenge).sender_account
+    transaction = Transaction.objects.create(
+        is_anonymous=False,
+        sender_account=fund_account,
+        from_challenge=challenge,
+        recipient_account=recipient_account,
+        amount=remain,
+        transaction_class='F',
+        status='R',
+        period=current_period,
+    )
+    change_accounts_amounts({fund_account.pk: -remain, recipient_account.pk: remain}, transaction)
+
+    ChallengeParticipant.objects.filter(user_participant_id=challenge.creator_id, challenge=challenge).update(
+        total_received=F('total_received') + remain)
+    change_user_stat(challenge.creator_id, current_period, returned_from_challenges=remain)
+
+
+def finalize_scheduled_challenge(challenge: Challenge) -> None:
+    """
+    Завершение челленджа по наступлению end_at: если награды по алгоритму распределения
+    выдаются при подведении итогов, они вычисляются и выдаются перед завершением
+    """
+    from auth_app.challenge_reports_views.service import distribute_challenge_rewards
+
+    if get_distribution_algorithm(challenge.distribution_type)['reward_time'] == 'final':
+        distribute_challenge_rewards(challenge)
+    else:
+        complete_challenge(challenge)
+
+
+def get_challenge_schedule_state(challenge: Challenge, now: datetime) -> Tuple[str, Optional[datetime]]:
+    """
+    Состояние челленджа по его временным рамкам на момент now и время следующей смены состояния
+    """
+    if challenge.end_at is not None and challenge.end_at <= now:
+        return ChallengeState.COMPLETED, None
+    if challenge.reports_end_at is not None and challenge.reports_end_at <= now:
+        state = ChallengeState.FINALIZING
+    elif challenge.reports_start_at is not None and challenge.reports_start_at <= now:
+        state = ChallengeState.GET_REPORTS
+    elif (challenge.registration_start_at is not None and challenge.registration_start_at <= now
+          and (challenge.registration_end_at is None or challenge.registration_end_at > now)):
+        state = ChallengeState.REGISTRATION
+    else:
+        state = ChallengeState.PUBLISHED
+    next_transitions = [time for time in (getattr(challenge, field) for field in CHALLENGE_SCHEDULE_FIELDS)
+                        if time is not None and time > now]
+    return state, min(next_transitions, default=None)
+
+
+def advance_challenges_states(chunk_size: int = CHALLENGE_TRANSITIONS_CHUNK_SIZE) -> int:
+    """
+    Смена состояний челленджей, для которых наступило время следующего перехода.
+    Челленджи выбираются порциями по индексу next_transition_at, строки блокируются с пропуском
+    уже заблокированных. Промежуточные состояния записываются одним bulk_update на порцию,
+    завершение выполняется по одному челленджу с возвратом остатка фонда.
+    Возвращает количество обработанных челленджей
+    """
+    now = timezone.now()
+    advanced_amount = 0
+    failed_ids = set()
+    while True:
+        with tr.atomic():
+            challenges = list(Challenge.objects
+                              .select_for_update(skip_locked=True)
+                              .filter(next_transition_at__lte=now)
+                              .exclude(pk__in=failed_ids)
+                              .only('id', 'organization_id', 'creator_id', 'name', 'states', 'state',
+                                    'parameters', 'distribution_type', 'winners_count',
+                                    *CHALLENGE_SCHEDULE_FIELDS)
+                              .order_by('next_transition_at', 'pk')[:chunk_size])
+            if not challenges:
+                break
+            changed_challenges = []
+            for challenge in challenges:
+                state, next_transition_at = get_challenge_schedule_state(challenge, now)
+                if state != ChallengeState.COMPLETED or ChallengeState.COMPLETED in challenge.states:
+                    challenge.state, challenge.next_transition_at = state, next_transition_at
+                    changed_challenges.append(challenge)
+                    continue
+                try:
+                    with tr.atomic():
+                        finalize_scheduled_challenge(challenge)
+                except Exception:
+                    logger.exception(f"Не удалось завершить челлендж с id {challenge.pk}")
+                    failed_ids.add(challenge.pk)
+                    continue
+                advanced_amount += 1
+            Challenge.objects.bulk_update(changed_challenges, ['state', 'next_transition_at'])
+            for organization_id in {challenge.organization_id for challenge in changed_challenges}:
+                invalidate_challenge_list_cache(organization_id)
+            advanced_amount += len(changed_challenges)
+    return advanced_amount
@@ -7,14 +7,18 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from auth_app.models import Challenge, ChallengeParticipant, ChallengeReport
-from utils.challenge_queries import CHALLENGE_LIST_QUERY, CHALLENGE_ACTIVE_LIST_QUERY, CHALLENGE_PK_QUERY
+from utils.challenge_list_cache import get_cached_challenge_list
+from utils.challenge_queries import (CHALLENGE_LIST_QUERY, CHALLENGE_ACTIVE_LIST_QUERY, CHALLENGE_PK_QUERY,
+                                     get_challenge_query_params)
 from utils.challenges_logic import (get_challenge_state_values, add_annotated_fields_to_challenges,
                                     set_active_field, set_completed_field, calculate_remaining_top_places,
                                     check_if_new_reports_exists, set_names_to_null, get_challenge_report_status,
                                     update_link_on_thumbnail, update_time, update_photo_link,
                                     set_winner_nickname, reconfigure_challenges_queryset_into_dictionary,
-                                    get_reports_data_from_queryset, add_transaction_amount_for_winner_reports)
-from utils.paginates import process_offset_and_limit
+                                    get_reports_data_from_queryset, add_transaction_amount_for_winner_reports,
+                                    set_challenges_viewer_fields)
+from utils.idempotency import idempotent
+from utils.paginates import process_cursor_offset_and_limit, decode_cursor, get_next_cursor, set_next_cursor
 from utils.query_debugger import query_debugger
 from .service import create_challenge
 from django.contrib.auth import get_user_model
@@ -32,6 +36,7 @@ class CreateChallengeView(APIView):
                               authentication.TokenAuthentication]
 
     @classmethod
+    @idempotent
     def post(cls, request, *args, **kwargs):
         creator = User.objects.select_related('profile').filter(pk=request.user.pk).first()
         name = request.data.get('name')
@@ -59,23 +64,30 @@ class ChallengeListView(APIView):
         organization_id = request.user.profile.organization_id
         offset = request.GET.get('offset')
         limit = request.GET.get('limit')
-        offset, limit = process_offset_and_limit(offset, limit)
-        active_only = request.GET.get('active_only')
-        if cls.get_boolean_parameter(active_only):
-            challenges = Challenge.objects.raw(
-                CHALLENGE_ACTIVE_LIST_QUERY, [request.user.id] * 9 + [organization_id] + [offset * limit] + [limit]
-            )
-        else:
-            challenges = Challenge.objects.raw(
-                CHALLENGE_LIST_QUERY, [request.user.id] * 9 + [organization_id] + [offset * limit] + [limit]
-            )
-        challenges = reconfigure_challenges_queryset_into_dictionary(challenges)
-        update_time(challenges, 'updated_at')
-        add_annotated_fields_to_challenges(challenges)
-        set_active_field(challenges)
-        get_challenge_state_values(challenges)
-        update_link_on_thumbnail(challenges, 'photo')
-        return Response(data=challenges)
+        cursor, offset, limit = process_cursor_offset_and_limit(request.GET.get('cursor'), offset, limit)
+        last_id = decode_cursor(cursor)[1] if cursor else None
+        active_only = cls.get_boolean_parameter(request.GET.get('active_only'))
+
+        def build_page():
+            query = CHALLENGE_ACTIVE_LIST_QUERY if active_only else CHALLENGE_LIST_QUERY
+            params = get_challenge_query_params(request.user.id) + [organization_id, last_id, last_id,
+                                                                    offset * limit, limit]
+            page = list(Challenge.objects.raw(query, params))
+            page_next_cursor = get_next_cursor(page, limit)
+            page = reconfigure_challenges_queryset_into_dictionary(page)
+            update_time(page, 'updated_at')
+            add_annotated_fields_to_challenges(page)
+            set_active_field(page)
+            get_challenge_state_values(page)
+            update_link_on_thumbnail(page, 'photo')
+            return page, page_next_cursor
+
+        challenges, next_cursor, cached = get_cached_challenge_list(
+            organization_id, f'{int(active_only)}:{last_id}:{offset}:{limit}', build_page
+        )
+        if cached:
+            set_challenges_viewer_fields(challenges, request.user.id)
+        return set_next_cursor(Response(data=challenges), next_cursor)
 
     @classmethod
     def get_boolean_parameter(cls, parameter):
@@ -93,7 +105,7 @@ class ChallengeDetailView(APIView):
     def get(cls, request, *args, **kwargs):
         pk = kwargs.get('pk')
         challenges = Challenge.objects.raw(
-            CHALLENGE_PK_QUERY, [request.user.pk] * 9 + [pk]
+            CHALLENGE_PK_QUERY, get_challenge_query_params(request.user.pk) + [pk]
         )
         if challenges:
             challenges = reconfigure_challenges_queryset_into_dictionary(challenges, pk=True)
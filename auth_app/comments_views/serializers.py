@@ -2,6 +2,8 @@ from django.db import transaction as tr
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from auth_app.models import Comment, LikeCommentStatistics
+from utils.feed import change_feed_item_comments_amount
+from utils.reaction_counters import is_write_behind_enabled, add_comment_delta
 
 
 class UpdateCommentSerializer(serializers.ModelSerializer):
@@ -81,8 +83,12 @@ class DeleteCommentSerializer(serializers.ModelSerializer):
                 .order_by('-date_last_modified').first()
 
             like_comment_statistics = LikeCommentStatistics.objects.get(content_type=content_type, object_id=object_id)
-            comment_counter = like_comment_statistics.comment_counter - 1
-            like_comment_statistics_data = {'comment_counter': comment_counter}
+            if is_write_behind_enabled():
+                add_comment_delta(content_type.pk, object_id, -1)
+                like_comment_statistics_data = {}
+            else:
+                like_comment_statistics_data = {'comment_counter': like_comment_statistics.comment_counter - 1}
+                change_feed_item_comments_amount(content_type.pk, object_id, -1)
             if last_comment_created is not None:
                 if last_comment_modified.date_last_modified != '' and last_comment_modified.date_last_modified is not None:
                     if last_comment_modified.date_last_modified > last_comment_created.date_created:
@@ -1,6 +1,8 @@
 from utils.crop_photos import crop_image
 from utils.fcm_services import get_fcm_tokens_list, get_multiple_users_tokens_list
+from utils.feed import change_feed_item_comments_amount
 from utils.handle_image import change_filename
+from utils.reaction_counters import is_write_behind_enabled, add_comment_delta
 from django.conf import settings
 from django.db import transaction as tr
 from rest_framework.exceptions import ValidationError
@@ -41,6 +43,7 @@ def create_comment(content_type, object_id, text, picture, user, transaction, tr
             if content_object is None:
                 raise ValidationError("Объекта с таким id не существует")
             comment = Comment.objects.get(content_type=content_type, object_id=object_id, previous_comment=None)
+            write_behind = is_write_behind_enabled()
             try:
 
                 like_comment_statistics = LikeCommentStatistics.objects.get(content_type=content_type,
@@ -48,9 +51,11 @@ def create_comment(content_type, object_id, text, picture, user, transaction, tr
                 like_comment_statistics.first_comment = comment
                 like_comment_statistics.last_comment = comment
                 like_comment_statistics.last_event_comment = comment
-                like_comment_statistics.comment_counter = 1
-                like_comment_statistics.save(
-                    update_fields=['first_comment', 'last_comment', 'last_event_comment', 'comment_counter'])
+                update_fields = ['first_comment', 'last_comment', 'last_event_comment']
+                if not write_behind:
+                    like_comment_statistics.comment_counter = 1
+                    update_fields.append('comment_counter')
+                like_comment_statistics.save(update_fields=update_fields)
             except LikeCommentStatistics.DoesNotExist:
 
                 like_comment_statistics_object = LikeCommentStatistics(content_type=content_type,
@@ -58,9 +63,13 @@ def create_comment(content_type, object_id, text, picture, user, transaction, tr
                                                                        first_comment=comment,
                                                                        last_comment=comment,
                                                                        last_event_comment=comment,
-                                                                       comment_counter=1
+                                                                       comment_counter=0 if write_behind else 1
                                                                        )
                 like_comment_statistics_object.save()
+            if write_behind:
+                add_comment_delta(content_type.pk, object_id, 1)
+            else:
+                change_feed_item_comments_amount(content_type.pk, object_id, 1)
             if comment_instance.picture.name is not None:
                 comment_instance.picture.name = change_filename(
                     comment_instance.picture.name)
@@ -86,13 +95,16 @@ def create_comment(content_type, object_id, text, picture, user, transaction, tr
         )
 
         like_comment_statistics = LikeCommentStatistics.objects.get(content_type=content_type, object_id=object_id)
-        comment_counter = like_comment_statistics.comment_counter + 1
-
         like_comment_statistics.last_comment = comment
         like_comment_statistics.last_event_comment = comment
-        like_comment_statistics.comment_counter = comment_counter
-        like_comment_statistics.save(
-            update_fields=['last_comment', 'last_event_comment', 'comment_counter'])
+        if is_write_behind_enabled():
+            add_comment_delta(content_type.pk, object_id, 1)
+            like_comment_statistics.save(update_fields=['last_comment', 'last_event_comment'])
+        else:
+            like_comment_statistics.comment_counter = like_comment_statistics.comment_counter + 1
+            like_comment_statistics.save(
+                update_fields=['last_comment', 'last_event_comment', 'comment_counter'])
+            change_feed_item_comments_amount(content_type.pk, object_id, 1)
 
         if model_name == 'transaction':
             create_and_send_comment_notifications_for_transactions(comment, object_id, user)
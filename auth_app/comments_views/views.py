@@ -11,6 +11,8 @@ from auth_app.models import Comment
 from auth_app.serializers import CommentTransactionSerializer
 from utils.crop_photos import crop_image
 from utils.handle_image import change_filename
+from utils.paginates import set_next_cursor
+from utils.throttling import RedisTokenBucketThrottle
 from .serializers import UpdateCommentSerializer, DeleteCommentSerializer
 from .service import create_comment, get_object
 
@@ -31,6 +33,7 @@ class CommentListAPIView(APIView):
         object_id = request.data.get('object_id')
         offset = request.data.get('offset', 0)
         limit = request.data.get('limit', 20)
+        cursor = request.data.get('cursor')
         include_name = request.data.get('include_name', False)
         is_reverse_order = request.data.get('is_reverse_order', False)
         transaction_id = request.data.get('transaction_id')
@@ -44,7 +47,11 @@ class CommentListAPIView(APIView):
         if type(include_name) != bool or type(is_reverse_order) != bool:
             return Response("include_name и is_reverse_order должны быть типа bool", status=status.HTTP_400_BAD_REQUEST)
 
-        context = {"offset": offset, "limit": limit, "include_name": include_name, "is_reverse_order": is_reverse_order}
+        if cursor is not None and type(cursor) != str:
+            return Response("cursor должен быть строкой", status=status.HTTP_400_BAD_REQUEST)
+
+        context = {"offset": offset, "limit": limit, "include_name": include_name, "is_reverse_order": is_reverse_order,
+                   "cursor": cursor}
 
         if content_type is not None and object_id is not None:
             model_class = ContentType.objects.get_for_id(content_type).model_class()
@@ -53,7 +60,7 @@ class CommentListAPIView(APIView):
                 # {"model_class": model_class, "model_object": model_object}
                 serializer = CommentTransactionSerializer({"content_type": content_type, "object_id": object_id},
                                                           context=context)
-                return Response(serializer.data)
+                return set_next_cursor(Response(serializer.data), context.get('next_cursor'))
 
             except model_class.DoesNotExist:
                 return Response("Переданный идентификатор не относится "
@@ -67,6 +74,8 @@ class CreateCommentView(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [authentication.SessionAuthentication,
                               authentication.TokenAuthentication]
+    throttle_classes = [RedisTokenBucketThrottle]
+    throttle_scope = 'create_comment'
 
     @classmethod
     def post(cls, request, *args, **kwargs):
@@ -5,21 +5,24 @@ from typing import List, Dict
 
 from django.db.models import F, Exists, OuterRef
 
-from auth_app.models import (EventTypes, Transaction, Profile,
+from auth_app.models import (Transaction, Profile,
                              Event, Challenge, ChallengeReport,
-                             LikeStatistics, LikeCommentStatistics, Like)
+                             Like, LikeKind)
 from utils.challenges_logic import update_link_on_thumbnail, update_time
+from utils.content_types import get_content_type_id
+from utils.event_types import (get_event_types, get_event_type_id, TRANSACTION_EVENT_TYPE,
+                               INCOME_TRANSACTION_EVENT_TYPE, CHALLENGE_EVENT_TYPE, WINNER_EVENT_TYPE)
+from utils.feed import get_feed_items_data
+from utils.feed_cache import get_cached_payloads
+from utils.loaders import get_transactions_tags, get_engagement_stats
+from utils.reaction_counters import is_write_behind_enabled, get_pending_like_deltas, get_pending_comment_deltas
 from utils.thumbnail_link import get_thumbnail_link
+from utils.timelines import is_fanout_enabled, get_timeline_transaction_ids
 
 logger = logging.getLogger(__name__)
 
-event_types_data = {event_type.name: event_type.to_json() for event_type in EventTypes.objects.all()}
 object_selectors = {"T": "transaction", "Q": "challenge", "R": "challengereport"}
 
-TRANSACTION_TYPE_ID = event_types_data.get('Новая публичная транзакция').get('id')
-WINNER_TYPE_ID = event_types_data.get('Новый победитель челленджа').get('id')
-CHALLENGE_TYPE_ID = event_types_data.get('Создан челлендж').get('id')
-
 TRANSACTION_FIELDS = (
     "id",
     "sender_id",
@@ -43,34 +46,17 @@ TRANSACTION_STATUS_DATA = {'A': 'Одобрено', 'R': 'Выполнена'}
 
 def get_event_type(user, recipient, is_public, event_types):
     if is_public is True and recipient != user:
-        return event_types.get('Новая публичная транзакция')
-    return event_types.get('Входящая транзакция')
+        return event_types.get(TRANSACTION_EVENT_TYPE)
+    return event_types.get(INCOME_TRANSACTION_EVENT_TYPE)
 
 
 def get_events_list(request, offset, limit):
     request_user_tg_name = get_request_user_tg_name(request)
-    transactions = get_transactions_queryset(request, offset, limit)
-    event_types = get_event_types_data()
+    transactions = get_feed_transactions(request, offset, limit)
+    event_types = get_event_types()
     feed_data = []
-    like_comment_statistics = (LikeCommentStatistics.objects.select_related('content_type')
-                               .only('comment_counter', 'object_id', 'content_type__model')
-                               .filter(content_type__model='transaction'))
-    like_statistics = (LikeStatistics.objects.select_related('like_kind', 'content_type')
-                       .only('id', 'like_kind__code', 'like_counter', 'object_id', 'content_type__model')
-                       .filter(content_type__model='transaction'))
-    transaction_to_comment_counter = {}
-    transaction_to_reactions = {}
-    for statistic in like_statistics:
-        if statistic.object_id in transaction_to_reactions:
-            reactions = transaction_to_reactions[statistic.object_id]
-            reactions.append({"id": statistic.id, 'code': statistic.like_kind.code, 'counter': statistic.like_counter})
-        else:
-            reactions = [{"id": statistic.id, 'code': statistic.like_kind.code, 'counter': statistic.like_counter}]
-        transaction_to_reactions[statistic.object_id] = reactions
-
-    for statistic in like_comment_statistics:
-        transaction_to_comment_counter[statistic.object_id] = statistic.comment_counter
-
+    transactions_tags = get_transactions_tags(_transaction.pk for _transaction in transactions)
+    transactions_stats = get_engagement_stats('transaction', (_transaction.pk for _transaction in transactions))
     for _transaction in transactions:
         recipient_tg_name = _transaction.recipient.profile.tg_name
         is_public = _transaction.is_public
@@ -95,20 +81,13 @@ def get_events_list(request, offset, limit):
             "reason": _transaction.reason,
             "photo": f"{get_thumbnail_link(_transaction.photo.url)}" if _transaction.photo else None,
             "updated_at": _transaction.updated_at,
-            "tags": _transaction._objecttags.values("tag_id", name=F("tag__name")),
+            "tags": transactions_tags.get(_transaction.pk, []),
             "last_like_comment_time": _transaction.last_like_comment_time,
             "user_liked": _transaction.user_liked,
             "user_disliked": _transaction.user_disliked,
+            "comments_amount": transactions_stats[_transaction.pk]['comments_amount'],
+            "reactions": transactions_stats[_transaction.pk]['reactions'],
         }
-        if _transaction.pk in transaction_to_comment_counter:
-            transaction_info['comments_amount'] = transaction_to_comment_counter[_transaction.pk]
-        else:
-            transaction_info['comments_amount'] = 0
-
-        if _transaction.pk in transaction_to_reactions:
-            transaction_info['reactions'] = transaction_to_reactions[_transaction.pk]
-        else:
-            transaction_info['reactions'] = []
 
         event_data = {
             "id": 0,
@@ -121,29 +100,43 @@ def get_events_list(request, offset, limit):
     return feed_data
 
 
-def get_event_types_data():
-    event_types = {event_type.name: event_type for event_type in EventTypes.objects.all()}
-    return event_types
-
-
 def get_request_user_tg_name(request):
     request_user_tg_name = Profile.objects.filter(user=request.user).only('tg_name').first().tg_name
     return request_user_tg_name
 
 
+def get_feed_transactions(request, offset, limit):
+    """
+    Транзакции страницы ленты: в режиме раздачи по лентам id берутся из Redis,
+    иначе (или если лента недоступна) страница выбирается запросом к БД
+    """
+    if is_fanout_enabled():
+        transaction_ids = get_timeline_transaction_ids(request.user.pk, request.user.profile.organization_id,
+                                                       offset, limit)
+        if transaction_ids is not None:
+            return get_transactions_by_ids(request, transaction_ids)
+    return get_transactions_queryset(request, offset, limit)
+
+
+def get_transactions_by_ids(request, transaction_ids: List[int]) -> List[Transaction]:
+    transactions = {_transaction.pk: _transaction
+                    for _transaction in (Transaction.objects
+                                         .select_related('sender__profile', 'recipient__profile')
+                                         .filter(pk__in=transaction_ids)
+                                         .feed_version(request.user)
+                                         .only(*TRANSACTION_FIELDS))}
+    return [transactions[pk] for pk in transaction_ids if pk in transactions]
+
+
 def get_transactions_queryset(request, offset, limit):
     public_transactions = (Transaction.objects
                            .select_related('sender__profile', 'recipient__profile')
-                           .prefetch_related('_objecttags', 'likes',
-                                             'like_statistics', 'like_comment_statistics')
                            .filter(is_public=True, status__in=['A', 'R'])
                            .exclude(recipient=request.user)
                            .feed_version(request.user)
                            .only(*TRANSACTION_FIELDS))
     transactions_receiver_only = (Transaction.objects
                                   .select_related('sender__profile', 'recipient__profile')
-                                  .prefetch_related('_objecttags', 'likes',
-                                                    'like_statistics', 'like_comment_statistics')
                                   .filter(recipient=request.user, status__in=['A', 'R'])
                                   .feed_version(request.user)
                                   .defer('transaction_class', 'grace_timeout', 'organization_id', 'period', 'scope'))
@@ -154,77 +147,41 @@ def get_transactions_queryset(request, offset, limit):
     return extended_transactions
 
 
-def get_events_data(offset, limit, user_id):
+def get_events_data(offset, limit, user_id, cursor=None):
     users_scope_id = Profile.objects.filter(user_id=user_id).only('organization_id').first().organization_id
-    events = {event.id: event.to_json() for event in
-              Event.objects.filter(scope_id=users_scope_id)
-              .order_by('-time')[offset * limit: offset * limit + limit]}
-    events_data = []
-    objects_pks = set()
-    transaction_event_pairs = get_event_objects_pairs(events, TRANSACTION_TYPE_ID)
-    transactions = get_transactions_from_events(list(transaction_event_pairs.keys()), user_id)
-    for transaction in transactions:
-        transaction_event_pairs.get(transaction.get('id')).update({'transaction': transaction})
-    winners_event_pairs = get_event_objects_pairs(events, WINNER_TYPE_ID)
-    winners = get_winners_from_events(list(winners_event_pairs.keys()), user_id)
-    for winner in winners:
-        winners_event_pairs.get(winner.get('id')).update({'winner': winner})
-    challenge_event_pairs = get_event_objects_pairs(events, CHALLENGE_TYPE_ID)
-    challenges = get_challenges_from_events(list(challenge_event_pairs.keys()), user_id)
-    for challenge in challenges:
-        challenge_event_pairs.get(challenge.get('id')).update({'challenge': challenge})
-    for transaction in transaction_event_pairs.values():
-        objects_pks.add(transaction.get('transaction').get('id'))
-        events_data.append(transaction)
-    for winner in winners_event_pairs.values():
-        objects_pks.add(winner.get('winner').get('id'))
-        events_data.append(winner)
-    for challenge in challenge_event_pairs.values():
-        objects_pks.add(challenge.get('challenge').get('id'))
-        events_data.append(challenge)
-    get_likes_statistics_for_events(objects_pks, events_data)
-    get_comments_statistics_for_events(objects_pks, events_data)
-    update_time(events_data, 'time')
-    return sorted(events_data, key=lambda item: item['time'], reverse=True)
+    events_data, next_cursor = get_feed_items_data(users_scope_id, user_id, offset, limit, cursor)
+    if is_write_behind_enabled():
+        add_pending_counters_to_events(events_data)
+    return events_data, next_cursor
+
+
+def add_pending_counters_to_events(events):
+    like_kind_id = LikeKind.objects.filter(name='like').values_list('id', flat=True).first()
+    objects = {item['id']: (get_content_type_id(object_selectors.get(item.get('object_selector'))),
+                            item.get('event_object_id')) for item in events}
+    likes = get_pending_like_deltas([(*key, like_kind_id) for key in objects.values()])
+    comments = get_pending_comment_deltas(objects.values())
+    for item in events:
+        key = objects[item['id']]
+        item['likes_amount'] += likes.get((*key, like_kind_id), 0)
+        item['comments_amount'] += comments.get(key, 0)
 
 
-def get_likes_statistics_for_events(pk_list, events):
-    stats = [(stats.object_id, stats.content_type.model, stats.like_counter)
-             for stats in LikeStatistics.objects
-             .select_related('content_type', 'like_kind')
-             .filter(object_id__in=pk_list, like_kind__name='like')
-             .only('content_type__model',
-                   'like_kind__name',
-                   'like_counter',
-                   'object_id')]
-    stats_data = defaultdict(dict)
-    for pk, content_type, amount in stats:
-        stats_data[pk].update({content_type: amount})
+def get_statistics_for_events(events):
+    """
+    Количество лайков и комментариев объектов событий страницы
+    """
+    object_ids = defaultdict(set)
     for item in events:
-        item_selector = object_selectors.get(item.get('object_selector'))
-        item_id = item.get('event_object_id')
-        item.setdefault("likes_amount",
-                        stats_data.get(item_id).get(item_selector, 0)
-                        if stats_data.get(item_id) is not None else 0)
-
-
-def get_comments_statistics_for_events(pk_list, events):
-    stats = {(stats.object_id, stats.content_type.model, stats.comment_counter)
-             for stats in LikeCommentStatistics.objects
-             .select_related('content_type')
-             .filter(object_id__in=pk_list)
-             .only('content_type__model',
-                   'comment_counter',
-                   'object_id')}
-    stats_data = defaultdict(dict)
-    for pk, content_type, amount in stats:
-        stats_data[pk].update({content_type: amount})
+        object_ids[item.get('object_selector')].add(item.get('event_object_id'))
+    stats = {selector: get_engagement_stats(object_selectors.get(selector), ids)
+             for selector, ids in object_ids.items()}
     for item in events:
-        item_selector = object_selectors.get(item.get('object_selector'))
-        item_id = item.get('event_object_id')
-        item.setdefault("comments_amount",
-                        stats_data.get(item_id).get(item_selector, 0)
-                        if stats_data.get(item_id) is not None else 0)
+        item_stats = stats[item.get('object_selector')][item.get('event_object_id')]
+        item.setdefault('likes_amount', item_stats['likes_amount'])
+        item.setdefault('comments_amount', item_stats['comments_amount'])
+    if is_write_behind_enabled():
+        add_pending_counters_to_events(events)
 
 
 def get_transactions_events_data(offset, limit, user_id):
@@ -235,16 +192,13 @@ def get_transactions_events_data(offset, limit, user_id):
                .order_by('-time')
               [offset * limit: offset * limit + limit])}
     events_data = []
-    object_pks = set()
-    transaction_event_pairs = get_event_objects_pairs(events, TRANSACTION_TYPE_ID)
+    transaction_event_pairs = get_event_objects_pairs(events, get_event_type_id(TRANSACTION_EVENT_TYPE))
     transactions = get_transactions_from_events(list(transaction_event_pairs.keys()), user_id)
     for transaction in transactions:
         transaction_event_pairs.get(transaction.get('id')).update({'transaction': transaction})
     for transaction in transaction_event_pairs.values():
-        object_pks.add(transaction.get('transaction').get('id'))
         events_data.append(transaction)
-    get_likes_statistics_for_events(object_pks, events_data)
-    get_comments_statistics_for_events(object_pks, events_data)
+    get_statistics_for_events(events_data)
     update_time(events_data, 'time')
     return sorted(events_data, key=lambda item: item['time'], reverse=True)
 
@@ -257,16 +211,13 @@ def get_reports_events_data(offset, limit, user_id):
                .order_by('-time')
               [offset * limit: offset * limit + limit])}
     events_data = []
-    object_pks = set()
-    winners_event_pairs = get_event_objects_pairs(events, WINNER_TYPE_ID)
+    winners_event_pairs = get_event_objects_pairs(events, get_event_type_id(WINNER_EVENT_TYPE))
     winners = get_winners_from_events(list(winners_event_pairs.keys()), user_id)
     for winner in winners:
         winners_event_pairs.get(winner.get('id')).update({'winner': winner})
     for winner in winners_event_pairs.values():
-        object_pks.add(winner.get('winner').get('id'))
         events_data.append(winner)
-    get_likes_statistics_for_events(object_pks, events_data)
-    get_comments_statistics_for_events(object_pks, events_data)
+    get_statistics_for_events(events_data)
     update_time(events_data, 'time')
     return sorted(events_data, key=lambda item: item['time'], reverse=True)
 
@@ -279,16 +230,13 @@ def get_challenges_events_data(offset, limit, user_id):
                .order_by('-time')
               [offset * limit: offset * limit + limit])}
     events_data = []
-    object_pks = set()
-    event_pairs = get_event_objects_pairs(events, CHALLENGE_TYPE_ID)
+    event_pairs = get_event_objects_pairs(events, get_event_type_id(CHALLENGE_EVENT_TYPE))
     challenges = get_challenges_from_events(list(event_pairs.keys()), user_id)
     for challenge in challenges:
         event_pairs.get(challenge.get('id')).update({'challenge': challenge})
     for challenge in event_pairs.values():
-        object_pks.add(challenge.get('challenge').get('id'))
         events_data.append(challenge)
-    get_likes_statistics_for_events(object_pks, events_data)
-    get_comments_statistics_for_events(object_pks, events_data)
+    get_statistics_for_events(events_data)
     update_time(events_data, 'time')
     return sorted(events_data, key=lambda item: item['time'], reverse=True)
 
@@ -298,18 +246,17 @@ def get_event_objects_pairs(events: Dict[int, Dict], type_id: int) -> Dict[int,
             for event in events.values() if event['event_type_id'] == type_id}
 
 
-def get_transactions_from_events(transaction_id_array: List[int], user_id: int) -> Dict:
+def get_transactions_from_events(transaction_id_array: List[int], user_id: int) -> List[Dict]:
+    versions = dict(Transaction.objects.filter(pk__in=transaction_id_array).values_list('id', 'updated_at'))
+    transactions = get_cached_payloads('transaction', versions, build_transactions_payloads)
+    set_user_liked(transactions, 'transaction', user_id)
+    return transactions
+
+
+def build_transactions_payloads(transaction_id_array: List[int]) -> List[Dict]:
     transactions = (Transaction.objects
                     .select_related('sender__profile', 'recipient__profile')
-                    .prefetch_related('_objecttags')
                     .filter(pk__in=transaction_id_array)
-                    .annotate(user_liked=Exists(Like.objects
-                                                .filter(content_type__model='transaction',
-                                                        object_id=OuterRef('pk'),
-                                                        like_kind__code='like',
-                                                        is_liked=True,
-                                                        user_id=user_id
-                                                        )))
                     .only('sender__profile__tg_name',
                           'sender_id',
                           'recipient_id',
@@ -334,10 +281,10 @@ def get_transactions_from_events(transaction_id_array: List[int], user_id: int)
 
 def get_transactions_list_from_queryset(transactions):
     transactions_list = []
+    transactions_tags = get_transactions_tags(transaction.pk for transaction in transactions)
     for transaction in transactions:
         transaction_data = {
             "id": transaction.pk,
-            "user_liked": transaction.user_liked,
             "amount": transaction.amount,
             "updated_at": transaction.updated_at,
             "sender_id": transaction.sender_id,
@@ -348,30 +295,30 @@ def get_transactions_list_from_queryset(transactions):
             "recipient_first_name": transaction.recipient.profile.first_name,
             "recipient_surname": transaction.recipient.profile.surname,
             "recipient_photo": transaction.recipient.profile.get_photo_url(),
-            "tags": transaction._objecttags.values("tag_id", name=F("tag__name"))
+            "tags": transactions_tags.get(transaction.pk, [])
         }
         transactions_list.append(transaction_data)
     return transactions_list
 
 
-def get_challenges_from_events(challenge_id_array: List[int], user_id) -> Dict:
+def get_challenges_from_events(challenge_id_array: List[int], user_id) -> List[Dict]:
+    versions = dict(Challenge.objects.filter(pk__in=challenge_id_array).values_list('id', 'updated_at'))
+    challenges = get_cached_payloads('challenge', versions, build_challenges_payloads)
+    set_user_liked(challenges, 'challenge', user_id)
+    return challenges
+
+
+def build_challenges_payloads(challenge_id_array: List[int]) -> List[Dict]:
     challenges = (Challenge.objects
                   .select_related('creator__profile')
                   .filter(pk__in=challenge_id_array)
-                  .annotate(user_liked=Exists(Like.objects
-                                              .filter(content_type__model='challenge',
-                                                      object_id=OuterRef('pk'),
-                                                      like_kind__code='like',
-                                                      is_liked=True,
-                                                      user_id=user_id
-                                                      )))
                   .only('photo', 'created_at', 'name', 'end_at',
                         'creator_id', 'id',
                         'creator__profile__first_name',
                         'creator__profile__surname',
                         'creator__profile__tg_name'
                         )
-                  .values('id', 'photo', 'created_at', 'name', 'creator_id', 'user_liked', 'end_at',
+                  .values('id', 'photo', 'created_at', 'name', 'creator_id', 'end_at',
                           creator_first_name=F('creator__profile__first_name'),
                           creator_surname=F('creator__profile__surname'),
                           creator_tg_name=F('creator__profile__tg_name')))
@@ -380,17 +327,18 @@ def get_challenges_from_events(challenge_id_array: List[int], user_id) -> Dict:
     return challenges
 
 
-def get_winners_from_events(winners_id_array: List[int], user_id) -> Dict:
+def get_winners_from_events(winners_id_array: List[int], user_id) -> List[Dict]:
+    versions = dict(ChallengeReport.objects.filter(pk__in=winners_id_array).values_list('id', 'updated_at'))
+    winners = get_cached_payloads('challengereport', versions, build_winners_payloads)
+    set_user_liked(winners, 'challengereport', user_id)
+    return winners
+
+
+def build_winners_payloads(winners_id_array: List[int]) -> List[Dict]:
     winners = (ChallengeReport.objects
                .select_related('challenge__organized_by',
                                'participant__user_participant__profile')
                .filter(pk__in=winners_id_array)
-               .annotate(user_liked=Exists(Like.objects
-                                           .filter(content_type__model='challengereport',
-                                                   object_id=OuterRef('pk'),
-                                                   like_kind__code='like',
-                                                   is_liked=True,
-                                                   user_id=user_id)))
                .only('id', 'updated_at', 'challenge__name',
                      'challenge_id', 'challenge__creator_id',
                      'participant__user_participant_id',
@@ -398,7 +346,7 @@ def get_winners_from_events(winners_id_array: List[int], user_id) -> Dict:
                      'participant__user_participant__profile__surname',
                      'participant__user_participant__profile__tg_name',
                      'participant__user_participant__profile__photo')
-               .values('id', 'updated_at', 'user_liked', 'challenge_id',
+               .values('id', 'updated_at', 'challenge_id',
                        challenge_name=F('challenge__name'),
                        winner_id=F('participant__user_participant_id'),
                        winner_first_name=F('participant__user_participant__profile__first_name'),
@@ -410,12 +358,26 @@ def get_winners_from_events(winners_id_array: List[int], user_id) -> Dict:
     return winners
 
 
+def set_user_liked(objects: List[Dict], model_name: str, user_id: int) -> None:
+    """
+    Отметка объектов, которые пользователь лайкнул, одним запросом к лайкам
+    """
+    liked_ids = set(Like.objects
+                    .filter(content_type_id=get_content_type_id(model_name),
+                            object_id__in=[item['id'] for item in objects],
+                            like_kind__code='like',
+                            is_liked=True,
+                            user_id=user_id)
+                    .values_list('object_id', flat=True))
+    for item in objects:
+        item['user_liked'] = item['id'] in liked_ids
+
+
 def get_events_transaction_queryset(pk: int, user_id) -> Transaction:
     transaction = (Transaction.objects.select_related('sender__profile', 'recipient__profile')
-                   .prefetch_related('_objecttags')
                    .filter(pk=pk)
                    .annotate(user_liked=Exists(Like.objects
-                                               .filter(content_type__model='transaction',
+                                               .filter(content_type_id=get_content_type_id('transaction'),
                                                        object_id=OuterRef('pk'),
                                                        like_kind__code='like',
                                                        is_liked=True,
@@ -459,29 +421,11 @@ def get_transaction_data_from_transaction_object(transaction: Transaction) -> Di
         "is_anonymous": transaction.is_anonymous,
         "recipient_tg_name": transaction.recipient.profile.tg_name,
         "recipient_photo": None if recipient_photo is None else get_thumbnail_link(recipient_photo),
-        "tags": transaction._objecttags.values("tag_id", name=F("tag__name")),
+        "tags": get_transactions_tags([transaction.pk]).get(transaction.pk, []),
         "user_liked": transaction.user_liked
     }
-    get_likes_stats_for_transaction(transaction.pk, transaction_data)
-    get_comments_stats_for_transaction(transaction.pk, transaction_data)
+    stats = get_engagement_stats('transaction', [transaction.pk])[transaction.pk]
+    transaction_data.setdefault('like_amount', stats['likes_amount'])
+    transaction_data.setdefault('comments_amount', stats['comments_amount'])
     update_time([transaction_data], 'updated_at')
     return transaction_data
-
-
-def get_likes_stats_for_transaction(transaction_id, data):
-    stat = (LikeStatistics.objects
-            .select_related('content_type', 'like_kind')
-            .filter(object_id=transaction_id,
-                    like_kind__name='like',
-                    content_type__model='transaction')
-            .only('content_type_id', 'like_kind_id', 'like_counter').first())
-    data.setdefault('like_amount', stat.like_counter if stat is not None else 0)
-
-
-def get_comments_stats_for_transaction(transaction_id, data):
-    stat = (LikeCommentStatistics.objects
-            .select_related('content_type')
-            .filter(object_id=transaction_id,
-                    content_type__model='transaction')
-            .only('content_type_id', 'comment_counter').first())
-    data.setdefault('comments_amount', stat.comment_counter if stat is not None else 0)
@@ -7,7 +7,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from utils.paginates import process_offset_and_limit
+from utils.paginates import process_offset_and_limit, process_cursor_offset_and_limit, set_next_cursor
 from .service import (get_events_list, get_events_data,
                       get_events_transaction_queryset,
                       get_transaction_data_from_transaction_object,
@@ -41,8 +41,9 @@ class FeedView(APIView):
     def get(cls, request, *args, **kwargs):
         offset = request.GET.get('offset')
         limit = request.GET.get('limit')
-        offset, limit = process_offset_and_limit(offset, limit)
-        return Response(get_events_data(offset, limit, request.user.pk))
+        cursor, offset, limit = process_cursor_offset_and_limit(request.GET.get('cursor'), offset, limit)
+        events_data, next_cursor = get_events_data(offset, limit, request.user.pk, cursor)
+        return set_next_cursor(Response(events_data), next_cursor)
 
 
 class TransactionFeedView(APIView):
@@ -1,14 +1,17 @@
 import logging
-from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 
 from django.contrib.contenttypes.models import ContentType
-from django.db import transaction as tr
+from django.db import IntegrityError, connection, transaction as tr
 from rest_framework.exceptions import ValidationError
 
 from auth_app.comments_views.service import get_object
-from auth_app.models import Like, LikeKind, LikeStatistics, LikeCommentStatistics, Transaction, Comment
+from auth_app.models import Like, Transaction, Comment
 from auth_app.tasks import send_multiple_notifications, bulk_create_notifications
 from utils.fcm_services import get_fcm_tokens_list, get_multiple_users_tokens_list
+from utils.feed import change_feed_items_likes
+from utils.reaction_counters import is_write_behind_enabled, add_like_deltas
 from utils.notification_services import (get_notification_message_for_thanks_sender_reaction,
                                          get_notification_message_for_thanks_recipient_reaction,
                                          get_notification_message_for_challenge_reaction,
@@ -18,116 +21,174 @@ from utils.notification_services import (get_notification_message_for_thanks_sen
 logger = logging.getLogger(__name__)
 
 
+LIKE_COLUMNS = ('id, transaction_id, content_type_id, object_id, like_kind_id, '
+                'is_liked, date_created, date_deleted, user_id')
+
+REMOVE_ACTIVE_LIKE_QUERY = f"""
+UPDATE likes SET is_liked = false, date_deleted = now()
+WHERE content_type_id = %s AND object_id = %s AND user_id = %s AND is_liked
+RETURNING {LIKE_COLUMNS}
+"""
+
+INSERT_LIKE_QUERY = f"""
+INSERT INTO likes (content_type_id, object_id, user_id, like_kind_id, is_liked, date_created)
+SELECT %s, %s, %s, %s, true, now()
+WHERE EXISTS (SELECT 1 FROM {{table}} WHERE id = %s)
+ON CONFLICT (content_type_id, object_id, user_id) WHERE is_liked DO NOTHING
+RETURNING {LIKE_COLUMNS}
+"""
+
+UPDATE_LIKES_STATISTICS_QUERY = """
+WITH like_statistics_update AS (
+  INSERT INTO like_statistics (content_type_id, object_id, like_kind_id, like_counter, last_change_at)
+  VALUES {values}
+  ON CONFLICT (content_type_id, object_id, like_kind_id) DO UPDATE
+  SET like_counter = like_statistics.like_counter + EXCLUDED.like_counter,
+      last_change_at = EXCLUDED.last_change_at
+)
+INSERT INTO like_comment_statistics (content_type_id, object_id, last_like_or_comment_change_at, comment_counter)
+VALUES (%s, %s, now(), 0)
+ON CONFLICT (content_type_id, object_id) DO UPDATE
+SET last_like_or_comment_change_at = EXCLUDED.last_like_or_comment_change_at
+"""
+
+
+LIKES_PAGE_BY_KINDS_QUERY = """
+SELECT "l"."id"
+FROM unnest(%s::integer[]) AS "k" ("like_kind_id")
+CROSS JOIN LATERAL (
+  SELECT "id" FROM likes
+  WHERE "content_type_id" = %s AND "object_id" = %s AND "is_liked" AND "like_kind_id" = "k"."like_kind_id"
+  ORDER BY "date_created" DESC, "id" DESC
+  OFFSET %s LIMIT %s
+) l
+"""
+
+
+def get_likes_page_by_kinds(content_type_id: int, object_id: int, like_kind_ids: List[int],
+                            offset: int, limit: int) -> Dict[int, List[Like]]:
+    """
+    Страница активных лайков объекта отдельно для каждого типа лайка.
+    Смещение и ограничение применяются в базе, поэтому загружается не больше limit лайков на тип
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LIKES_PAGE_BY_KINDS_QUERY, [like_kind_ids, content_type_id, object_id, offset, limit])
+        likes_ids = [row[0] for row in cursor.fetchall()]
+    likes_by_kinds = {like_kind_id: [] for like_kind_id in like_kind_ids}
+    for like in (Like.objects
+                 .select_related('user__profile')
+                 .filter(pk__in=likes_ids)
+                 .only('id', 'date_created', 'like_kind', 'user__profile__first_name',
+                       'user__profile__surname', 'user__profile__photo')
+                 .order_by('-date_created', '-id')):
+        likes_by_kinds[like.like_kind_id].append(like)
+    return likes_by_kinds
+
+
+LIKED_OBJECTS_FIELDS = {
+    'transaction': ('id', 'amount', 'reason', 'recipient_id', 'updated_at'),
+    'challenge': ('id', 'name', 'photo', 'updated_at'),
+    'challengereport': ('id', 'challenge_id', 'text', 'updated_at'),
+    'comment': ('id', 'text', 'date_created'),
+}
+
+
+def get_liked_objects(likes: List[Like]) -> Dict[Tuple[int, int], Dict]:
+    """
+    Краткие данные объектов, к которым относятся лайки, одним запросом на каждый тип объекта.
+    Возвращает словарь {(content_type_id, object_id): данные объекта}
+    """
+    objects_ids = defaultdict(set)
+    for like in likes:
+        objects_ids[like.content_type_id].add(like.object_id)
+    liked_objects = {}
+    for content_type_id, ids in objects_ids.items():
+        content_type = ContentType.objects.get_for_id(content_type_id)
+        fields = LIKED_OBJECTS_FIELDS.get(content_type.model)
+        if fields is None:
+            continue
+        for item in content_type.model_class().objects.filter(pk__in=ids).values(*fields):
+            liked_objects[(content_type_id, item['id'])] = item
+    return liked_objects
+
+
 def press_like(user, content_type, object_id, like_kind, transaction,
                transaction_id, challenge_id, challenge_report_id, comment_id):
-    like_kinds = LikeKind.objects.all()
-    like_kind = LikeKind.objects.get(id=like_kind)
-
+    """
+    Выставление или снятие реакции.
+    Активная реакция пользователя снимается одним UPDATE, новая вставляется через
+    INSERT ... ON CONFLICT по уникальному индексу активных реакций, счётчики всех
+    затронутых типов реакций меняются одним атомарным upsert
+    """
+    try:
+        like_kind_id = int(like_kind)
+    except (TypeError, ValueError):
+        raise ValidationError("Не передан тип лайка")
     content_type, object_id, model_name = get_object(content_type, object_id, transaction,
                                                      transaction_id, challenge_id, challenge_report_id, comment_id)
-    with tr.atomic():
-        try:
-            like_statistics = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                                         like_kind=like_kind)
-            like_statistics.last_change_at = datetime.now()
-            like_statistics.save(update_fields=['last_change_at'])
-
-        except LikeStatistics.DoesNotExist:
-            like_statistics_object = LikeStatistics(content_type=content_type, object_id=object_id, like_kind=like_kind,
-                                                    last_change_at=datetime.now(), like_counter=0)
-            like_statistics_object.save()
-
-        try:
-            like_comment_statistics = LikeCommentStatistics.objects.get(content_type=content_type,
-                                                                        object_id=object_id)
-            like_comment_statistics.last_like_or_comment_change_at = datetime.now()
-            like_comment_statistics.save(update_fields=['last_like_or_comment_change_at'])
-
-        except LikeCommentStatistics.DoesNotExist:
-            like_comment_statistics_object = LikeCommentStatistics(content_type=content_type, object_id=object_id,
-                                                                   last_like_or_comment_change_at=datetime.now())
-            like_comment_statistics_object.save()
-
-        if transaction is None and (content_type is None or object_id is None):
-            raise ValidationError("Не передан content_type или object_id или transaction_id")
-
-        if like_kind.id == like_kinds[0].id:
-            another_like_kind = like_kinds[1]
-        else:
-            another_like_kind = like_kinds[0]
-        try:
-            stat = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                              like_kind_id=another_like_kind.id)
-        except LikeStatistics.DoesNotExist:
-            another_like_kind_statistics_object = LikeStatistics(content_type=content_type, object_id=object_id,
-                                                                 like_kind=another_like_kind,
-                                                                 like_counter=0)
-            another_like_kind_statistics_object.save()
-
-        existing_like_different_like_type = Like.objects.filter(content_type=content_type, object_id=object_id,
-                                                                user=user, is_liked=True,
-                                                                like_kind_id=another_like_kind.id).first()
-        if existing_like_different_like_type is not None:
-            existing_like_different_like_type.is_liked = False
-            existing_like_different_like_type.date_deleted = datetime.now()
-            existing_like_different_like_type.save(update_fields=['is_liked', 'date_deleted'])
-
-            # update statistics for prev like_type from which like is retrieved
-            another_like_statistics = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                                                 like_kind_id=another_like_kind)
-            another_like_statistics.like_counter -= 1
-            another_like_statistics.last_change_at = datetime.now()
-            another_like_statistics.save(update_fields=['like_counter', 'last_change_at'])
-
-            like_statistics = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                                         like_kind=like_kind)
-            like_statistics.like_counter += 1
-            like_statistics.last_change_at = datetime.now()
-            like_statistics.save(update_fields=['like_counter', 'last_change_at'])
-
-            like = Like.objects.create(
-                user=user,
-                content_type=content_type,
-                object_id=object_id,
-                like_kind=like_kind,
-                is_liked=True,
-                date_deleted=None
-            )
-            return like.to_json()
+    if transaction is None and (content_type is None or object_id is None):
+        raise ValidationError("Не передан content_type или object_id или transaction_id")
+    try:
+        object_id = int(object_id)
+    except ValueError:
+        raise ValidationError("Неверно передан object_id")
+    try:
+        with tr.atomic():
+            like, is_new_reaction = toggle_like(user.pk, content_type, object_id, like_kind_id)
+    except IntegrityError:
+        logger.info(f"Попытка {user} поставить реакцию несуществующего типа {like_kind}")
+        raise ValidationError("Тип лайка не найден")
+    if is_new_reaction:
+        if model_name == 'transaction':
+            create_and_send_transaction_reactions_notifications(like, object_id, user)
+        if model_name == 'challenge':
+            create_and_send_challenge_reactions_notifications(like, object_id, user)
+        if model_name == 'comment':
+            create_and_send_comment_reactions_notifications(like, object_id, user)
+    return like.to_json()
+
+
+def toggle_like(user_id: int, content_type: ContentType, object_id: int, like_kind_id: int) -> Tuple[Like, bool]:
+    """
+    Переключение реакции пользователя на объекте за 2-3 запроса.
+    Возвращает снятую реакцию, если повторно нажат тот же тип, иначе новую,
+    и признак того, что до этого у пользователя не было реакции на объект
+    """
+    counters_deltas = {}
+    with connection.cursor() as cursor:
+        cursor.execute(REMOVE_ACTIVE_LIKE_QUERY, [content_type.pk, object_id, user_id])
+        removed_like = make_like(cursor.fetchone())
+        if removed_like is not None:
+            counters_deltas[removed_like.like_kind_id] = -1
+        if removed_like is not None and removed_like.like_kind_id == like_kind_id:
+            like = removed_like
         else:
-            existing_like_same_type_liked = Like.objects.filter(content_type=content_type, object_id=object_id,
-                                                                user=user, is_liked=True, like_kind=like_kind).first()
-            if existing_like_same_type_liked is not None:
-
-                like_statistics = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                                             like_kind=like_kind)
-                like_statistics.like_counter -= 1
-                like_statistics.last_change_at = datetime.now()
-                like_statistics.save(update_fields=['like_counter', 'last_change_at'])
-
-                existing_like_same_type_liked.is_liked = False
-                existing_like_same_type_liked.date_deleted = datetime.now()
-                existing_like_same_type_liked.save(update_fields=['is_liked', 'date_deleted'])
-                return existing_like_same_type_liked.to_json()
-            else:
-                like_statistics = LikeStatistics.objects.get(content_type=content_type, object_id=object_id,
-                                                             like_kind=like_kind)
-                like_statistics.like_counter += 1
-                like_statistics.last_change_at = datetime.now()
-                like_statistics.save(update_fields=['like_counter', 'last_change_at'])
-
-                like = Like.objects.create(content_type=content_type, object_id=object_id, user=user, is_liked=True,
-                                           like_kind=like_kind)
-                content_object = like.content_object
-                if content_object is None:
+            table = connection.ops.quote_name(content_type.model_class()._meta.db_table)
+            cursor.execute(INSERT_LIKE_QUERY.format(table=table),
+                           [content_type.pk, object_id, user_id, like_kind_id, object_id])
+            like = make_like(cursor.fetchone())
+            if like is None:
+                if not content_type.model_class().objects.filter(pk=object_id).exists():
                     raise ValidationError("Объекта с таким id не существует")
-                if model_name == 'transaction':
-                    create_and_send_transaction_reactions_notifications(like, object_id, user)
-                if model_name == 'challenge':
-                    create_and_send_challenge_reactions_notifications(like, object_id, user)
-                if model_name == 'comment':
-                    create_and_send_comment_reactions_notifications(like, object_id, user)
-                return like.to_json()
+                raise ValidationError("Реакция уже обрабатывается, повторите запрос")
+            counters_deltas[like_kind_id] = 1
+        if is_write_behind_enabled():
+            add_like_deltas(content_type.pk, object_id, counters_deltas)
+            return like, removed_like is None
+        values = ', '.join(['(%s, %s, %s, %s, now())'] * len(counters_deltas))
+        params = []
+        for kind_id, delta in counters_deltas.items():
+            params.extend([content_type.pk, object_id, kind_id, delta])
+        cursor.execute(UPDATE_LIKES_STATISTICS_QUERY.format(values=values), params + [content_type.pk, object_id])
+        change_feed_items_likes(cursor, [(content_type.pk, object_id, kind_id, delta)
+                                         for kind_id, delta in counters_deltas.items()])
+    return like, removed_like is None
+
+
+def make_like(row) -> Optional[Like]:
+    if row is None:
+        return None
+    return Like(**dict(zip([column.strip() for column in LIKE_COLUMNS.split(',')], row)))
 
 
 def create_and_send_comment_reactions_notifications(like, object_id, user):
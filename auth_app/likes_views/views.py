@@ -8,6 +8,8 @@ from rest_framework.views import APIView
 
 from auth_app.models import User, LikeKind
 from auth_app.serializers import LikeTransactionSerializer, LikeUserSerializer
+from utils.idempotency import idempotent
+from utils.throttling import RedisTokenBucketThrottle
 from .service import press_like
 from ..comments_views.service import get_object
 
@@ -101,13 +103,15 @@ class LikesUserListAPIView(APIView):
         user_id = request.data.get('user_id')
         like_kind = request.data.get('like_kind')
         include_code = request.data.get('include_code', False)
+        include_objects = request.data.get('include_objects', False)
         offset = request.data.get('offset', 0)
         limit = request.data.get('limit', 20)
 
         if type(offset) != int or type(limit) != int:
             return Response("offset и limit должны быть типа Int", status=status.HTTP_400_BAD_REQUEST)
-        if type(include_code) != bool:
-            return Response("include_name и include_code должны быть типа bool", status=status.HTTP_400_BAD_REQUEST)
+        if type(include_code) != bool or type(include_objects) != bool:
+            return Response("include_code и include_objects должны быть типа bool",
+                            status=status.HTTP_400_BAD_REQUEST)
 
         if like_kind is None:
             like_kind = "all"
@@ -119,7 +123,8 @@ class LikesUserListAPIView(APIView):
                                 "ни к одному типу лайка",
                                 status=status.HTTP_404_NOT_FOUND)
 
-        context = {"include_code": include_code, "like_kind": like_kind, "offset": offset, "limit": limit}
+        context = {"include_code": include_code, "like_kind": like_kind, "offset": offset, "limit": limit,
+                   "include_objects": include_objects}
 
         if user_id is not None:
             try:
@@ -142,8 +147,11 @@ class PressLikeView(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [authentication.SessionAuthentication,
                               authentication.TokenAuthentication]
+    throttle_classes = [RedisTokenBucketThrottle]
+    throttle_scope = 'press_like'
 
     @classmethod
+    @idempotent
     def post(cls, request, *args, **kwargs):
         user = User.objects.select_related('profile').filter(pk=request.user.pk).first()
         content_type = request.data.get('content_type')
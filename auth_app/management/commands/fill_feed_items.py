@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from auth_app.models import Event
+from utils.feed import FEED_OBJECTS, create_feed_items
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Заполнение проекции ленты feed_items по уже созданным событиям'
+
+    def handle(self, *args, **options):
+        events = (Event.objects
+                  .filter(object_selector__in=FEED_OBJECTS.keys(), scope__isnull=False, feed_item__isnull=True)
+                  .order_by('pk'))
+        last_id = 0
+        created = 0
+        while chunk := list(events.filter(pk__gt=last_id)[:CHUNK_SIZE]):
+            with transaction.atomic():
+                created += len(create_feed_items(chunk))
+            last_id = chunk[-1].pk
+        self.stdout.write(f"Создано записей ленты: {created}")
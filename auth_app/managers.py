@@ -137,25 +137,28 @@ class CustomTransactionQueryset(models.QuerySet):
                                     'sender_account__owner__profile',
                                     'recipient_account__owner__profile', 'from_challenge',
                                     'to_challenge')
-                    .prefetch_related('_objecttags')
                     .filter((Q(sender=current_user) | (Q(recipient=current_user) & ~(Q(status__in=['G', 'C', 'D']))) |
                              (Q(transaction_class='H') & Q(sender_account__owner=current_user)) |
                              (Q(transaction_class__in=['W', 'F']) & Q(recipient_account__owner=current_user)))))
-        return self.add_expire_to_cancel_field(queryset).order_by('-updated_at')
+        return self.add_expire_to_cancel_field(queryset).order_by('-updated_at', '-pk')
 
     def filter_by_user_limited(self, user, offset, limit):
         return self.filter_by_user(user)[offset * limit: offset * limit + limit]
 
+    def filter_by_user_sent(self, user):
+        return self.filter_by_user(user).filter(Q(sender=user) |
+                                                (Q(transaction_class='H') & Q(sender_account__owner=user)))
+
     def filter_by_user_sent_only(self, user, offset, limit):
-        return (self.filter_by_user(user).filter(Q(sender=user) |
-                                                 (Q(transaction_class='H') & Q(sender_account__owner=user)))
-                [offset * limit: offset * limit + limit])
+        return self.filter_by_user_sent(user)[offset * limit: offset * limit + limit]
 
-    def filter_by_user_received_only(self, user, offset, limit):
-        return (self.filter_by_user(user).filter(
+    def filter_by_user_received(self, user):
+        return self.filter_by_user(user).filter(
             (Q(recipient=user) & ~(Q(status__in=['G', 'C', 'D']))) |
             (Q(transaction_class__in=['W', 'F']) & Q(recipient_account__owner=user)))
-            [offset * limit: offset * limit + limit])
+
+    def filter_by_user_received_only(self, user, offset, limit):
+        return self.filter_by_user_received(user)[offset * limit: offset * limit + limit]
 
     def filter_to_use_by_controller(self):
         """
@@ -165,7 +168,6 @@ class CustomTransactionQueryset(models.QuerySet):
                     .select_related('sender__profile', 'recipient__profile', 'reason_def',
                                     'sender_account__owner__profile',
                                     'recipient_account__owner__profile')
-                    .prefetch_related('_objecttags')
                     .filter(status='W'))
         return self.add_expire_to_cancel_field(queryset).order_by('-created_at')
 
@@ -178,18 +180,22 @@ class CustomTransactionQueryset(models.QuerySet):
 
     def feed_version(self, user):
         from auth_app.models import Like
+        from utils.content_types import get_content_type_id
 
+        content_type_id = get_content_type_id('transaction')
         queryset = self.annotate(last_like_comment_time=F(
             'like_comment_statistics__last_like_or_comment_change_at'),
 
             user_liked=Exists(Like.objects.filter(
-                Q(object_id=OuterRef('pk'),
+                Q(content_type_id=content_type_id,
+                  object_id=OuterRef('pk'),
                   like_kind__code='like',
                   user_id=user.id,
                   is_liked=True))),
 
             user_disliked=Exists(Like.objects.filter(
-                Q(object_id=OuterRef('pk'),
+                Q(content_type_id=content_type_id,
+                  object_id=OuterRef('pk'),
                   like_kind__code='dislike',
                   user_id=user.id,
                   is_liked=True)
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:25
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_grace_timeout(apps, schema_editor):
+    Transaction = apps.get_model('auth_app', 'Transaction')
+    (Transaction.objects
+     .filter(status='G', grace_timeout__isnull=True)
+     .update(grace_timeout=models.F('created_at') + timedelta(seconds=settings.GRACE_PERIOD)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0066_profile_main_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_grace_timeout, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(condition=models.Q(('status', 'G')), fields=['grace_timeout'], name='transactions_in_grace_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_opening_snapshots(apps, schema_editor):
+    Account = apps.get_model('auth_app', 'Account')
+    AccountSnapshot = apps.get_model('auth_app', 'AccountSnapshot')
+    AccountSnapshot.objects.bulk_create(
+        [AccountSnapshot(account_id=account_id, amount=amount, last_entry_id=0)
+         for account_id, amount in Account.objects.values_list('id', 'amount').iterator()],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0067_transaction_grace_timeout_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='Изменение баланса (отрицательное - списание)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='auth_app.account', verbose_name='Счёт')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='auth_app.transaction', verbose_name='Транзакция')),
+            ],
+            options={
+                'db_table': 'ledger_entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=0, max_digits=10, verbose_name='Баланс')),
+                ('last_entry_id', models.PositiveBigIntegerField(default=0, verbose_name='Последняя учтённая запись журнала')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Время создания')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='auth_app.account', verbose_name='Счёт')),
+            ],
+            options={
+                'db_table': 'account_snapshots',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['account', 'id'], name='ledger_entries_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='accountsnapshot',
+            index=models.Index(fields=['account', '-last_entry_id'], name='account_snapshots_account_idx'),
+        ),
+        migrations.RunPython(create_opening_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:33
+
+from django.db import migrations, models
+
+DEDUPLICATE_LIKES_SQL = """
+UPDATE likes SET is_liked = false, date_deleted = now()
+WHERE is_liked AND id NOT IN (
+  SELECT DISTINCT ON (content_type_id, object_id, user_id) id
+  FROM likes
+  WHERE is_liked
+  ORDER BY content_type_id, object_id, user_id, id DESC
+);
+
+DELETE FROM like_statistics a USING like_statistics b
+WHERE a.content_type_id = b.content_type_id AND a.object_id = b.object_id
+  AND a.like_kind_id = b.like_kind_id AND a.id > b.id;
+
+UPDATE like_statistics s SET like_counter = (
+  SELECT count(*) FROM likes l
+  WHERE l.is_liked AND l.content_type_id = s.content_type_id
+    AND l.object_id = s.object_id AND l.like_kind_id = s.like_kind_id
+);
+
+DELETE FROM like_comment_statistics a USING like_comment_statistics b
+WHERE a.content_type_id = b.content_type_id AND a.object_id = b.object_id AND a.id > b.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0068_ledger_entries_account_snapshots'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DEDUPLICATE_LIKES_SQL, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_liked', True)), fields=('content_type', 'object_id', 'user'), name='likes_active_like_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='likecommentstatistics',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='like_comment_statistics_object_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='likestatistics',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id', 'like_kind'), name='like_statistics_object_kind_uniq'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0069_likes_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(condition=models.Q(('is_liked', True)), fields=['content_type', 'object_id', 'like_kind', '-date_created'], name='likes_active_by_kind_idx'),
+        ),
+    ]
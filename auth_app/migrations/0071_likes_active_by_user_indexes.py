@@ -0,0 +1,21 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0070_likes_active_by_kind_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(condition=models.Q(('is_liked', True)), fields=['user', '-date_created'], name='likes_active_by_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(condition=models.Q(('is_liked', True)), fields=['user', 'like_kind', 'date_created'], name='likes_active_by_user_kind_idx'),
+        ),
+    ]
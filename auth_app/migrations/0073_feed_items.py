@@ -0,0 +1,40 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+import rest_framework.utils.encoders
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('auth_app', '0072_list_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('event', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_item', serialize=False, to='auth_app.event', verbose_name='Событие')),
+                ('time', models.DateTimeField(verbose_name='Время события')),
+                ('object_id', models.IntegerField(verbose_name='id объекта')),
+                ('data', models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder, verbose_name='Данные события')),
+                ('likes_amount', models.IntegerField(default=0, verbose_name='Количество лайков')),
+                ('comments_amount', models.IntegerField(default=0, verbose_name='Количество комментариев')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Тип объекта')),
+                ('scope', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='auth_app.organization', verbose_name='Область видимости')),
+            ],
+            options={
+                'db_table': 'feed_items',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['scope', '-time', '-event'], name='feed_items_scope_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['content_type', 'object_id'], name='feed_items_object_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:49
+
+from django.db import migrations, models
+
+FILL_REPORTS_COUNTERS_SQL = """
+UPDATE challenges c SET
+  new_reports_count = r.new_reports_count,
+  approved_reports_count = r.approved_reports_count
+FROM (
+  SELECT challenge_id,
+         count(*) FILTER (WHERE state IN ('S', 'F', 'R')) AS new_reports_count,
+         count(*) FILTER (WHERE state IN ('A', 'W')) AS approved_reports_count
+  FROM challenge_reports
+  GROUP BY challenge_id
+) r
+WHERE r.challenge_id = c.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0073_feed_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='approved_reports_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подтверждённых отчётов'),
+        ),
+        migrations.AddField(
+            model_name='challenge',
+            name='new_reports_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество отчётов, ожидающих проверки'),
+        ),
+        migrations.RunSQL(FILL_REPORTS_COUNTERS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+FILL_CHALLENGE_USER_STATUS_SQL = """
+INSERT INTO challenge_user_status (challenge_id, user_id, is_creator, is_organizer, can_send_report, report_state)
+SELECT challenge_id, user_id, bool_or(is_creator), bool_or(is_organizer), bool_and(can_send_report),
+       (array_agg(report_state ORDER BY report_id DESC NULLS LAST))[1]
+FROM (
+  SELECT id AS challenge_id, creator_id AS user_id, true AS is_creator, false AS is_organizer,
+         true AS can_send_report, NULL::varchar AS report_state, NULL::integer AS report_id
+  FROM challenges
+  UNION ALL
+  SELECT id, organized_by_id, false, true, true, NULL, NULL
+  FROM challenges
+  UNION ALL
+  SELECT challenge_id, user_participant_id, false, true, true, NULL, NULL
+  FROM challenge_participants
+  WHERE 'O' = any(mode)
+  UNION ALL
+  SELECT r.challenge_id, p.user_participant_id, false, false, false, r.state, r.id
+  FROM challenge_reports r
+  JOIN challenge_participants p ON p.id = r.participant_id
+) s
+GROUP BY challenge_id, user_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('auth_app', '0074_challenge_reports_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChallengeUserStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_creator', models.BooleanField(default=False, verbose_name='Создатель челленджа')),
+                ('is_organizer', models.BooleanField(default=False, verbose_name='Организатор челленджа')),
+                ('can_send_report', models.BooleanField(default=True, verbose_name='Можно отправить отчёт')),
+                ('report_state', models.CharField(blank=True, choices=[('S', 'Направлен организатору для подтверждения'), ('F', 'В процессе оценки судьями'), ('A', 'Подтверждено'), ('D', 'Отклонено'), ('R', 'Повторно направлено организатору'), ('W', 'Получено вознаграждение')], max_length=1, null=True, verbose_name='Состояние последнего отчёта')),
+                ('challenge', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_statuses', to='auth_app.challenge', verbose_name='Челлендж')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='challenge_statuses', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'db_table': 'challenge_user_status',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='challengeuserstatus',
+            constraint=models.UniqueConstraint(fields=('challenge', 'user'), name='challenge_user_status_uniq'),
+        ),
+        migrations.RunSQL(FILL_CHALLENGE_USER_STATUS_SQL, migrations.RunSQL.noop),
+    ]
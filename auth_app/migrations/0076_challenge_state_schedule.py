@@ -0,0 +1,41 @@
+# Generated by Django 3.2.12 on 2026-10-17 17:53
+
+from django.db import migrations, models
+
+FILL_CHALLENGES_STATE_SQL = """
+UPDATE challenges SET state = 'C' WHERE 'C' = any(states);
+
+-- состояние остальных челленджей с заданными временными рамками вычислит планировщик
+UPDATE challenges SET next_transition_at = now()
+WHERE state <> 'C'
+  AND coalesce(registration_start_at, registration_end_at, reports_start_at, reports_end_at, end_at) IS NOT NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0075_challenge_user_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='challenge',
+            name='next_transition_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время следующей смены состояния'),
+        ),
+        migrations.AddField(
+            model_name='challenge',
+            name='state',
+            field=models.CharField(choices=[('P', 'Опубликован'), ('R', 'Идёт регистрация'), ('G', 'Идёт приём отчётов'), ('F', 'Подводятся итоги'), ('C', 'Завершен')], default='P', max_length=1, verbose_name='Текущее состояние'),
+        ),
+        migrations.AddIndex(
+            model_name='challenge',
+            index=models.Index(fields=['organization', 'state', '-id'], name='challenges_org_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='challenge',
+            index=models.Index(condition=models.Q(('next_transition_at__isnull', False)), fields=['next_transition_at'], name='challenges_next_transition_idx'),
+        ),
+        migrations.RunSQL(FILL_CHALLENGES_STATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.12 on 2026-10-17 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0076_challenge_state_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReactionCountersFlush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('batch_id', models.CharField(max_length=32, unique=True, verbose_name='Идентификатор сброшенного хэша')),
+                ('applied_at', models.DateTimeField(auto_now_add=True, verbose_name='Время записи в базу')),
+            ],
+            options={
+                'db_table': 'reaction_counters_flushes',
+            },
+        ),
+    ]
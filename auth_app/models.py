@@ -6,6 +6,7 @@ from django.contrib.postgres.fields import CITextField, CICharField
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from rest_framework.authtoken.models import Token
+from rest_framework.utils.encoders import JSONEncoder
 
 from auth_app.managers import *
 from utils.thumbnail_link import get_thumbnail_link
@@ -244,6 +245,10 @@ class Transaction(models.Model):
 
     class Meta:
         db_table = 'transactions'
+        indexes = [
+            models.Index(fields=['grace_timeout'], name='transactions_in_grace_idx', condition=Q(status='G')),
+            models.Index(fields=['-updated_at', '-id'], name='transactions_updated_at_idx')
+        ]
         constraints = [
             models.CheckConstraint(
                 name='check_sender_is_not_recipient',
@@ -298,6 +303,37 @@ class Account(models.Model):
         db_table = 'accounts'
 
 
+class LedgerEntry(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_entries',
+                                verbose_name='Счёт')
+    transaction = models.ForeignKey(Transaction, on_delete=models.SET_NULL, related_name='ledger_entries',
+                                    null=True, blank=True, verbose_name='Транзакция')
+    amount = models.DecimalField(max_digits=10, decimal_places=0,
+                                 verbose_name='Изменение баланса (отрицательное - списание)')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+
+    class Meta:
+        db_table = 'ledger_entries'
+        indexes = [
+            models.Index(fields=['account', 'id'], name='ledger_entries_account_idx')
+        ]
+
+
+class AccountSnapshot(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='snapshots',
+                                verbose_name='Счёт')
+    amount = models.DecimalField(max_digits=10, decimal_places=0, verbose_name='Баланс')
+    last_entry_id = models.PositiveBigIntegerField(default=0,
+                                                   verbose_name='Последняя учтённая запись журнала')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Время создания')
+
+    class Meta:
+        db_table = 'account_snapshots'
+        indexes = [
+            models.Index(fields=['account', '-last_entry_id'], name='account_snapshots_account_idx')
+        ]
+
+
 class Period(models.Model):
     start_date = models.DateField(verbose_name='С')
     end_date = models.DateField(verbose_name='По')
@@ -419,11 +455,37 @@ class Event(models.Model):
 
     class Meta:
         db_table = 'events'
+        indexes = [
+            models.Index(fields=['scope', '-time', '-id'], name='events_scope_time_idx')
+        ]
 
     def to_json(self):
         return {field: getattr(self, field) for field in self.__dict__ if not field.startswith('_')}
 
 
+class FeedItem(models.Model):
+    """
+    Проекция события ленты: данные события и объекта, готовые к выдаче, и счётчики реакций
+    """
+    event = models.OneToOneField(Event, on_delete=models.CASCADE, primary_key=True, related_name='feed_item',
+                                 verbose_name='Событие')
+    scope = models.ForeignKey(Organization, on_delete=models.SET_NULL, verbose_name='Область видимости', null=True,
+                              blank=True)
+    time = models.DateTimeField(verbose_name='Время события')
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name='Тип объекта')
+    object_id = models.IntegerField(verbose_name='id объекта')
+    data = models.JSONField(encoder=JSONEncoder, verbose_name='Данные события')
+    likes_amount = models.IntegerField(default=0, verbose_name='Количество лайков')
+    comments_amount = models.IntegerField(default=0, verbose_name='Количество комментариев')
+
+    class Meta:
+        db_table = 'feed_items'
+        indexes = [
+            models.Index(fields=['scope', '-time', '-event'], name='feed_items_scope_time_idx'),
+            models.Index(fields=['content_type', 'object_id'], name='feed_items_object_idx')
+        ]
+
+
 class Comment(models.Model):
     objects = CustomCommentQueryset.as_manager()
 
@@ -470,6 +532,9 @@ class Comment(models.Model):
 
     class Meta:
         db_table = 'comments'
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'date_created', 'id'], name='comments_object_created_idx')
+        ]
 
 
 class LikeKind(models.Model):
@@ -514,6 +579,18 @@ class Like(models.Model):
 
     class Meta:
         db_table = 'likes'
+        indexes = [
+            models.Index(fields=['content_type', 'object_id', 'like_kind', '-date_created'],
+                         name='likes_active_by_kind_idx', condition=Q(is_liked=True)),
+            models.Index(fields=['user', '-date_created'], name='likes_active_by_user_idx',
+                         condition=Q(is_liked=True)),
+            models.Index(fields=['user', 'like_kind', 'date_created'], name='likes_active_by_user_kind_idx',
+                         condition=Q(is_liked=True))
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'user'], condition=Q(is_liked=True),
+                                    name='likes_active_like_uniq')
+        ]
 
 
 class LikeStatistics(models.Model):
@@ -532,6 +609,10 @@ class LikeStatistics(models.Model):
 
     class Meta:
         db_table = 'like_statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'like_kind'],
+                                    name='like_statistics_object_kind_uniq')
+        ]
 
 
 class LikeCommentStatistics(models.Model):
@@ -557,6 +638,17 @@ class LikeCommentStatistics(models.Model):
 
     class Meta:
         db_table = 'like_comment_statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='like_comment_statistics_object_uniq')
+        ]
+
+
+class ReactionCountersFlush(models.Model):
+    batch_id = models.CharField(max_length=32, unique=True, verbose_name='Идентификатор сброшенного хэша')
+    applied_at = models.DateTimeField(auto_now_add=True, verbose_name='Время записи в базу')
+
+    class Meta:
+        db_table = 'reaction_counters_flushes'
 
 
 class Tag(models.Model):
@@ -732,6 +824,10 @@ class Challenge(models.Model):
                                                        'выполнении задания участниками')
     end_at = models.DateTimeField(null=True, blank=True, verbose_name='Время завершения вызова')
     states = ArrayField(models.CharField(max_length=1, choices=ChallengeState.choices), size=5)
+    state = models.CharField(max_length=1, choices=ChallengeState.choices, default=ChallengeState.PUBLISHED,
+                             verbose_name='Текущее состояние')
+    next_transition_at = models.DateTimeField(null=True, blank=True,
+                                              verbose_name='Время следующей смены состояния')
     to_hold = models.ForeignKey(Organization, related_name='challengestohold', on_delete=models.CASCADE,
                                 null=True, blank=True,
                                 verbose_name='Организация, от имени которой проводится вызов')
@@ -767,9 +863,18 @@ class Challenge(models.Model):
     list_visibility = models.JSONField(null=True, blank=True, verbose_name='Видимость списков')
     participants_count = models.PositiveIntegerField(default=0, verbose_name='Текущее количество участников')
     winners_count = models.PositiveIntegerField(default=0, verbose_name='Текущее количество победителей')
+    approved_reports_count = models.PositiveIntegerField(default=0,
+                                                         verbose_name='Количество подтверждённых отчётов')
+    new_reports_count = models.PositiveIntegerField(default=0, verbose_name='Количество отчётов, ожидающих проверки')
 
     class Meta:
         db_table = 'challenges'
+        indexes = [
+            models.Index(fields=['organization', '-id'], name='challenges_organization_idx'),
+            models.Index(fields=['organization', 'state', '-id'], name='challenges_org_state_idx'),
+            models.Index(fields=['next_transition_at'], name='challenges_next_transition_idx',
+                         condition=models.Q(next_transition_at__isnull=False))
+        ]
 
     def __str__(self):
         return self.name
@@ -854,6 +959,24 @@ class ChallengeReport(models.Model):
             return self.photo.url
 
 
+class ChallengeUserStatus(models.Model):
+    challenge = models.ForeignKey(Challenge, on_delete=models.CASCADE, related_name='user_statuses',
+                                  verbose_name='Челлендж')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='challenge_statuses',
+                             verbose_name='Пользователь')
+    is_creator = models.BooleanField(default=False, verbose_name='Создатель челленджа')
+    is_organizer = models.BooleanField(default=False, verbose_name='Организатор челленджа')
+    can_send_report = models.BooleanField(default=True, verbose_name='Можно отправить отчёт')
+    report_state = models.CharField(max_length=1, choices=ReportTypes.choices, null=True, blank=True,
+                                    verbose_name='Состояние последнего отчёта')
+
+    class Meta:
+        db_table = 'challenge_user_status'
+        constraints = [
+            models.UniqueConstraint(fields=['challenge', 'user'], name='challenge_user_status_uniq')
+        ]
+
+
 class FCMToken(models.Model):
     token = models.CharField(max_length=255, verbose_name='Токен', db_index=True)
     device = models.CharField(max_length=255, verbose_name='Устройство', default='')
@@ -888,11 +1011,40 @@ class Notification(models.Model):
 
     class Meta:
         db_table = 'notifications'
+        indexes = [
+            models.Index(fields=['user', '-id'], name='notifications_user_idx')
+        ]
 
     def to_json(self):
         return {field: getattr(self, field) for field in self.__dict__ if not field.startswith('_')}
 
 
+@receiver(post_save, sender=Transaction)
+def push_transaction_to_timelines(instance: Transaction, created: bool, **kwargs):
+    # транзакции, попадающие в ленту при смене статуса, раздаются в ленты там, где меняется статус
+    if not created:
+        return
+    from django.db import transaction
+    from utils.timelines import push_transactions_to_timelines
+
+    transaction.on_commit(lambda: push_transactions_to_timelines([instance]))
+
+
+@receiver(post_save, sender=Challenge)
+def invalidate_challenge_list_on_challenge_save(instance: Challenge, **kwargs):
+    from utils.challenge_list_cache import invalidate_challenge_list_cache
+
+    invalidate_challenge_list_cache(instance.organization_id)
+
+
+@receiver(post_save, sender=ChallengeReport)
+def invalidate_challenge_list_on_report_save(instance: ChallengeReport, **kwargs):
+    from utils.challenge_list_cache import invalidate_challenge_list_cache
+
+    organization_id = Challenge.objects.filter(pk=instance.challenge_id).values_list('organization_id', flat=True)
+    invalidate_challenge_list_cache(organization_id.first())
+
+
 @receiver(post_save, sender=User)
 def create_auth_token(instance: User, created: bool, **kwargs):
     if created:
@@ -1,8 +1,9 @@
 from datetime import timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 from auth_app.models import Notification
 from utils.notification_services import NOTIFICATION_TYPE_DATA
+from utils.paginates import paginate_queryset
 
 FIELDS = (
     'id', 'type', 'object_id', 'theme', 'data',
@@ -10,12 +11,13 @@ FIELDS = (
 )
 
 
-def get_notification_list_by_user(user_id: int, offset: int, limit: int) -> List[Dict]:
-    notifications = [notification for notification in Notification.objects
-                     .filter(user_id=user_id)
-                     .only(*FIELDS)
-                     .order_by('-pk')
-                     [offset * limit: offset * limit + limit]]
+def get_notification_list_by_user(user_id: int, offset: int, limit: int,
+                                  cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    notifications, next_cursor = paginate_queryset(Notification.objects
+                                                   .filter(user_id=user_id)
+                                                   .only(*FIELDS)
+                                                   .order_by('-pk'),
+                                                   offset * limit, limit, cursor)
     notifications_list = []
     not_read_notifications = [notification for notification in notifications if not notification.read]
     if not_read_notifications:
@@ -32,7 +34,7 @@ def get_notification_list_by_user(user_id: int, offset: int, limit: int) -> List
             "updated_at": notification.updated_at + timedelta(hours=3)
         }
         notifications_list.append(notification_data)
-    return notifications_list
+    return notifications_list, next_cursor
 
 
 def set_read_true_to_notification(notifications):
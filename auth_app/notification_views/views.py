@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from utils.notification_services import get_amount_of_unread_notifications
-from utils.paginates import process_offset_and_limit
+from utils.paginates import process_cursor_offset_and_limit, set_next_cursor
 from utils.query_debugger import query_debugger
 from .services import get_notification_list_by_user
 from ..models import Notification
@@ -20,9 +20,9 @@ class NotificationList(APIView):
     def get(cls, request, *args, **kwargs):
         offset = request.GET.get('offset')
         limit = request.GET.get('limit')
-        offset, limit = process_offset_and_limit(offset, limit)
-        notification_list = get_notification_list_by_user(request.user.id, offset, limit)
-        return Response(data=notification_list)
+        cursor, offset, limit = process_cursor_offset_and_limit(request.GET.get('cursor'), offset, limit)
+        notification_list, next_cursor = get_notification_list_by_user(request.user.id, offset, limit, cursor)
+        return set_next_cursor(Response(data=notification_list), next_cursor)
 
 
 class GetUnreadNotificationsCount(APIView):
@@ -10,6 +10,7 @@ from rest_framework.exceptions import ValidationError
 
 from auth_app.models import Contact, Profile, Organization, UserRole, Account, Transaction, UserStat
 from utils.handle_image import process_instance_image
+from utils.ledger import write_ledger_entries
 
 PASSWORD = settings.DEFAULT_USER_PASSWORD
 logger = logging.getLogger(__name__)
@@ -196,6 +197,8 @@ class EmployeeSerializer(serializers.Serializer):
                 distr_account.save(update_fields=['amount'])
                 system_account.save(update_fields=['amount'])
                 user_stat.save(update_fields=['distr_initial'])
+                write_ledger_entries([(distr_account.pk, amount, _transaction.pk),
+                                      (system_account.pk, -amount, _transaction.pk)])
         return user
 
 
@@ -1,23 +1,24 @@
 import logging
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.db import transaction
-from django.db.models import F
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from auth_app.models import (Profile, Account, Transaction,
-                             UserStat, Period, Contact,
+                             Period, Contact,
                              UserRole, Tag, ObjectTag,
                              Comment, Like, LikeKind,
                              LikeStatistics,
-                             LikeCommentStatistics)
+                             LikeCommentStatistics, Reason)
+from auth_app.tasks import settle_transaction, settle_transactions
 from utils.crop_photos import crop_image
 from utils.current_period import get_current_period
 from utils.handle_image import change_filename
+from utils.paginates import paginate_queryset
 from utils.query_debugger import query_debugger
 from utils.thumbnail_link import get_thumbnail_link
 
@@ -144,9 +145,9 @@ class CommentTransactionSerializer(serializers.ModelSerializer):
         is_reverse_order = self.context.get('is_reverse_order')
 
         if is_reverse_order:
-            order_by = "-date_created"
+            order_by = ("-date_created", "-id")
         else:
-            order_by = "date_created"
+            order_by = ("date_created", "id")
         comments = []
 
         comments_on_transaction = (Comment.objects.filter_by_object(content_type=obj['content_type'],
@@ -158,8 +159,10 @@ class CommentTransactionSerializer(serializers.ModelSerializer):
                                          'text',
                                          'picture',
                                          'date_created',
-                                         'date_last_modified').order_by(order_by))
-        comments_on_transaction_cut = comments_on_transaction[offset: offset + limit]
+                                         'date_last_modified').order_by(*order_by))
+        comments_on_transaction_cut, self.context['next_cursor'] = paginate_queryset(
+            comments_on_transaction, offset, limit, self.context.get('cursor'),
+            time_field='date_created', descending=is_reverse_order)
         for i in range(len(comments_on_transaction_cut)):
 
             comment_info = {
@@ -209,6 +212,8 @@ class LikeTransactionSerializer(serializers.ModelSerializer):
 
     @query_debugger
     def get_likes(self, obj):
+        from auth_app.likes_views.service import get_likes_page_by_kinds
+
         include_code = self.context.get('include_code')
         include_name = self.context.get('include_name')
         like_kind_id = self.context.get('like_kind')
@@ -223,38 +228,27 @@ class LikeTransactionSerializer(serializers.ModelSerializer):
             like_kinds = [(like_kind.id, like_kind.code, like_kind.name, like_kind.get_icon_url()) for like_kind in
                           [LikeKind.objects.get(id=like_kind_id)]]
 
-        users_liked = [(like.date_created, like.user, like.like_kind_id)
-                       for like in Like.objects.select_related('user__profile', 'like_kind', 'transaction')
-                       .only("id", "date_created", 'user__profile__first_name', 'user__profile__photo', 'like_kind',
-                             'transaction__id').
-                       filter(content_type=obj['content_type'], object_id=obj['object_id'], is_liked=True).order_by(
-                '-date_created')]
+        likes_by_kinds = get_likes_page_by_kinds(obj['content_type'], obj['object_id'],
+                                                 [like_kind[0] for like_kind in like_kinds], offset, limit)
 
         for like_kind in like_kinds:
             items = []
-            counter = 0
-            index = 0
-            for i in range(len(users_liked)):
-
-                if users_liked[i][2] == like_kind[0]:
-                    if index >= offset and counter < limit:
-                        user_info = {"time_of": users_liked[i][0]}
-                        if include_name:
-                            this_user = {
-                                'id': users_liked[i][1].id,
-                                'name': users_liked[i][1].profile.first_name,
-                                'surname': users_liked[i][1].profile.surname,
-                                'avatar': users_liked[i][1].profile.get_photo_url()
-                            }
-
-                        else:
-                            this_user = {
-                                'id': users_liked[i][1].id
-                            }
-                        user_info['user'] = this_user
-                        items.append(user_info)
-                        counter += 1
-                    index += 1
+            for like in likes_by_kinds[like_kind[0]]:
+                user_info = {"time_of": like.date_created}
+                if include_name:
+                    this_user = {
+                        'id': like.user.id,
+                        'name': like.user.profile.first_name,
+                        'surname': like.user.profile.surname,
+                        'avatar': like.user.profile.get_photo_url()
+                    }
+
+                else:
+                    this_user = {
+                        'id': like.user.id
+                    }
+                user_info['user'] = this_user
+                items.append(user_info)
 
             if include_code:
                 likes.append(
@@ -297,6 +291,8 @@ class LikeUserSerializer(serializers.ModelSerializer):
 
     @query_debugger
     def get_likes(self, obj):
+        from auth_app.likes_views.service import get_liked_objects
+
         include_code = self.context.get('include_code')
         like_kind_id = self.context.get('like_kind')
         offset = self.context.get('offset')
@@ -312,48 +308,28 @@ class LikeUserSerializer(serializers.ModelSerializer):
         items = []
 
         if like_kind_id != 'all':
-            like_kind = LikeKind.objects.get(id=like_kind_id)
-
-            transactions_liked = [(like.content_type, like.object_id, like.date_created)
-                                  for like in Like.objects.filter_by_user_and_like_kind(obj.id, like_kind).
-                                  order_by('date_created')]
-
-            transactions_liked_cut = transactions_liked[offset:offset + limit]
-            for i in range(len(transactions_liked_cut)):
-                model_id = transactions_liked_cut[i][0].name + '_id'
-                object_info = {
-                    model_id: transactions_liked_cut[i][1],
-                    "time_of": transactions_liked_cut[i][2],
-                    "like_kind": like_kind_id
-                }
-                items.append(object_info)
-            likes['items'] = items
-
-            if len(transactions_liked_cut) == 0:
-                items.append(None)
-                likes['items'] = items
-            return likes
-
+            user_likes = (Like.objects.filter_by_user_and_like_kind(obj.id, like_kind_id)
+                          .order_by('date_created', 'id'))
         else:
-            transactions_liked = [(like.content_type, like.object_id, like.date_created, like.like_kind_id)
-                                  for like in Like.objects.filter_by_user(obj.id).order_by('-date_created')]
-            transactions_liked_cut = transactions_liked[offset: offset + limit]
-            for i in range(len(transactions_liked_cut)):
-                model_id = transactions_liked_cut[i][0].name + '_id'
-
-                items.append(
-                    {
-                        model_id: transactions_liked_cut[i][1],
-                        "time_of": transactions_liked_cut[i][2],
-                        "like_kind": transactions_liked_cut[i][3]
-                    }
-                )
-                likes['items'] = items
+            user_likes = Like.objects.filter_by_user(obj.id).order_by('-date_created', '-id')
+        user_likes = list(user_likes.only('content_type_id', 'object_id', 'date_created', 'like_kind_id')
+                          [offset:offset + limit])
+        liked_objects = get_liked_objects(user_likes) if self.context.get('include_objects') else {}
+        for like in user_likes:
+            content_type = ContentType.objects.get_for_id(like.content_type_id)
+            object_info = {
+                content_type.name + '_id': like.object_id,
+                "time_of": like.date_created,
+                "like_kind": like_kind_id if like_kind_id != 'all' else like.like_kind_id
+            }
+            if liked_objects:
+                object_info['object'] = liked_objects.get((like.content_type_id, like.object_id))
+            items.append(object_info)
 
-            if len(transactions_liked_cut) == 0:
-                items = None
-                likes['items'] = items
-            return likes
+        if len(user_likes) == 0:
+            items = [None] if like_kind_id != 'all' else None
+        likes['items'] = items
+        return likes
 
     class Meta:
         model = Like
@@ -523,11 +499,12 @@ class AccountSerializer(serializers.ModelSerializer):
 class TransactionPartialSerializer(serializers.ModelSerializer):
     photo = serializers.ImageField(required=False)
     tags = serializers.SerializerMethodField(required=False)
+    is_public = serializers.BooleanField(default=True)
 
     class Meta:
         model = Transaction
         fields = ['recipient', 'amount',
-                  'photo', 'is_anonymous',
+                  'photo', 'is_anonymous', 'is_public',
                   'reason', 'reason_def', 'tags']
 
     def get_tags(self, obj):
@@ -542,7 +519,8 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
             pass
 
     def create(self, validated_data):
-        from_income = False
+        from auth_app.service import lock_user_accounts, change_accounts_amounts, change_user_stat
+
         request = self.context.get('request')
         tags = request.data.get('tags')
         sender = self.context['request'].user
@@ -553,29 +531,16 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
         amount = self.validated_data['amount']
         current_period = get_current_period(sender.profile.organization_id)
         is_anonymous = self.validated_data['is_anonymous']
-        tags = self.make_validations(amount, current_period, reason, recipient, sender, tags)
-        sender_distr_account = Account.objects.filter(
-            owner=sender, account_type='D', challenge_id=None).first()
-        account_to_save = sender_distr_account
-        current_account_amount = sender_distr_account.amount
-        if current_account_amount == 0:
-            sender_income_account = Account.objects.filter(
-                owner=sender, account_type='I', challenge_id=None).first()
-            current_account_amount = sender_income_account.amount
-            from_income = True
-            account_to_save = sender_income_account
-        if current_account_amount - amount < 0:
-            logger.info(f"Попытка {sender} перевести сумму больше имеющейся на счету распределения")
-            raise ValidationError("Нельзя перевести больше, чем есть на счету")
-        if current_account_amount // 2 < amount and current_account_amount > 50:
-            logger.info(f"Попытка {sender} перевести сумму, большую либо равную "
-                        f"имеющейся сумме на счету распределения")
-            raise ValidationError("Перевести можно до 50% имеющейся "
-                                  "суммы на счету распределения")
-        sender_frozen_account = Account.objects.filter(
-            owner=sender, account_type='F', challenge_id=None).first()
-        sender_user_stat = UserStat.objects.get(user=sender, period=current_period)
+        tags = self.make_validations(amount, current_period, reason, [recipient], sender, tags)
         with transaction.atomic():
+            sender_accounts = lock_user_accounts(sender.pk, ['D', 'I', 'F'])
+            account_to_save = sender_accounts.get('D')
+            from_income = False
+            if account_to_save.amount == 0:
+                account_to_save = sender_accounts.get('I')
+                from_income = True
+            self.validate_sender_balance(sender, account_to_save.amount, amount)
+            sender_frozen_account = sender_accounts.get('F')
             transaction_instance = Transaction.objects.create(
                 sender=self.context['request'].user,
                 sender_account=account_to_save,
@@ -584,27 +549,19 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
                 amount=self.validated_data['amount'],
                 status='G',
                 reason=reason,
-                is_public=True,
+                is_public=self.validated_data['is_public'],
                 is_anonymous=is_anonymous,
                 period=current_period,
                 photo=photo,
-                reason_def_id=reason_def
+                reason_def_id=reason_def,
+                grace_timeout=datetime.now(timezone.utc) + timedelta(seconds=settings.GRACE_PERIOD)
             )
+            change_accounts_amounts({account_to_save.pk: -amount, sender_frozen_account.pk: amount},
+                                    transaction_instance)
             if not from_income:
-                sender_distr_account.amount -= amount
-                sender_distr_account.transaction = transaction_instance
-                sender_user_stat.distr_thanks += amount
-                sender_distr_account.save(update_fields=['amount', 'transaction'])
-                sender_user_stat.save(update_fields=['distr_thanks'])
+                change_user_stat(sender.pk, current_period, distr_thanks=amount)
             else:
-                sender_income_account.amount -= amount
-                sender_income_account.transaction = transaction_instance
-                sender_user_stat.income_used_for_thanks += amount
-                sender_income_account.save(update_fields=['amount', 'transaction'])
-                sender_user_stat.save(update_fields=['income_used_for_thanks'])
-            sender_frozen_account.amount += amount
-            sender_frozen_account.transaction = transaction_instance
-            sender_frozen_account.save(update_fields=['amount', 'transaction'])
+                change_user_stat(sender.pk, current_period, income_used_for_thanks=amount)
             if tags:
                 for tag in tags:
                     ObjectTag.objects.create(
@@ -617,14 +574,21 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
                 transaction_instance.photo.name = change_filename(transaction_instance.photo.name)
                 transaction_instance.save(update_fields=['photo'])
                 crop_image(transaction_instance.photo.name, f"{settings.BASE_DIR}/media/")
+            transaction.on_commit(lambda: settle_transaction.apply_async(
+                (transaction_instance.pk,), eta=transaction_instance.grace_timeout))
             return transaction_instance
 
     @classmethod
-    def make_validations(cls, amount, current_period, reason, recipient, sender, tags):
-        if not recipient.is_active:
-            raise ValidationError("Нельзя отправить спасибки пользователю, чье участие в программе приостановлено")
-        if recipient.profile.organization_id != sender.profile.organization_id:
-            raise ValidationError("Нельзя отправлять спасибки между организациями")
+    def make_validations(cls, amount, current_period, reason, recipients, sender, tags):
+        """
+        Проверки перевода спасибок получателям, общие для одиночной и массовой отправки.
+        Возвращает список id ценностей
+        """
+        for recipient in recipients:
+            if not recipient.is_active:
+                raise ValidationError("Нельзя отправить спасибки пользователю, чье участие в программе приостановлено")
+            if recipient.profile.organization_id != sender.profile.organization_id:
+                raise ValidationError("Нельзя отправлять спасибки между организациями")
         if amount <= 0:
             logger.info(f"Попытка {sender} перевести сумму меньше либо равную нулю")
             raise ValidationError("Нельзя перевести сумму меньше либо равную нулю")
@@ -635,9 +599,25 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
             logger.error(f"Не переданы ни своё обоснование, ни ценность")
             raise ValidationError("Нужно либо заполнить поле обоснования, "
                                   "либо указать ID существующего тега (ценности)")
-        if recipient.accounts.filter(account_type__in=['S', 'T']).exists():
+        if Account.objects.filter(owner_id__in=[recipient.pk for recipient in recipients],
+                                  account_type__in=['S', 'T']).exists():
             logger.info(f"Попытка отправить спасибки на системный аккаунт")
             raise ValidationError('Нельзя отправлять спасибки на системный аккаунт')
+        return cls.validate_tags_string(tags)
+
+    @classmethod
+    def validate_sender_balance(cls, sender, account_amount, amount):
+        if account_amount - amount < 0:
+            logger.info(f"Попытка {sender} перевести сумму больше имеющейся на счету распределения")
+            raise ValidationError("Нельзя перевести больше, чем есть на счету")
+        if account_amount // 2 < amount and account_amount > 50:
+            logger.info(f"Попытка {sender} перевести сумму, большую либо равную "
+                        f"имеющейся сумме на счету распределения")
+            raise ValidationError("Перевести можно до 50% имеющейся "
+                                  "суммы на счету распределения")
+
+    @classmethod
+    def validate_tags_string(cls, tags):
         if tags is not None:
             if not isinstance(tags, str):
                 logger.info(f"Попытка передать ценности не строкой")
@@ -645,7 +625,7 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
             else:
                 try:
                     tags_list = list(map(int, tags.split()))
-                    possible_tag_ids = set(Tag.objects.values_list('id', flat=True))
+                    possible_tag_ids = set(Tag.objects.filter(id__in=tags_list).values_list('id', flat=True))
                     for tag in tags_list:
                         if tag not in possible_tag_ids:
                             logger.info(f"Ценность (тег) с ID {tag} не найдена")
@@ -655,6 +635,95 @@ class TransactionPartialSerializer(serializers.ModelSerializer):
                     raise ValidationError(f'Передайте строку в виде "1 2 3"')
 
 
+class TransactionBulkSerializer(serializers.Serializer):
+    recipients = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=0)
+    is_anonymous = serializers.BooleanField(default=False)
+    is_public = serializers.BooleanField(default=True)
+    reason = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    reason_def = serializers.PrimaryKeyRelatedField(queryset=Reason.objects.all(), required=False, allow_null=True)
+    tags = serializers.CharField(required=False, allow_null=True)
+
+    def create(self, validated_data):
+        from auth_app.service import lock_user_accounts, change_accounts_amounts, change_user_stat
+
+        sender = self.context['request'].user
+        recipients_ids = list(dict.fromkeys(validated_data['recipients']))
+        amount = validated_data['amount']
+        reason = validated_data.get('reason')
+        reason_def = validated_data.get('reason_def')
+        is_anonymous = validated_data['is_anonymous']
+        current_period = get_current_period(sender.profile.organization_id)
+        recipients = self.get_recipients(recipients_ids)
+        tags = self.make_validations(amount, current_period, reason, recipients, sender, validated_data.get('tags'))
+        total_amount = amount * len(recipients)
+        with transaction.atomic():
+            sender_accounts = lock_user_accounts(sender.pk, ['D', 'I', 'F'])
+            account_to_save = sender_accounts.get('D')
+            from_income = False
+            if account_to_save.amount == 0:
+                account_to_save = sender_accounts.get('I')
+                from_income = True
+            current_account_amount = account_to_save.amount
+            for _ in recipients:
+                TransactionPartialSerializer.validate_sender_balance(sender, current_account_amount, amount)
+                current_account_amount -= amount
+            sender_frozen_account = sender_accounts.get('F')
+            grace_timeout = datetime.now(timezone.utc) + timedelta(seconds=settings.GRACE_PERIOD)
+            transactions = Transaction.objects.bulk_create([
+                Transaction(
+                    sender=sender,
+                    sender_account=account_to_save,
+                    recipient=recipient,
+                    transaction_class='T',
+                    amount=amount,
+                    status='G',
+                    reason=reason,
+                    is_public=validated_data['is_public'],
+                    is_anonymous=is_anonymous,
+                    period=current_period,
+                    reason_def=reason_def,
+                    grace_timeout=grace_timeout
+                ) for recipient in recipients])
+            # баланс меняется один раз на всю сумму, в журнал пишется пара записей на каждую транзакцию
+            ledger_entries = []
+            for transaction_instance in transactions:
+                ledger_entries.append((account_to_save.pk, -amount, transaction_instance.pk))
+                ledger_entries.append((sender_frozen_account.pk, amount, transaction_instance.pk))
+            change_accounts_amounts({account_to_save.pk: -total_amount, sender_frozen_account.pk: total_amount},
+                                    transactions[-1], ledger_entries)
+            if not from_income:
+                change_user_stat(sender.pk, current_period, distr_thanks=total_amount)
+            else:
+                change_user_stat(sender.pk, current_period, income_used_for_thanks=total_amount)
+            if tags:
+                ObjectTag.objects.bulk_create([
+                    ObjectTag(tag_id=tag, tagged_object=transaction_instance, created_by_id=sender.pk)
+                    for transaction_instance in transactions for tag in tags])
+            logger.info(f"{sender} отправил(а) по {amount} спасибок на счета {len(recipients)} пользователей")
+            transactions_ids = [transaction_instance.pk for transaction_instance in transactions]
+            transaction.on_commit(lambda: settle_transactions.apply_async((transactions_ids,), eta=grace_timeout))
+            return transactions
+
+    @classmethod
+    def get_recipients(cls, recipients_ids):
+        recipients = list(User.objects
+                          .select_related('profile')
+                          .filter(pk__in=recipients_ids)
+                          .only('id', 'is_active', 'username', 'profile__organization_id'))
+        if len(recipients) != len(recipients_ids):
+            missing_ids = set(recipients_ids) - {recipient.pk for recipient in recipients}
+            raise ValidationError(f"Пользователи с id {', '.join(map(str, sorted(missing_ids)))} не найдены")
+        return recipients
+
+    @classmethod
+    def make_validations(cls, amount, current_period, reason, recipients, sender, tags):
+        if sender.pk in {recipient.pk for recipient in recipients}:
+            logger.info(f"Попытка {sender} перевести спасибки самому себе")
+            raise ValidationError("Нельзя отправлять спасибки самому себе")
+        return TransactionPartialSerializer.make_validations(amount, current_period, reason, recipients, sender, tags)
+
+
 class TransactionFullSerializer(serializers.ModelSerializer):
     sender = serializers.SerializerMethodField()
     sender_id = serializers.SerializerMethodField()
@@ -768,7 +837,13 @@ class TransactionFullSerializer(serializers.ModelSerializer):
         return False
 
     def get_tags(self, obj):
-        return obj._objecttags.values('tag_id', name=F('tag__name'))
+        # для списков ценности загружаются в представлении одним запросом и передаются в context
+        tags = self.context.get('transactions_tags')
+        if tags is None:
+            from utils.loaders import get_transactions_tags
+
+            tags = get_transactions_tags([obj.pk])
+        return tags.get(obj.pk, [])
 
     def get_reason_def(self, obj):
         if obj.reason_def is not None:
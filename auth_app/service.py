@@ -1,25 +1,40 @@
+import datetime
 import logging
 from dataclasses import dataclass
-from typing import Dict, List
+from decimal import Decimal
+from typing import Dict, List, Optional, Iterable, Tuple
 
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.db.models import Q, F
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from auth_app.models import (Transaction, TransactionState, UserStat,
-                             Account, Notification)
+                             Account, Notification, Event, EventTypes)
 from auth_app.serializers import TransactionCancelSerializer
-from utils.current_period import get_period, get_current_period
-from utils.notification_services import update_transaction_status_in_sender_notification
+from auth_app.tasks import send_multiple_notifications
+from utils.current_period import get_period, get_current_period, get_current_periods_for_all_organizations
+from utils.fcm_services import get_users_tokens_map
+from utils.event_types import get_event_type, TRANSACTION_EVENT_TYPE
+from utils.feed import create_feed_items
+from utils.ledger import write_ledger_entries
+from utils.notification_services import (update_transaction_status_in_sender_notification,
+                                         get_notification_message_for_thanks_receiver,
+                                         get_notification_data)
 from utils.thumbnail_link import get_thumbnail_link
+from utils.timelines import push_transactions_to_timelines
 
 User = get_user_model()
 
 logger = logging.getLogger(__name__)
 
+SETTLEMENT_CHUNK_SIZE = 200
+# допуск для задач с ETA, которые воркер может запустить чуть раньше окончания grace периода
+SETTLEMENT_ETA_TOLERANCE = datetime.timedelta(seconds=30)
+
 
 class VerifyTransactionItemError(Exception):
     pass
@@ -67,6 +82,64 @@ def is_controller_data_is_valid(data) -> bool:
         return False
 
 
+class InsufficientFundsError(ValidationError):
+    default_detail = "Нельзя перевести больше, чем есть на счету"
+
+
+def lock_user_accounts(user_id: int, account_types: Iterable[str]) -> Dict[str, Account]:
+    """
+    Блокировка личных счетов пользователя (без счетов челленджей) в порядке первичного ключа.
+    Возвращает счета с актуальными балансами по типу счёта
+    """
+    return {account.account_type: account
+            for account in Account.objects.select_for_update()
+            .filter(owner_id=user_id, challenge_id=None, account_type__in=list(account_types))
+            .only('id', 'owner_id', 'account_type', 'amount')
+            .order_by('pk')}
+
+
+def change_accounts_amounts(changes: Dict[int, Decimal],
+                            transaction_instance: Optional[Transaction] = None,
+                            ledger_entries: Optional[List[Tuple[int, Decimal, Optional[int]]]] = None
+                            ) -> Dict[int, Decimal]:
+    """
+    Изменение балансов счетов в рамках одной транзакции в БД.
+    changes - словарь {id счёта: изменение суммы}, отрицательное значение означает списание.
+    Строки блокируются в порядке первичного ключа, чтобы параллельные запросы не взаимоблокировались,
+    списание выполняется условным UPDATE (amount >= суммы списания), поэтому баланс
+    не может уйти в минус. ledger_entries - записи журнала (id счёта, сумма, id транзакции) вместо
+    записей по changes, когда одно изменение баланса складывается из нескольких транзакций;
+    их суммы по счетам должны совпадать с changes. Возвращает новые балансы счетов
+    """
+    with transaction.atomic():
+        list(Account.objects.select_for_update().filter(pk__in=changes.keys())
+             .order_by('pk').values_list('pk', flat=True))
+        for account_id in sorted(changes):
+            delta = changes[account_id]
+            queryset = Account.objects.filter(pk=account_id)
+            if delta < 0:
+                queryset = queryset.filter(amount__gte=-delta)
+            update_fields = {'amount': F('amount') + delta}
+            if transaction_instance is not None:
+                update_fields['transaction'] = transaction_instance
+            if not queryset.update(**update_fields):
+                logger.info(f"Недостаточно средств на счёте с id {account_id} для списания {-delta}")
+                raise InsufficientFundsError()
+        if ledger_entries is None:
+            ledger_entries = [(account_id, delta, transaction_instance.pk if transaction_instance else None)
+                              for account_id, delta in changes.items()]
+        write_ledger_entries(ledger_entries)
+        return dict(Account.objects.filter(pk__in=changes.keys()).values_list('pk', 'amount'))
+
+
+def change_user_stat(user_id: int, period, **deltas) -> None:
+    """
+    Изменение счётчиков статистики пользователя за период через F-выражения
+    """
+    UserStat.objects.filter(user_id=user_id, period=period).update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
 def update_transactions_by_controller(data: Dict,
                                       request: HttpRequest) -> List[Dict]:
     """Обновление контроллером статусов транзакций, счетов пользователей и их статистики"""
@@ -93,6 +166,7 @@ def update_transactions_by_controller(data: Dict,
                   for stat in UserStat.objects.filter(period=period, user_id__in=sender_recipient_ids).only(
                         'user_id', 'income_thanks', 'distr_thanks', 'distr_declined')}
     response = []
+    approved_transactions = []
     with transaction.atomic():
         for transaction_data in data:
             transaction_pk = transaction_data.get('id')
@@ -116,23 +190,20 @@ def update_transactions_by_controller(data: Dict,
             sender_frozen_account = accounts.get((transaction_instance.sender_id, 'F'))
             sender_distr_account = accounts.get((transaction_instance.sender_id, 'D'))
             amount = transaction_instance.amount
+            accounts_changes = {sender_frozen_account.pk: -amount}
             if transaction_status == 'A':
-                recipient_income_account.amount += amount
+                approved_transactions.append(transaction_instance)
+                accounts_changes[recipient_income_account.pk] = amount
                 recipient_user_stat.income_thanks += amount
                 recipient_user_stat.save(update_fields=['income_thanks'])
             if transaction_status == 'D':
-                sender_distr_account.amount += amount
+                accounts_changes[sender_distr_account.pk] = amount
                 sender_user_stat.distr_thanks -= amount
                 sender_user_stat.distr_declined += amount
                 sender_user_stat.save(update_fields=['distr_thanks', 'distr_declined'])
-            sender_frozen_account.amount -= amount
-            recipient_income_account.transaction = transaction_instance
-            sender_frozen_account.transaction = transaction_instance
-            sender_distr_account.transaction = transaction_instance
-            recipient_income_account.save(update_fields=['amount', 'transaction'])
-            sender_frozen_account.save(update_fields=['amount', 'transaction'])
-            sender_distr_account.save(update_fields=['amount', 'transaction'])
+            change_accounts_amounts(accounts_changes, transaction_instance)
             response.append({"transaction": transaction_pk, "status": transaction_status, "reason": reason})
+        push_transactions_to_timelines(approved_transactions)
     return response
 
 
@@ -185,24 +256,20 @@ def cancel_transaction_by_user(instance: Transaction,
     обновление данных счёта и статистики в рамках одной транзакции в БД
     """
     with transaction.atomic():
+        locked_instance = (Transaction.objects.select_for_update()
+                           .filter(pk=instance.pk).only('status').first())
+        if locked_instance is None or locked_instance.status not in ['W', 'G', 'A']:
+            raise ValidationError("Пользователь может отменить только ожидающую транзакцию")
         period = get_current_period(request.user.profile.organization_id)
         amount = instance.amount
         account_to_return = instance.sender_account
-        sender_user_stat = UserStat.objects.get(user=request.user, period=period)
-        sender_frozen_account = instance.sender.accounts.filter(challenge_id=None,
-                                                                account_type='F').only('amount').first()
-        account_to_return.amount += amount
-        sender_frozen_account.amount -= amount
+        sender_frozen_account = Account.objects.only('id').get(owner_id=instance.sender_id, account_type='F',
+                                                               challenge_id=None)
+        change_accounts_amounts({account_to_return.pk: amount, sender_frozen_account.pk: -amount}, instance)
         if account_to_return.account_type == 'D':
-            sender_user_stat.distr_thanks -= amount
-            sender_user_stat.distr_declined += amount
-            sender_user_stat.save(update_fields=['distr_thanks', 'distr_declined'])
+            change_user_stat(request.user.pk, period, distr_thanks=-amount, distr_declined=amount)
         elif account_to_return.account_type == 'I':
-            sender_user_stat.income_declined += amount
-            sender_user_stat.income_used_for_thanks -= amount
-            sender_user_stat.save(update_fields=['income_declined', 'income_used_for_thanks'])
-        account_to_return.save(update_fields=['amount'])
-        sender_frozen_account.save(update_fields=['amount'])
+            change_user_stat(request.user.pk, period, income_declined=amount, income_used_for_thanks=-amount)
         serializer.save()
 
 
@@ -213,3 +280,158 @@ def is_cancel_transaction_request_is_valid(request_data: Dict) -> bool:
     if request_data.get('status') in ['D', 'C'] and len(request_data) == 1:
         return True
     return False
+
+
+def settle_transactions_after_grace_period(transaction_ids: Optional[Iterable[int]] = None,
+                                           chunk_size: int = SETTLEMENT_CHUNK_SIZE) -> int:
+    """
+    Проведение транзакций, у которых истёк grace период: списание с замороженного счёта
+    отправителя, зачисление на счёт получателя, статистика, события и уведомления.
+    Транзакции выбираются порциями по первичному ключу, строки блокируются с пропуском
+    уже заблокированных, поэтому одновременные запуски не проводят транзакцию дважды.
+    Транзакции, переданные в transaction_ids, проводятся и при запуске задачи чуть раньше
+    окончания grace периода (в пределах SETTLEMENT_ETA_TOLERANCE).
+    Возвращает количество проведённых транзакций
+    """
+    now = timezone.now()
+    periods = get_current_periods_for_all_organizations()
+    event_type = get_event_type(TRANSACTION_EVENT_TYPE)
+    if transaction_ids is None:
+        queryset = Transaction.objects.filter(status='G', grace_timeout__lte=now)
+    else:
+        queryset = Transaction.objects.filter(status='G', grace_timeout__lte=now + SETTLEMENT_ETA_TOLERANCE,
+                                              pk__in=list(transaction_ids))
+    settled_amount = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            transactions_chunk = list(queryset
+                                      .select_for_update(skip_locked=True, of=('self',))
+                                      .select_related('sender__profile', 'recipient__profile')
+                                      .filter(pk__gt=last_pk)
+                                      .only('id', 'sender_id', 'recipient_id', 'amount', 'status',
+                                            'is_anonymous', 'is_public', 'created_at', 'updated_at',
+                                            'sender__profile__tg_name',
+                                            'sender__profile__organization_id',
+                                            'recipient__profile__tg_name')
+                                      .order_by('pk')[:chunk_size])
+            if not transactions_chunk:
+                break
+            last_pk = transactions_chunk[-1].pk
+            settled_amount += settle_transactions_chunk(transactions_chunk, periods, event_type, now)
+    return settled_amount
+
+
+def settle_transactions_chunk(transactions_chunk: List[Transaction], periods,
+                              event_type: EventTypes, now) -> int:
+    """
+    Проведение порции транзакций фиксированным количеством запросов:
+    счета и статистика загружаются только для участников порции,
+    изменения балансов применяются через F-выражения одним bulk_update.
+    Вызывается внутри транзакции в БД
+    """
+    users_ids = ({_transaction.sender_id for _transaction in transactions_chunk} |
+                 {_transaction.recipient_id for _transaction in transactions_chunk})
+    accounts = {(account.owner_id, account.account_type): account
+                for account in Account.objects.filter(challenge_id=None,
+                                                      owner_id__in=users_ids,
+                                                      account_type__in=['F', 'I'])
+                .only('id', 'owner_id', 'account_type')}
+    user_stats = {stat.user_id: stat
+                  for stat in UserStat.objects.filter(period_id__in=periods,
+                                                      user_id__in=users_ids)
+                  .only('id', 'user_id')}
+    accounts_deltas = {}
+    ledger_entries = []
+    user_stats_deltas = {}
+    accounts_last_transaction = {}
+    settled_transactions = []
+    for _transaction in transactions_chunk:
+        sender_frozen_account = accounts.get((_transaction.sender_id, 'F'))
+        recipient_income_account = accounts.get((_transaction.recipient_id, 'I'))
+        recipient_user_stat = user_stats.get(_transaction.recipient_id)
+        if sender_frozen_account is None or recipient_income_account is None or recipient_user_stat is None:
+            logger.error(f"Не удалось провести транзакцию с id {_transaction.pk}: "
+                         f"не найдены счета или статистика участников")
+            continue
+        amount = _transaction.amount
+        accounts_deltas[sender_frozen_account] = accounts_deltas.get(sender_frozen_account, 0) - amount
+        accounts_deltas[recipient_income_account] = accounts_deltas.get(recipient_income_account, 0) + amount
+        ledger_entries.append((sender_frozen_account.pk, -amount, _transaction.pk))
+        ledger_entries.append((recipient_income_account.pk, amount, _transaction.pk))
+        accounts_last_transaction[sender_frozen_account] = _transaction
+        accounts_last_transaction[recipient_income_account] = _transaction
+        user_stats_deltas[recipient_user_stat] = user_stats_deltas.get(recipient_user_stat, 0) + amount
+        _transaction.status = 'R'
+        _transaction.updated_at = now
+        _transaction.recipient_account = recipient_income_account
+        settled_transactions.append(_transaction)
+    if not settled_transactions:
+        return 0
+
+    # bulk_update обновляет строки в произвольном порядке, поэтому блокировки
+    # берутся заранее в порядке первичного ключа, как в change_accounts_amounts
+    list(Account.objects.select_for_update().filter(pk__in=[account.pk for account in accounts_deltas])
+         .order_by('pk').values_list('pk', flat=True))
+    list(UserStat.objects.select_for_update().filter(pk__in=[user_stat.pk for user_stat in user_stats_deltas])
+         .order_by('pk').values_list('pk', flat=True))
+    for account, delta in accounts_deltas.items():
+        account.amount = F('amount') + delta
+        account.transaction = accounts_last_transaction[account]
+    Account.objects.bulk_update(accounts_deltas.keys(), fields=['amount', 'transaction'])
+    write_ledger_entries(ledger_entries)
+    for user_stat, delta in user_stats_deltas.items():
+        user_stat.income_thanks = F('income_thanks') + delta
+    UserStat.objects.bulk_update(user_stats_deltas.keys(), fields=['income_thanks'])
+    Transaction.objects.bulk_update(settled_transactions, fields=['status', 'updated_at', 'recipient_account'])
+    push_transactions_to_timelines(settled_transactions)
+
+    states = TransactionState.objects.bulk_create([
+        TransactionState(transaction=_transaction, status='R')
+        for _transaction in settled_transactions])
+    events = Event.objects.bulk_create([
+        Event(
+            event_type=event_type,
+            event_record_id=state.pk,
+            event_object_id=_transaction.pk,
+            object_selector='T',
+            time=now,
+            scope_id=_transaction.sender.profile.organization_id
+        ) for _transaction, state in zip(settled_transactions, states)])
+    create_feed_items(events)
+    create_and_send_thanks_receiver_notifications(settled_transactions)
+    return len(settled_transactions)
+
+
+def create_and_send_thanks_receiver_notifications(settled_transactions: List[Transaction]) -> None:
+    """
+    Уведомления получателям о проведённых транзакциях: записи создаются одним запросом,
+    push-уведомления отправляются через очередь после фиксации транзакции в БД
+    """
+    tokens = get_users_tokens_map({_transaction.recipient_id for _transaction in settled_transactions})
+    notifications = []
+    pushes = []
+    for _transaction in settled_transactions:
+        notification_theme, notification_text = get_notification_message_for_thanks_receiver(
+            sender_tg_name=_transaction.sender.profile.tg_name if not _transaction.is_anonymous else 'аноним',
+            amount=_transaction.amount
+        )
+        notification_data = get_notification_data(_transaction)
+        notifications.append(Notification(
+            user_id=_transaction.recipient_id,
+            object_id=_transaction.pk,
+            type='T',
+            theme=notification_theme,
+            text=notification_text,
+            data=notification_data,
+            from_user=_transaction.sender_id
+        ))
+        recipient_tokens = tokens.get(_transaction.recipient_id)
+        if recipient_tokens:
+            pushes.append((notification_theme, notification_text, recipient_tokens,
+                           {key: str(value) for key, value in notification_data.items()}))
+    Notification.objects.bulk_create(notifications)
+    for theme, text, recipient_tokens, push_data in pushes:
+        transaction.on_commit(
+            lambda theme=theme, text=text, recipient_tokens=recipient_tokens, push_data=push_data:
+            send_multiple_notifications.delay(theme, text, recipient_tokens, push_data))
@@ -62,87 +62,46 @@ def bulk_create_notifications(user_id_list: List[int],
 
 @app.task
 def validate_transactions_after_grace_period():
-    from auth_app.models import (Account, Event, Transaction, EventTypes,
-                                 TransactionState, UserStat)
-    from django.conf import settings
-    from django.db import transaction
-    from datetime import datetime, timezone
-    from utils.current_period import get_current_periods_for_all_organizations
-    from utils.fcm_manager import send_multiple_push
-    from utils.fcm_services import get_fcm_tokens_list
-    from utils.notification_services import (create_notification,
-                                             get_notification_message_for_thanks_receiver,
-                                             get_notification_data)
-
-    grace_period = settings.GRACE_PERIOD
-    now = datetime.now(timezone.utc)
-    periods = get_current_periods_for_all_organizations()
-    transactions_to_check = [t for t in Transaction.objects
-    .select_related('sender_account', 'recipient_account',
-                    'sender__profile', 'recipient__profile')
-    .filter(status='G')
-    .only('sender_id', 'recipient_id', 'sender__profile__first_name',
-          'sender__profile__surname', 'recipient__profile__surname',
-          'sender__profile__organization__id',
-          'sender__profile__tg_name', 'recipient__profile__tg_name',
-          'recipient__profile__surname', 'status', 'amount',
-          'period', 'created_at', 'sender_account', 'recipient_account')]
-    with transaction.atomic():
-        accounts = (Account.objects.filter(challenge_id=None)
-                    .only('owner_id', 'amount', 'account_type', 'transaction'))
-        user_stats = (UserStat.objects
-                      .filter(period_id__in=periods)
-                      .only('user_id', 'period', 'income_thanks'))
-        for _transaction in transactions_to_check:
-            amount = _transaction.amount
-            if (now - _transaction.created_at).seconds >= grace_period:
-                sender_accounts = [account for account in accounts
-                                   if account.owner_id == _transaction.sender_id]
-                recipient_accounts = [account for account in accounts
-                                      if account.owner_id == _transaction.recipient_id]
-                recipient_user_stat = [stat for stat in user_stats
-                                       if stat.user_id == _transaction.recipient_id][0]
-                sender_frozen_account = [account for account in sender_accounts
-                                         if account.account_type == 'F'][0]
-                recipient_income_account = [account for account in recipient_accounts
-                                            if account.account_type == 'I'][0]
-                sender_frozen_account.amount -= amount
-                sender_frozen_account.transaction = _transaction
-                recipient_income_account.amount += amount
-                recipient_income_account.transaction = _transaction
-                recipient_user_stat.income_thanks += amount
-                _transaction.status = 'R'
-                _transaction.recipient_account = recipient_income_account
-                _transaction.save(update_fields=['status', 'updated_at', 'recipient_account'])
-                state = TransactionState.objects.create(transaction=_transaction, status='R')
-                notification_theme_receiver, notification_text_receiver = get_notification_message_for_thanks_receiver(
-                    sender_tg_name=_transaction.sender.profile.tg_name if not _transaction.is_anonymous else 'аноним',
-                    amount=amount
-                )
-                receiver_notification_data = get_notification_data(_transaction)
-                create_notification(
-                    user_id=_transaction.recipient_id,
-                    object_id=_transaction.id,
-                    _type='T',
-                    theme=notification_theme_receiver,
-                    text=notification_text_receiver,
-                    data=receiver_notification_data,
-                    from_user=_transaction.sender_id
-                )
-                send_multiple_push(
-                    notification_theme_receiver,
-                    notification_text_receiver,
-                    get_fcm_tokens_list(_transaction.recipient_id),
-                    data_object={key: str(value) for key, value in receiver_notification_data.items()}
-                )
-                Event.objects.create(
-                    event_type=EventTypes.objects.get(name='Новая публичная транзакция'),
-                    event_record_id=state.pk,
-                    event_object_id=_transaction.pk,
-                    object_selector='T',
-                    time=now,
-                    scope_id=_transaction.sender.profile.organization_id
-                )
-                sender_frozen_account.save(update_fields=['amount', 'transaction'])
-                recipient_income_account.save(update_fields=['amount', 'transaction'])
-                recipient_user_stat.save(update_fields=['income_thanks'])
+    from auth_app.service import settle_transactions_after_grace_period
+    settled_amount = settle_transactions_after_grace_period()
+    if settled_amount:
+        logger.info(f"Проведено транзакций после окончания grace периода: {settled_amount}")
+
+
+@app.task
+def settle_transaction(transaction_id: int):
+    from auth_app.service import settle_transactions_after_grace_period
+    settle_transactions_after_grace_period(transaction_ids=[transaction_id])
+
+
+@app.task
+def settle_transactions(transaction_ids: List[int]):
+    from auth_app.service import settle_transactions_after_grace_period
+    settle_transactions_after_grace_period(transaction_ids=transaction_ids)
+
+
+@app.task
+def make_accounts_snapshots():
+    from utils.ledger import make_accounts_snapshots as make_snapshots, get_ledger_discrepancies
+    snapshots_amount = make_snapshots()
+    logger.info(f"Создано снимков балансов счетов: {snapshots_amount}")
+    for account_id, amount, ledger_amount in get_ledger_discrepancies():
+        logger.error(f"Баланс счёта с id {account_id} ({amount}) не совпадает с журналом ({ledger_amount})")
+
+
+@app.task
+def advance_challenges_states():
+    from auth_app.challenges_views.service import advance_challenges_states as advance_states
+    advanced_amount = advance_states()
+    if advanced_amount:
+        logger.info(f"Изменено состояние челленджей: {advanced_amount}")
+
+
+@app.task
+def flush_reaction_counters():
+    from utils.reaction_counters import flush_reaction_counters as flush_counters, is_write_behind_enabled
+    if not is_write_behind_enabled():
+        return
+    likes_amount, comments_amount = flush_counters()
+    if likes_amount or comments_amount:
+        logger.info(f"Сброшено счётчиков реакций: лайки - {likes_amount}, комментарии - {comments_amount}")
@@ -0,0 +1,104 @@
+from datetime import timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from auth_app.models import (Account, Challenge, ChallengeParticipant, ChallengeReport, EventTypes, Organization,
+                             Period, Profile, Transaction)
+from utils.challenges_logic import change_challenge_reports_counters
+from utils.current_period import get_current_period
+from utils.event_types import (CHALLENGE_EVENT_TYPE, INCOME_TRANSACTION_EVENT_TYPE, TRANSACTION_EVENT_TYPE,
+                               WINNER_EVENT_TYPE)
+
+User = get_user_model()
+
+
+def create_event_types() -> None:
+    """
+    Типы событий не создаются миграциями, поэтому заводятся в каждом тесте, который создаёт события
+    """
+    EventTypes.objects.bulk_create([
+        EventTypes(name=TRANSACTION_EVENT_TYPE, is_personal=False, has_scope=True),
+        EventTypes(name=INCOME_TRANSACTION_EVENT_TYPE, is_personal=True, has_scope=False),
+        EventTypes(name=CHALLENGE_EVENT_TYPE, is_personal=False, has_scope=True),
+        EventTypes(name=WINNER_EVENT_TYPE, is_personal=False, has_scope=True),
+    ])
+
+
+def create_organization(name: str = 'Организация') -> Organization:
+    organization = Organization.objects.create(name=name, organization_type='R', top_id_id=1)
+    organization.top_id = organization
+    organization.save(update_fields=['top_id'])
+    return organization
+
+
+def create_current_period(organization: Organization) -> Period:
+    today = timezone.now().date()
+    return Period.objects.create(start_date=today - timedelta(days=10), end_date=today + timedelta(days=10),
+                                 name='Текущий период', organization=organization)
+
+
+def create_user(username: str, organization: Organization) -> User:
+    """
+    Пользователь с профилем: счета I, F, D и статистика за текущий период создаются сигналами профиля,
+    поэтому период организации должен быть создан заранее
+    """
+    user = User.objects.create(username=username)
+    Profile.objects.create(user=user, organization=organization, tg_name=username)
+    return user
+
+
+def get_account(user: User, account_type: str) -> Account:
+    return Account.objects.get(owner=user, account_type=account_type, challenge=None)
+
+
+def set_amount(user: User, account_type: str, amount: int) -> Account:
+    Account.objects.filter(owner=user, account_type=account_type, challenge=None).update(amount=amount)
+    return get_account(user, account_type)
+
+
+def create_challenge(creator: User, start_balance: int, distribution_type: Optional[str] = None,
+                     parameters: Optional[List[dict]] = None) -> Challenge:
+    """
+    Челлендж с фондом на отдельном счёте D и транзакцией взноса, как их создаёт create_challenge
+    """
+    challenge = Challenge.objects.create(
+        creator=creator,
+        organized_by=creator,
+        name='Челлендж',
+        states=['P', 'G'],
+        state='G',
+        start_balance=start_balance,
+        distribution_type=distribution_type,
+        parameters=parameters,
+        organization_id=creator.profile.organization_id
+    )
+    ChallengeParticipant.objects.create(user_participant=creator, challenge=challenge, contribution=start_balance,
+                                        mode=['A', 'O'])
+    fund_account = Account.objects.create(owner=creator, account_type='D', amount=start_balance, challenge=challenge)
+    Transaction.objects.create(
+        is_anonymous=False,
+        sender_account=get_account(creator, 'D'),
+        to_challenge=challenge,
+        recipient_account=fund_account,
+        amount=start_balance,
+        transaction_class='H',
+        status='R',
+        period=get_current_period(challenge.organization_id)
+    )
+    return challenge
+
+
+def create_report(challenge: Challenge, user: User, state: str = 'A', points: Optional[int] = None) -> ChallengeReport:
+    participant = ChallengeParticipant.objects.create(user_participant=user, challenge=challenge, contribution=0,
+                                                      mode=['A', 'P'])
+    report = ChallengeReport.objects.create(challenge=challenge, participant=participant, text='Отчёт', state=state,
+                                            points=points)
+    change_challenge_reports_counters(challenge.pk, new_state=state)
+    return report
+
+
+def get_fund_amount(challenge: Challenge) -> Decimal:
+    return Account.objects.get(challenge=challenge, account_type='D').amount
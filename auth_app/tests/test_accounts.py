@@ -0,0 +1,45 @@
+from django.test import TestCase
+
+from auth_app.models import LedgerEntry
+from auth_app.service import InsufficientFundsError, change_accounts_amounts, lock_user_accounts
+from auth_app.tests.factories import create_current_period, create_organization, create_user, get_account, set_amount
+
+
+class ChangeAccountsAmountsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        create_current_period(cls.organization)
+        cls.user = create_user('user', cls.organization)
+        cls.distr_account = set_amount(cls.user, 'D', 100)
+        cls.frozen_account = get_account(cls.user, 'F')
+
+    def test_moves_amount_and_writes_ledger(self):
+        balances = change_accounts_amounts({self.distr_account.pk: -30, self.frozen_account.pk: 30})
+
+        self.assertEqual(balances, {self.distr_account.pk: 70, self.frozen_account.pk: 30})
+        self.assertEqual(get_account(self.user, 'D').amount, 70)
+        self.assertEqual(get_account(self.user, 'F').amount, 30)
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(account__owner=self.user).values_list('account_id', 'amount')),
+            sorted([(self.distr_account.pk, -30), (self.frozen_account.pk, 30)]))
+
+    def test_allows_debiting_whole_balance(self):
+        change_accounts_amounts({self.distr_account.pk: -100, self.frozen_account.pk: 100})
+
+        self.assertEqual(get_account(self.user, 'D').amount, 0)
+
+    def test_raises_insufficient_funds_and_keeps_balances(self):
+        with self.assertRaises(InsufficientFundsError):
+            change_accounts_amounts({self.distr_account.pk: -101, self.frozen_account.pk: 101})
+
+        self.assertEqual(get_account(self.user, 'D').amount, 100)
+        self.assertEqual(get_account(self.user, 'F').amount, 0)
+        self.assertFalse(LedgerEntry.objects.filter(account__owner=self.user).exists())
+
+    def test_lock_user_accounts_returns_accounts_by_type(self):
+        accounts = lock_user_accounts(self.user.pk, ['D', 'F'])
+
+        self.assertEqual(set(accounts), {'D', 'F'})
+        self.assertEqual(accounts['D'].amount, 100)
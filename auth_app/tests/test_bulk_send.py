@@ -0,0 +1,64 @@
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+
+from auth_app.models import LedgerEntry, Transaction, UserStat
+from auth_app.serializers import TransactionBulkSerializer
+from auth_app.tests.factories import create_current_period, create_organization, create_user, get_account, set_amount
+
+
+class TransactionBulkSerializerTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        cls.period = create_current_period(cls.organization)
+        cls.sender = create_user('sender', cls.organization)
+        cls.recipients = [create_user(f'recipient{index}', cls.organization) for index in range(3)]
+
+    def send(self, recipients, amount=10):
+        request = APIRequestFactory().post('/send-coins/bulk/')
+        request.user = self.sender
+        serializer = TransactionBulkSerializer(
+            data={'recipients': [recipient.pk for recipient in recipients], 'amount': amount, 'reason': 'Спасибо'},
+            context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_creates_ledger_pair_per_transaction(self):
+        distr_account = set_amount(self.sender, 'D', 100)
+        frozen_account = get_account(self.sender, 'F')
+
+        transactions = self.send(self.recipients)
+
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual({_transaction.recipient_id for _transaction in transactions},
+                         {recipient.pk for recipient in self.recipients})
+        for _transaction in transactions:
+            self.assertEqual(_transaction.status, 'G')
+            self.assertEqual(
+                sorted(LedgerEntry.objects.filter(transaction=_transaction).values_list('account_id', 'amount')),
+                sorted([(distr_account.pk, -10), (frozen_account.pk, 10)]))
+        self.assertEqual(LedgerEntry.objects.filter(account__owner=self.sender).count(), 6)
+        self.assertEqual(get_account(self.sender, 'D').amount, 70)
+        self.assertEqual(get_account(self.sender, 'F').amount, 30)
+        self.assertEqual(UserStat.objects.get(user=self.sender, period=self.period).distr_thanks, 30)
+
+    def test_rejects_sender_among_recipients(self):
+        set_amount(self.sender, 'D', 100)
+
+        with self.assertRaises(ValidationError):
+            self.send([self.recipients[0], self.sender])
+
+        self.assertFalse(Transaction.objects.filter(sender=self.sender).exists())
+        self.assertEqual(get_account(self.sender, 'D').amount, 100)
+
+    def test_rejects_total_above_balance(self):
+        set_amount(self.sender, 'D', 20)
+
+        with self.assertRaises(ValidationError):
+            self.send(self.recipients)
+
+        self.assertFalse(Transaction.objects.filter(sender=self.sender).exists())
+        self.assertFalse(LedgerEntry.objects.filter(account__owner=self.sender).exists())
+        self.assertEqual(get_account(self.sender, 'D').amount, 20)
@@ -0,0 +1,63 @@
+from itertools import product
+
+from django.test import SimpleTestCase
+
+from utils.challenge_algos import calculate_awards, rank_awards, split_fund
+
+
+class SplitFundTest(SimpleTestCase):
+
+    def test_totals_match_fund_exactly(self):
+        for fund, weights in product([1, 7, 10, 99, 100, 1001], [[1], [1, 1, 1], [1, 2, 3, 4], [3, 3, 3, 1],
+                                                                  [5, 0, 7], [1] * 7]):
+            with self.subTest(fund=fund, weights=weights):
+                shares = split_fund(fund, weights)
+                total = sum(weights)
+                self.assertEqual(sum(shares), fund)
+                for share, weight in zip(shares, weights):
+                    self.assertIn(share, (fund * weight // total, fund * weight // total + 1))
+
+    def test_remainder_goes_to_largest_remainders_then_first(self):
+        self.assertEqual(split_fund(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(split_fund(10, [1, 2, 3]), [2, 3, 5])
+
+    def test_zero_weight_gets_nothing(self):
+        self.assertEqual(split_fund(10, [1, 0, 1]), [5, 0, 5])
+
+    def test_empty_fund_or_weights(self):
+        self.assertEqual(split_fund(0, [1, 2]), [0, 0])
+        self.assertEqual(split_fund(10, [0, 0]), [0, 0])
+        self.assertEqual(split_fund(10, []), [])
+
+
+class CalculateAwardsTest(SimpleTestCase):
+
+    def test_fix_size_awards_first_reports_up_to_remaining_places(self):
+        parameters = [{"id": 1, "value": 30}, {"id": 2, "value": 3}]
+
+        self.assertEqual(calculate_awards('fix_size', parameters, 100, [None] * 4), [30, 30, 30, 0])
+        self.assertEqual(calculate_awards('fix_size', parameters, 100, [None] * 4, winners_count=2), [30, 0, 0, 0])
+
+    def test_fix_size_awards_are_limited_by_fund(self):
+        parameters = [{"id": 1, "value": 30}, {"id": 2, "value": 3}]
+
+        self.assertEqual(calculate_awards('fix_size', parameters, 50, [None] * 3), [30, 0, 0])
+
+    def test_fix_size_without_prize_awards_nothing(self):
+        self.assertEqual(calculate_awards('fix_size', None, 100, [None] * 2), [0, 0])
+
+    def test_proportional_splits_by_points_or_equally(self):
+        self.assertEqual(calculate_awards('proportional', None, 100, [1, 3]), [25, 75])
+        self.assertEqual(calculate_awards('proportional', None, 100, [None, None, None]), [34, 33, 33])
+
+    def test_ranked_awards_places_by_points(self):
+        self.assertEqual(calculate_awards('ranked', [{"id": 2, "value": 2}], 60, [5, 10, None]), [20, 40, 0])
+
+    def test_ranked_ties_prefer_earlier_reports(self):
+        self.assertEqual(rank_awards(30, [5, 5, 5], 2), [20, 10, 0])
+
+    def test_ranked_awards_sum_to_fund(self):
+        awards = calculate_awards('ranked', None, 100, [7, 3, 9, 1, 4])
+
+        self.assertEqual(sum(awards), 100)
+        self.assertEqual(awards, [33, 0, 50, 0, 17])
@@ -0,0 +1,58 @@
+from django.test import TestCase
+from rest_framework.exceptions import ValidationError
+
+from auth_app.challenge_reports_views.service import review_challenge_reports
+from auth_app.models import Challenge, ChallengeReport, Transaction
+from auth_app.tests.factories import (create_challenge, create_current_period, create_event_types,
+                                      create_organization, create_report, create_user, get_account, get_fund_amount)
+
+
+class ReviewChallengeReportsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_event_types()
+        cls.organization = create_organization()
+        create_current_period(cls.organization)
+        cls.creator = create_user('creator', cls.organization)
+        cls.participants = [create_user(f'participant{index}', cls.organization) for index in range(3)]
+
+    def setUp(self):
+        self.challenge = create_challenge(self.creator, 100, 'fix_size',
+                                          [{"id": 1, "value": 30}, {"id": 2, "value": 2}])
+        self.reports = [create_report(self.challenge, participant, state='S') for participant in self.participants]
+
+    def test_awards_winners_and_completes_challenge(self):
+        result = review_challenge_reports(self.challenge.pk, self.creator, [
+            {'id': self.reports[0].pk, 'state': 'W'},
+            {'id': self.reports[1].pk, 'state': 'W'},
+            {'id': self.reports[2].pk, 'state': 'D'},
+        ])
+
+        self.assertEqual({report['id']: report['state'] for report in result['reports']},
+                         {self.reports[0].pk: 'W', self.reports[1].pk: 'W', self.reports[2].pk: 'D'})
+        self.assertEqual(get_account(self.participants[0], 'I').amount, 30)
+        self.assertEqual(get_account(self.participants[1], 'I').amount, 30)
+        self.assertEqual(get_account(self.participants[2], 'I').amount, 0)
+        self.assertEqual(Transaction.objects.filter(from_challenge=self.challenge, transaction_class='W').count(), 2)
+        self.assertEqual(get_fund_amount(self.challenge), 0)
+        self.assertEqual(get_account(self.creator, 'D').amount, 40)
+        challenge = Challenge.objects.get(pk=self.challenge.pk)
+        self.assertEqual(challenge.state, 'C')
+        self.assertEqual(challenge.winners_count, 2)
+        self.assertEqual(challenge.new_reports_count, 0)
+        self.assertEqual(challenge.approved_reports_count, 2)
+        self.assertFalse(result['new_reports_exists'])
+
+    def test_rejects_more_winners_than_places(self):
+        with self.assertRaises(ValidationError):
+            review_challenge_reports(self.challenge.pk, self.creator,
+                                     [{'id': report.pk, 'state': 'W'} for report in self.reports])
+
+        self.assertFalse(ChallengeReport.objects.filter(challenge=self.challenge).exclude(state='S').exists())
+        self.assertEqual(get_fund_amount(self.challenge), 100)
+
+    def test_rejects_reviewer_other_than_creator(self):
+        with self.assertRaises(ValidationError):
+            review_challenge_reports(self.challenge.pk, self.participants[0],
+                                     [{'id': self.reports[0].pk, 'state': 'W'}])
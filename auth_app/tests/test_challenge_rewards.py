@@ -0,0 +1,75 @@
+from django.test import TestCase
+
+from auth_app.challenge_reports_views.service import distribute_challenge_rewards
+from auth_app.models import Challenge, ChallengeReport, LedgerEntry, Transaction, UserStat
+from auth_app.tests.factories import (create_challenge, create_current_period, create_event_types,
+                                      create_organization, create_report, create_user, get_account, get_fund_amount)
+
+
+class DistributeChallengeRewardsTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_event_types()
+        cls.organization = create_organization()
+        cls.period = create_current_period(cls.organization)
+        cls.creator = create_user('creator', cls.organization)
+        cls.participants = [create_user(f'participant{index}', cls.organization) for index in range(4)]
+
+    def distribute(self, challenge):
+        challenge.refresh_from_db()
+        return distribute_challenge_rewards(challenge)
+
+    def assert_completed(self, challenge, winners_count):
+        challenge.refresh_from_db()
+        self.assertEqual(challenge.state, 'C')
+        self.assertEqual(challenge.winners_count, winners_count)
+        self.assertEqual(get_fund_amount(challenge), 0)
+
+    def test_fix_size_awards_first_approved_reports(self):
+        challenge = create_challenge(self.creator, 100, 'fix_size', [{"id": 1, "value": 30}, {"id": 2, "value": 3}])
+        reports = [create_report(challenge, participant) for participant in self.participants]
+
+        self.assertEqual(self.distribute(challenge), 3)
+
+        self.assertEqual([get_account(participant, 'I').amount for participant in self.participants], [30, 30, 30, 0])
+        self.assertEqual(list(ChallengeReport.objects.filter(pk__in=[report.pk for report in reports])
+                              .order_by('pk').values_list('state', flat=True)), ['W', 'W', 'W', 'A'])
+        self.assertEqual(get_account(self.creator, 'D').amount, 10)
+        self.assertEqual(UserStat.objects.get(user=self.participants[0], period=self.period).awarded_from_challenges,
+                         30)
+        self.assert_completed(challenge, 3)
+
+    def test_ranked_splits_fund_by_places(self):
+        challenge = create_challenge(self.creator, 90, 'ranked', [{"id": 2, "value": 2}])
+        for participant, points in zip(self.participants, [5, 10, 1]):
+            create_report(challenge, participant, points=points)
+
+        self.assertEqual(self.distribute(challenge), 2)
+
+        self.assertEqual([get_account(participant, 'I').amount for participant in self.participants[:3]], [30, 60, 0])
+        self.assertEqual(get_account(self.creator, 'D').amount, 0)
+        self.assert_completed(challenge, 2)
+
+    def test_writes_ledger_pair_per_award(self):
+        challenge = create_challenge(self.creator, 90, 'ranked', [{"id": 2, "value": 2}])
+        for participant, points in zip(self.participants, [5, 10]):
+            create_report(challenge, participant, points=points)
+
+        self.distribute(challenge)
+
+        fund_account_id = Challenge.objects.get(pk=challenge.pk).challengeaccount.get(account_type='D').pk
+        for _transaction in Transaction.objects.filter(from_challenge=challenge, transaction_class='W'):
+            self.assertEqual(
+                sorted(LedgerEntry.objects.filter(transaction=_transaction).values_list('account_id', 'amount')),
+                sorted([(fund_account_id, -_transaction.amount),
+                        (_transaction.recipient_account_id, _transaction.amount)]))
+
+    def test_without_approved_reports_returns_fund(self):
+        challenge = create_challenge(self.creator, 100, 'ranked')
+        create_report(challenge, self.participants[0], state='S')
+
+        self.assertEqual(self.distribute(challenge), 0)
+
+        self.assertEqual(get_account(self.creator, 'D').amount, 100)
+        self.assert_completed(challenge, 0)
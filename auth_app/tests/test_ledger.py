@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from auth_app.models import AccountSnapshot, LedgerEntry
+from auth_app.tests.factories import create_current_period, create_organization, create_user, get_account, set_amount
+from utils.ledger import get_accounts_balances, get_ledger_discrepancies, make_accounts_snapshots
+
+
+class AccountsBalancesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = create_organization()
+        create_current_period(cls.organization)
+        cls.user = create_user('user', cls.organization)
+        cls.account = get_account(cls.user, 'I')
+
+    def add_entry(self, amount, created_at=None):
+        entry = LedgerEntry.objects.create(account=self.account, amount=amount)
+        if created_at is not None:
+            LedgerEntry.objects.filter(pk=entry.pk).update(created_at=created_at)
+        return entry
+
+    def test_account_without_snapshots_is_summed_from_zero(self):
+        self.add_entry(50)
+        self.add_entry(-20)
+
+        self.assertEqual(get_accounts_balances([self.account.pk]), {self.account.pk: 30})
+
+    def test_snapshot_plus_ledger_tail(self):
+        self.add_entry(50)
+        entry = self.add_entry(-20)
+        AccountSnapshot.objects.create(account=self.account, amount=30, last_entry_id=entry.pk)
+        self.add_entry(5)
+
+        self.assertEqual(get_accounts_balances([self.account.pk]), {self.account.pk: 35})
+
+    def test_balance_at_moment(self):
+        now = timezone.now()
+        self.add_entry(50, created_at=now - timedelta(hours=2))
+        self.add_entry(10)
+
+        self.assertEqual(get_accounts_balances([self.account.pk], moment=now - timedelta(hours=1)),
+                         {self.account.pk: 50})
+
+    def test_account_with_only_later_snapshots_is_omitted_at_moment(self):
+        now = timezone.now()
+        entry = self.add_entry(50)
+        AccountSnapshot.objects.create(account=self.account, amount=50, last_entry_id=entry.pk)
+
+        self.assertEqual(get_accounts_balances([self.account.pk], moment=now - timedelta(hours=1)), {})
+
+    def test_snapshots_keep_balances_and_match_accounts(self):
+        self.add_entry(50, created_at=timezone.now() - timedelta(hours=1))
+        self.add_entry(-20, created_at=timezone.now() - timedelta(hours=1))
+        set_amount(self.user, 'I', 30)
+
+        self.assertEqual(make_accounts_snapshots(), 1)
+
+        self.assertEqual(AccountSnapshot.objects.get(account=self.account).amount, 30)
+        self.assertEqual(get_accounts_balances([self.account.pk]), {self.account.pk: 30})
+        self.assertEqual(list(get_ledger_discrepancies()), [])
@@ -0,0 +1,94 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from auth_app.models import LedgerEntry, Transaction, UserStat
+from auth_app.service import SETTLEMENT_ETA_TOLERANCE, settle_transactions_after_grace_period
+from auth_app.tests.factories import (create_current_period, create_event_types, create_organization, create_user,
+                                      get_account, set_amount)
+
+
+class SettleTransactionsAfterGracePeriodTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_event_types()
+        cls.organization = create_organization()
+        cls.period = create_current_period(cls.organization)
+        cls.sender = create_user('sender', cls.organization)
+        cls.recipient = create_user('recipient', cls.organization)
+
+    def create_transaction(self, grace_timeout, amount=10):
+        frozen_account = get_account(self.sender, 'F')
+        set_amount(self.sender, 'F', frozen_account.amount + amount)
+        return Transaction.objects.create(
+            sender=self.sender,
+            sender_account=get_account(self.sender, 'D'),
+            recipient=self.recipient,
+            transaction_class='T',
+            amount=amount,
+            status='G',
+            reason='Спасибо',
+            is_public=True,
+            is_anonymous=False,
+            period=self.period,
+            grace_timeout=grace_timeout
+        )
+
+    def test_settles_transactions_with_expired_grace_period(self):
+        _transaction = self.create_transaction(timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(settle_transactions_after_grace_period(), 1)
+
+        _transaction.refresh_from_db()
+        self.assertEqual(_transaction.status, 'R')
+        self.assertEqual(_transaction.recipient_account, get_account(self.recipient, 'I'))
+        self.assertEqual(get_account(self.sender, 'F').amount, 0)
+        self.assertEqual(get_account(self.recipient, 'I').amount, 10)
+        self.assertEqual(UserStat.objects.get(user=self.recipient, period=self.period).income_thanks, 10)
+        self.assertEqual(
+            sorted(LedgerEntry.objects.filter(transaction=_transaction).values_list('account_id', 'amount')),
+            sorted([(get_account(self.sender, 'F').pk, -10), (get_account(self.recipient, 'I').pk, 10)]))
+
+    def test_settles_all_chunks(self):
+        transactions = [self.create_transaction(timezone.now() - timedelta(seconds=1)) for _ in range(5)]
+
+        self.assertEqual(settle_transactions_after_grace_period(chunk_size=2), 5)
+
+        self.assertFalse(Transaction.objects.filter(pk__in=[t.pk for t in transactions]).exclude(status='R').exists())
+        self.assertEqual(get_account(self.recipient, 'I').amount, 50)
+
+    def test_settles_early_eta_within_tolerance(self):
+        _transaction = self.create_transaction(timezone.now() + SETTLEMENT_ETA_TOLERANCE - timedelta(seconds=5))
+
+        self.assertEqual(settle_transactions_after_grace_period(transaction_ids=[_transaction.pk]), 1)
+
+        _transaction.refresh_from_db()
+        self.assertEqual(_transaction.status, 'R')
+
+    def test_periodic_sweep_skips_transactions_in_grace_period(self):
+        _transaction = self.create_transaction(timezone.now() + timedelta(seconds=10))
+
+        self.assertEqual(settle_transactions_after_grace_period(), 0)
+
+        _transaction.refresh_from_db()
+        self.assertEqual(_transaction.status, 'G')
+
+    def test_skips_early_eta_beyond_tolerance(self):
+        _transaction = self.create_transaction(timezone.now() + SETTLEMENT_ETA_TOLERANCE + timedelta(minutes=1))
+
+        self.assertEqual(settle_transactions_after_grace_period(transaction_ids=[_transaction.pk]), 0)
+
+        _transaction.refresh_from_db()
+        self.assertEqual(_transaction.status, 'G')
+        self.assertEqual(get_account(self.recipient, 'I').amount, 0)
+
+    def test_skips_transactions_not_in_ids(self):
+        settled = self.create_transaction(timezone.now() - timedelta(seconds=1))
+        other = self.create_transaction(timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(settle_transactions_after_grace_period(transaction_ids=[settled.pk]), 1)
+
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'G')
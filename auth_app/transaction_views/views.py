@@ -15,15 +15,18 @@ from rest_framework.views import APIView
 
 from auth_app.comments_views.service import get_object
 from auth_app.models import Transaction, Period
-from auth_app.serializers import (TransactionPartialSerializer, TransactionFullSerializer,
+from auth_app.serializers import (TransactionPartialSerializer, TransactionBulkSerializer, TransactionFullSerializer,
                                   TransactionCancelSerializer, TransactionStatisticsSerializer)
 from auth_app.service import (update_transactions_by_controller,
                               is_controller_data_is_valid,
                               cancel_transaction_by_user, is_cancel_transaction_request_is_valid,
                               AlreadyUpdatedByControllerError, NotWaitingTransactionError)
 from utils.custom_permissions import IsController
-from utils.paginates import process_offset_and_limit
+from utils.idempotency import idempotent
+from utils.loaders import get_transactions_tags
+from utils.paginates import process_cursor_offset_and_limit, paginate_queryset, set_next_cursor
 from utils.query_debugger import query_debugger
+from utils.throttling import RedisTokenBucketThrottle
 
 logger = logging.getLogger(__name__)
 
@@ -32,10 +35,13 @@ class SendCoinView(CreateModelMixin, GenericAPIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [authentication.SessionAuthentication,
                               authentication.TokenAuthentication]
+    throttle_classes = [RedisTokenBucketThrottle]
+    throttle_scope = 'send_coins'
 
     queryset = Transaction.objects.select_related('sender__profile', 'recipient__profile')
     serializer_class = TransactionPartialSerializer
 
+    @idempotent
     @query_debugger
     def post(self, request, *args, **kwargs):
         logger.info(f"Пользователь {request.user} отправил "
@@ -48,6 +54,25 @@ class SendCoinView(CreateModelMixin, GenericAPIView):
         return context
 
 
+class SendCoinsBulkView(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [authentication.SessionAuthentication,
+                              authentication.TokenAuthentication]
+    throttle_classes = [RedisTokenBucketThrottle]
+    throttle_scope = 'send_coins'
+
+    @idempotent
+    @query_debugger
+    def post(self, request, *args, **kwargs):
+        logger.info(f"Пользователь {request.user} отправил "
+                    f"следующие данные для совершения групповой транзакции: {request.data}")
+        serializer = TransactionBulkSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        transactions = serializer.save()
+        return Response({'transactions': [transaction_instance.pk for transaction_instance in transactions]},
+                        status=status.HTTP_201_CREATED)
+
+
 class CancelTransactionByUserView(UpdateAPIView):
     queryset = Transaction.objects.all()
     serializer_class = TransactionCancelSerializer
@@ -87,8 +112,10 @@ class VerifyOrCancelTransactionByControllerView(APIView):
 
     @classmethod
     def get(cls, request, *args, **kwargs):
-        queryset = Transaction.objects.filter_to_use_by_controller().order_by('-created_at')
-        serializer = TransactionFullSerializer(queryset, many=True, context={'user': request.user})
+        transactions = list(Transaction.objects.filter_to_use_by_controller().order_by('-created_at'))
+        serializer = TransactionFullSerializer(transactions, many=True, context={
+            'user': request.user,
+            'transactions_tags': get_transactions_tags(_transaction.pk for _transaction in transactions)})
         logger.info(f"Контроллер {request.user} смотрит список транзакций для подтверждения / отклонения")
         return Response(serializer.data)
 
@@ -122,15 +149,19 @@ class TransactionsByUserView(ListAPIView):
         limit = request.GET.get('limit')
         sent_only = request.GET.get('sent_only')
         received_only = request.GET.get('received_only')
-        offset, limit = process_offset_and_limit(offset, limit)
+        cursor, offset, limit = process_cursor_offset_and_limit(request.GET.get('cursor'), offset, limit)
         if not any([self.is_parameter_valid(sent_only), self.is_parameter_valid(received_only)]):
-            transactions = Transaction.objects.filter_by_user_limited(request.user, offset, limit)
+            transactions = Transaction.objects.filter_by_user(request.user)
         else:
-            transactions = (Transaction.objects.filter_by_user_sent_only(request.user, offset, limit)
+            transactions = (Transaction.objects.filter_by_user_sent(request.user)
                             if self.is_parameter_valid(sent_only)
-                            else Transaction.objects.filter_by_user_received_only(request.user, offset, limit))
-        serializer = self.get_serializer(transactions, many=True)
-        return Response(serializer.data)
+                            else Transaction.objects.filter_by_user_received(request.user))
+        transactions, next_cursor = paginate_queryset(transactions, offset * limit, limit, cursor,
+                                                      time_field='updated_at')
+        context = self.get_serializer_context()
+        context['transactions_tags'] = get_transactions_tags(_transaction.pk for _transaction in transactions)
+        serializer = self.serializer_class(transactions, many=True, context=context)
+        return set_next_cursor(Response(serializer.data), next_cursor)
 
     @classmethod
     def is_parameter_valid(cls, parameter):
@@ -222,6 +253,8 @@ class TransactionStatisticsAPIView(APIView):
 @permission_classes([IsAuthenticated])
 def get_user_transaction_list_by_period(request, period_id):
     get_object_or_404(Period, pk=period_id)
-    transactions_queryset = Transaction.objects.filter_by_period(request.user, period_id)
-    serializer = TransactionFullSerializer(transactions_queryset, many=True, context={"user": request.user})
+    transactions = list(Transaction.objects.filter_by_period(request.user, period_id))
+    serializer = TransactionFullSerializer(transactions, many=True, context={
+        "user": request.user,
+        "transactions_tags": get_transactions_tags(_transaction.pk for _transaction in transactions)})
     return Response(serializer.data)
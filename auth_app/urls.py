@@ -65,10 +65,13 @@ urlpatterns = [
     path('create-challenge/', challenges_views.CreateChallengeView.as_view()),
     path('create-challenge-report/', challenge_reports_views.CreateChallengeReportView.as_view()),
     path('check-challenge-report/<int:pk>/', challenge_reports_views.CheckChallengeReportView.as_view()),
+    path('check-challenge-reports/<int:pk>/', challenge_reports_views.ReviewChallengeReportsView.as_view()),
+    path('finalize-challenge/<int:pk>/', challenge_reports_views.FinalizeChallengeView.as_view()),
     path('challenge-report/<int:pk>/', challenge_reports_views.ChallengeReportDetailAPIView.as_view()),
 
     # transactions
     path('send-coins/', transaction_views.SendCoinView.as_view()),
+    path('send-coins/bulk/', transaction_views.SendCoinsBulkView.as_view()),
     path('cancel-transaction/<int:pk>/', transaction_views.CancelTransactionByUserView.as_view()),
     # path('check-transaction-by-controller/', transaction_views.VerifyOrCancelTransactionByControllerView.as_view()),
     path('user/transactions/', transaction_views.TransactionsByUserView.as_view()),
@@ -123,6 +126,8 @@ urlpatterns = [
 
     path('burn-thanks/', views.BurnThanksView.as_view()),
     path('burn-income-thanks/', views.BurnIncomeThanksView.as_view()),
+    path('throttle-stats/', views.ThrottleStatsView.as_view()),
+    path('feed-cache-stats/', views.FeedCacheStatsView.as_view()),
     path('create-user-stats/', stat_views.CreateUserStats.as_view()),
     path('logout/', LogoutView.as_view()),
     # comments
@@ -1,9 +1,11 @@
 import datetime
 import logging
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.db.models import F
+from redis.exceptions import RedisError
 from rest_framework import status, authentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.generics import RetrieveAPIView
@@ -13,6 +15,9 @@ from rest_framework.views import APIView
 
 from utils.accounts_data import processing_accounts_data
 from utils.custom_permissions import (IsSystemAdmin, IsOrganizationAdmin, IsDepartmentAdmin)
+from utils.feed_cache import get_payload_cache_stats
+from utils.ledger import write_ledger_entries
+from utils.throttling import get_throttle_stats
 from utils.thumbnail_link import get_thumbnail_link
 from .models import Period, UserStat, Account, Transaction
 from .serializers import (UserSerializer, SearchUserSerializer)
@@ -214,10 +219,11 @@ class BurnThanksView(APIView):
                     stat.distr_burnt = account.amount
             UserStat.objects.bulk_update(stats, ['distr_burnt'])
             overall_burnt = 0
+            ledger_entries = []
             for account in accounts:
                 if account.amount > 0:
                     overall_burnt += account.amount
-                    Transaction.objects.create(
+                    burn_transaction = Transaction.objects.create(
                         sender=account.owner,
                         recipient=system,
                         amount=account.amount,
@@ -226,11 +232,14 @@ class BurnThanksView(APIView):
                         is_anonymous=True,
                         is_public=False
                     )
+                    ledger_entries.append((account.pk, -account.amount, burn_transaction.pk))
+                    ledger_entries.append((burnt_account.pk, account.amount, burn_transaction.pk))
                     account.amount = 0
             Account.objects.bulk_update(accounts, ['amount'])
             if overall_burnt:
                 burnt_account.amount += overall_burnt
                 burnt_account.save(update_fields=['amount'])
+                write_ledger_entries(ledger_entries)
         return Response(data)
 
 
@@ -253,9 +262,10 @@ class BurnIncomeThanksView(APIView):
         .only('owner_id', 'amount', 'account_type')}
         with transaction.atomic():
             overall_burnt = 0
+            ledger_entries = []
             for stat_user_id in stats:
                 if stats[stat_user_id].income_at_end == 0 and accounts[stat_user_id].amount != 0:
-                    Transaction.objects.create(
+                    burn_transaction = Transaction.objects.create(
                         sender_id=stat_user_id,
                         recipient=system,
                         amount=accounts[stat_user_id].amount,
@@ -264,6 +274,9 @@ class BurnIncomeThanksView(APIView):
                         is_anonymous=True,
                         is_public=False
                     )
+                    ledger_entries.append((accounts[stat_user_id].pk, -accounts[stat_user_id].amount,
+                                           burn_transaction.pk))
+                    ledger_entries.append((bonus_account.pk, accounts[stat_user_id].amount, burn_transaction.pk))
                     stats[stat_user_id].income_at_end = accounts[stat_user_id].amount
                     overall_burnt += accounts[stat_user_id].amount
                     accounts[stat_user_id].amount = 0
@@ -272,5 +285,32 @@ class BurnIncomeThanksView(APIView):
                 Account.objects.bulk_update(accounts.values(), ['amount'])
                 bonus_account.amount = F('amount') + overall_burnt
                 bonus_account.save(update_fields=['amount'])
+                write_ledger_entries(ledger_entries)
                 return Response(status=status.HTTP_201_CREATED)
         return Response()
+
+
+class ThrottleStatsView(APIView):
+    authentication_classes = [authentication.SessionAuthentication,
+                              authentication.TokenAuthentication]
+    permission_classes = [IsSystemAdmin]
+
+    @classmethod
+    def get(cls, request, *args, **kwargs):
+        try:
+            stats = get_throttle_stats()
+        except RedisError:
+            logger.exception("Статистика ограничения частоты запросов недоступна")
+            return Response("Статистика ограничения частоты запросов временно недоступна",
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'rates': settings.THROTTLE_RATES, 'stats': stats})
+
+
+class FeedCacheStatsView(APIView):
+    authentication_classes = [authentication.SessionAuthentication,
+                              authentication.TokenAuthentication]
+    permission_classes = [IsSystemAdmin]
+
+    @classmethod
+    def get(cls, request, *args, **kwargs):
+        return Response(get_payload_cache_stats())
@@ -103,10 +103,29 @@ CORS_ALLOWED_ORIGINS = [
     'http://localhost:8080',
     'http://127.0.0.1:8080'
 ]
+CORS_EXPOSE_HEADERS = ['X-Next-Cursor']
 
 CELERY_BROKER_URL = env('CELERY_BROKER_URL')
 CELERY_RESULT_BACKEND = env('CELERY_RESULT_BACKEND')
 
+REDIS_URL = env('REDIS_URL', default=CELERY_BROKER_URL)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=60 * 60)
+
+REACTION_COUNTERS_WRITE_BEHIND = env.bool('REACTION_COUNTERS_WRITE_BEHIND', default=False)
+REACTION_COUNTERS_FLUSH_INTERVAL = env.int('REACTION_COUNTERS_FLUSH_INTERVAL', default=10)
+
+FEED_FANOUT_ENABLED = env.bool('FEED_FANOUT_ENABLED', default=False)
+FEED_TIMELINE_SIZE = env.int('FEED_TIMELINE_SIZE', default=1000)
+FEED_TIMELINE_TTL = env.int('FEED_TIMELINE_TTL', default=7 * 24 * 60 * 60)
+FEED_PAYLOAD_CACHE_TTL = env.int('FEED_PAYLOAD_CACHE_TTL', default=24 * 60 * 60)
+CHALLENGE_LIST_CACHE_TTL = env.int('CHALLENGE_LIST_CACHE_TTL', default=10 * 60)
+
+THROTTLE_RATES = {
+    'send_coins': {'user': '30/min', 'organization': '600/min'},
+    'press_like': {'user': '60/min', 'organization': '1200/min'},
+    'create_comment': {'user': '20/min', 'organization': '600/min'},
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -154,11 +173,23 @@ LOGGING = {
 CELERY_BEAT_SCHEDULE = {
     "validate_transactions_after_grace_period": {
         "task": "auth_app.tasks.validate_transactions_after_grace_period",
-        "schedule": crontab(minute="*"),
+        "schedule": crontab(minute="*/5"),
     },
     "remove_reports": {
         "task": "auth_app.tasks.remove_reports",
         "schedule": crontab(minute=0, hour=0, day_of_week='sun'),
+    },
+    "flush_reaction_counters": {
+        "task": "auth_app.tasks.flush_reaction_counters",
+        "schedule": REACTION_COUNTERS_FLUSH_INTERVAL,
+    },
+    "make_accounts_snapshots": {
+        "task": "auth_app.tasks.make_accounts_snapshots",
+        "schedule": crontab(minute=0, hour=3),
+    },
+    "advance_challenges_states": {
+        "task": "auth_app.tasks.advance_challenges_states",
+        "schedule": crontab(minute="*"),
     }
 }
 
@@ -1,3 +1,4 @@
+import datetime
 import logging
 import os.path
 
@@ -5,9 +6,11 @@ import yaml
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from auth_app.models import Account, UserStat, Period
 from utils.current_period import get_period
+from utils.ledger import get_accounts_balances
 
 User = get_user_model()
 
@@ -15,12 +18,22 @@ logger = logging.getLogger(__name__)
 
 
 def processing_accounts_data(user: User, period_id=None):
+    """
+    Балансы счетов пользователя по журналу и его статистика за период.
+    Для завершившегося периода балансы возвращаются на момент его окончания
+    """
+    moment = None
     if period_id is not None:
         period = get_object_or_404(Period, pk=period_id)
+        if period.end_date < timezone.localdate():
+            moment = timezone.make_aware(datetime.datetime.combine(period.end_date, datetime.time.max))
     else:
         period = get_period(user.profile.organization_id)
-    queryset = Account.objects.filter(owner=user, challenge_id=None)
-    accounts_data = {f"{item.to_json().get('account_type')}": item.to_json() for item in queryset}
+    accounts = list(Account.objects.filter(owner=user, challenge_id=None).only('id', 'account_type', 'amount'))
+    balances = get_accounts_balances([account.pk for account in accounts], moment)
+    # счета, для которых журнал на этот момент не знает баланса, показываются с текущим балансом
+    accounts_data = {account.account_type: {'amount': balances.get(account.pk, account.amount)}
+                     for account in accounts}
     user_stat = UserStat.objects.filter(user=user, period=period).first()
     user_profile_data = {
         "income": {
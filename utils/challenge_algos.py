@@ -1,3 +1,5 @@
+from typing import Dict, List, Optional, Sequence
+
 fix_size_prize_logic = {
     "is_active": True,
     "name": "Фиксированная награда за выполнение задания",
@@ -12,3 +14,103 @@ fix_size_prize_logic = {
               ],
     "grace_period": "1h"
 }
+
+proportional_prize_logic = {
+    "is_active": True,
+    "name": "Распределение фонда пропорционально баллам",
+    "description": "При подведении итогов фонд челленджа распределяется между участниками с подтвержденными "
+                   "отчетами пропорционально присужденным баллам, а если баллы не выставлялись - поровну",
+    "calculation_type": "auto",
+    "reward_time": "final",
+    "params": [],
+    "grace_period": "1h"
+}
+
+ranked_prize_logic = {
+    "is_active": True,
+    "name": "Распределение фонда по местам",
+    "description": "При подведении итогов первые N участников по присужденным баллам получают доли фонда, "
+                   "убывающие с местом: первое место - N долей, последнее - одну",
+    "calculation_type": "auto",
+    "reward_time": "final",
+    "params": [
+                {"id": 2, "name": "Количество награждаемых", "type": "N", "default": 3}
+              ],
+    "grace_period": "1h"
+}
+
+DISTRIBUTION_ALGORITHMS = {
+    'fix_size': fix_size_prize_logic,
+    'proportional': proportional_prize_logic,
+    'ranked': ranked_prize_logic,
+}
+DEFAULT_DISTRIBUTION_TYPE = 'fix_size'
+
+
+def get_distribution_algorithm(distribution_type: Optional[str]) -> Dict:
+    return DISTRIBUTION_ALGORITHMS.get(distribution_type or DEFAULT_DISTRIBUTION_TYPE, fix_size_prize_logic)
+
+
+def get_algorithm_params(algorithm: Dict, parameters: Optional[List[Dict]]) -> Dict[int, int]:
+    """
+    Значения параметров алгоритма из Challenge.parameters с подстановкой значений по умолчанию
+    """
+    values = {param["id"]: param["default"] for param in algorithm["params"]}
+    for parameter in parameters or []:
+        if parameter["id"] in values:
+            values[parameter["id"]] = int(parameter["value"])
+    return values
+
+
+def calculate_awards(distribution_type: Optional[str], parameters: Optional[List[Dict]], fund: int,
+                     points: Sequence[Optional[int]], winners_count: int = 0) -> List[int]:
+    """
+    Вектор наград за один проход для подтверждённых отчётов челленджа в порядке их подтверждения.
+    points - баллы отчётов (None, если не выставлялись), fund - остаток фонда,
+    winners_count - количество уже награждённых участников. Сумма наград не превышает фонд
+    """
+    algorithm = get_distribution_algorithm(distribution_type)
+    params = get_algorithm_params(algorithm, parameters)
+    if algorithm is proportional_prize_logic:
+        return split_fund(fund, get_weights(points))
+    if algorithm is ranked_prize_logic:
+        return rank_awards(fund, points, params[2])
+    return fix_size_awards(fund, len(points), params[1], params[2] - winners_count)
+
+
+def fix_size_awards(fund: int, reports_amount: int, prize: Optional[int], places: int) -> List[int]:
+    awards = [0] * reports_amount
+    if not prize:
+        return awards
+    for index in range(min(max(places, 0), reports_amount, fund // prize)):
+        awards[index] = prize
+    return awards
+
+
+def rank_awards(fund: int, points: Sequence[Optional[int]], places: int) -> List[int]:
+    # при равных баллах выше место у отчёта, подтверждённого раньше
+    ranking = sorted(range(len(points)), key=lambda index: (-(points[index] or 0), index))[:max(places, 0)]
+    weights = [0] * len(points)
+    for place, index in enumerate(ranking):
+        weights[index] = len(ranking) - place
+    return split_fund(fund, weights)
+
+
+def get_weights(points: Sequence[Optional[int]]) -> List[int]:
+    if any(points):
+        return [point or 0 for point in points]
+    return [1] * len(points)
+
+
+def split_fund(fund: int, weights: Sequence[int]) -> List[int]:
+    """
+    Целочисленное разбиение фонда по весам методом наибольших остатков
+    """
+    total = sum(weights)
+    if fund <= 0 or total <= 0:
+        return [0] * len(weights)
+    shares = [fund * weight // total for weight in weights]
+    by_remainder = sorted(range(len(weights)), key=lambda index: (-(fund * weights[index] % total), index))
+    for index in by_remainder[:fund - sum(shares)]:
+        shares[index] += 1
+    return shares
@@ -0,0 +1,70 @@
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from utils.feed_cache import render_payload
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_LIST_KEY = 'challenges:list:{organization_id}:{version}:{page}'
+CHALLENGE_LIST_VERSION_KEY = 'challenges:list:version:{organization_id}'
+
+
+def get_version_key(organization_id: int) -> str:
+    return CHALLENGE_LIST_VERSION_KEY.format(organization_id=organization_id)
+
+
+def get_cached_challenge_list(organization_id: int, page: str,
+                              build_page: Callable[[], Tuple[List[Dict], Optional[str]]]
+                              ) -> Tuple[List[Dict], Optional[str], bool]:
+    """
+    Страница списка челленджей организации из кэша. page - параметры страницы,
+    build_page собирает страницу и курсор следующей при промахе.
+    Возвращает (челленджи, курсор, взята ли страница из кэша); поля, зависящие от пользователя,
+    в странице из кэша относятся к тому, кто её собрал, и должны быть пересчитаны
+    """
+    if not settings.CHALLENGE_LIST_CACHE_TTL:
+        challenges, next_cursor = build_page()
+        return challenges, next_cursor, False
+    client = get_redis()
+    try:
+        version = int(client.get(get_version_key(organization_id)) or 0)
+        key = CHALLENGE_LIST_KEY.format(organization_id=organization_id, version=version, page=page)
+        cached = client.get(key)
+    except RedisError:
+        logger.exception("Кэш списка челленджей недоступен")
+        challenges, next_cursor = build_page()
+        return challenges, next_cursor, False
+    if cached is not None:
+        cached = json.loads(cached)
+        return cached['challenges'], cached['next_cursor'], True
+    challenges, next_cursor = build_page()
+    challenges = [render_payload(challenge) for challenge in challenges]
+    try:
+        client.set(key, json.dumps({'challenges': challenges, 'next_cursor': next_cursor}),
+                   ex=settings.CHALLENGE_LIST_CACHE_TTL)
+    except RedisError:
+        logger.exception("Не удалось сохранить список челленджей в кэш")
+    return challenges, next_cursor, False
+
+
+def invalidate_challenge_list_cache(organization_id: Optional[int]) -> None:
+    """
+    Сброс закэшированных страниц списка челленджей организации после фиксации транзакции:
+    страницы хранятся под номером версии организации, который увеличивается при изменениях
+    """
+    if organization_id is None or not settings.CHALLENGE_LIST_CACHE_TTL:
+        return
+    transaction.on_commit(lambda: _increment_version(organization_id))
+
+
+def _increment_version(organization_id: int) -> None:
+    try:
+        get_redis().incr(get_version_key(organization_id))
+    except RedisError:
+        logger.exception(f"Не удалось сбросить кэш списка челленджей организации {organization_id}")
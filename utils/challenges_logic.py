@@ -1,9 +1,12 @@
 from datetime import timedelta
-from typing import Dict, List
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from django.db.models import Q, QuerySet
+from django.db.models import F, Q, QuerySet
 
-from auth_app.models import ChallengeReport, Transaction
+from auth_app.models import Challenge, ChallengeReport, ChallengeUserStatus, Transaction
+from utils.challenge_algos import fix_size_prize_logic, get_algorithm_params
+from utils.challenge_queries import CHALLENGE_VIEWER_FIELDS_QUERY, get_challenge_query_params
+from utils.loaders import get_engagement_stats
 from utils.thumbnail_link import get_thumbnail_link
 
 MODES = {
@@ -36,17 +39,23 @@ CHALLENGE_REPORT_STATES = {
     'W': 'Получено вознаграждение'
 }
 
+# состояния отчётов, учитываемые в счётчиках челленджа
+REPORTS_COUNTERS_STATES = {
+    'new_reports_count': ('S', 'F', 'R'),
+    'approved_reports_count': ('A', 'W'),
+}
+
 
 def reconfigure_challenges_queryset_into_dictionary(challenges: QuerySet, pk=False) -> List[Dict]:
     challenges_list = []
+    challenges = list(challenges)
+    challenges_stats = get_engagement_stats('challenge', (challenge.id for challenge in challenges))
     for challenge in challenges:
-        comments_amount = challenge.comments_amount
-        likes_amount = challenge.likes_amount
         data = {
             'id': challenge.id,
             'user_liked': challenge.user_liked,
-            'likes_amount': likes_amount if likes_amount is not None else 0,
-            'comments_amount': comments_amount if comments_amount is not None else 0,
+            'likes_amount': challenges_stats[challenge.id]['likes_amount'],
+            'comments_amount': challenges_stats[challenge.id]['comments_amount'],
             'name': challenge.name,
             'photo': challenge.photo.name,
             'updated_at': challenge.updated_at,
@@ -75,6 +84,32 @@ def reconfigure_challenges_queryset_into_dictionary(challenges: QuerySet, pk=Fal
     return challenges_list
 
 
+def set_challenges_viewer_fields(challenges: List[Dict], user_id: int) -> None:
+    """
+    Поля страницы челленджей, зависящие от пользователя (статус, признак новых отчётов, лайк),
+    одним запросом и счётчики лайков и комментариев страницы - для страниц из кэша списка
+    """
+    challenges_ids = [challenge['id'] for challenge in challenges]
+    if not challenges_ids:
+        return
+    viewer_fields = {challenge.id: challenge
+                     for challenge in Challenge.objects.raw(CHALLENGE_VIEWER_FIELDS_QUERY,
+                                                            get_challenge_query_params(user_id) + [challenges_ids])}
+    challenges_stats = get_engagement_stats('challenge', challenges_ids)
+    for challenge in challenges:
+        fields = viewer_fields.get(challenge['id'])
+        if fields is not None:
+            challenge.update({
+                'user_liked': fields.user_liked,
+                'is_new_reports': fields.is_new_reports,
+                'status': '' if fields.status is None else fields.status
+            })
+        challenge.update({
+            'likes_amount': challenges_stats[challenge['id']]['likes_amount'],
+            'comments_amount': challenges_stats[challenge['id']]['comments_amount']
+        })
+
+
 def add_annotated_fields_to_challenges(challenges: List[Dict]) -> None:
     for challenge in challenges:
         parameters = challenge.get('parameters')
@@ -143,14 +178,52 @@ def update_time(data: List[Dict], field: str) -> None:
 
 
 def check_if_new_reports_exists(user_id: int) -> bool:
-    from auth_app.models import ChallengeReport
-
-    new_reports_exists = (ChallengeReport.objects
-                          .filter(Q(challenge__creator_id=user_id) & Q(state__in=['S', 'F', 'R']))
+    new_reports_exists = (Challenge.objects
+                          .filter(Q(creator_id=user_id) & Q(new_reports_count__gt=0))
                           .exists())
     return new_reports_exists
 
 
+def change_challenge_reports_counters(challenge_id: int, old_state: Optional[str] = None,
+                                      new_state: Optional[str] = None) -> None:
+    """
+    Изменение счётчиков отчётов челленджа при создании отчёта или смене его состояния.
+    Вызывается в той же транзакции, что и запись состояния отчёта
+    """
+    deltas = {field: F(field) + delta
+              for field, delta in get_reports_counters_deltas([(old_state, new_state)]).items()}
+    if deltas:
+        Challenge.objects.filter(pk=challenge_id).update(**deltas)
+
+
+def get_reports_counters_deltas(transitions: Iterable[Tuple[Optional[str], Optional[str]]]) -> Dict[str, int]:
+    """
+    Изменения счётчиков отчётов челленджа по переходам состояний отчётов (старое состояние, новое)
+    """
+    deltas = {}
+    for old_state, new_state in transitions:
+        for state, delta in ((old_state, -1), (new_state, 1)):
+            for field, states in REPORTS_COUNTERS_STATES.items():
+                if state in states:
+                    deltas[field] = deltas.get(field, 0) + delta
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def get_challenge_prize(challenge: Challenge) -> Tuple[int, int]:
+    """
+    Максимальное количество победителей и размер награды из параметров челленджа
+    """
+    params = get_algorithm_params(fix_size_prize_logic, challenge.parameters)
+    return params[2], params[1]
+
+
+def set_challenge_user_status(challenge_id: int, user_id: int, **fields) -> None:
+    """
+    Обновление связи пользователя с челленджем, по которой строится статус в списке и карточке челленджа
+    """
+    ChallengeUserStatus.objects.update_or_create(challenge_id=challenge_id, user_id=user_id, defaults=fields)
+
+
 def set_names_to_null(participants: List[Dict]) -> None:
     for participant in participants:
         if participant.get('nickname') is not None:
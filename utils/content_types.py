@@ -0,0 +1,31 @@
+from typing import Dict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_migrate
+
+APP_LABEL = 'auth_app'
+
+_content_type_ids: Dict[str, int] = {}
+
+
+def get_content_type_id(model_name: str) -> int:
+    """
+    id типа объекта модели auth_app без обращения к django_content_type:
+    реестр заполняется одним запросом при первом обращении в процессе
+    """
+    if model_name not in _content_type_ids:
+        load_content_types()
+    return _content_type_ids[model_name]
+
+
+def load_content_types() -> None:
+    _content_type_ids.update(ContentType.objects
+                             .filter(app_label=APP_LABEL)
+                             .values_list('model', 'id'))
+
+
+def clear_content_types(**kwargs) -> None:
+    _content_type_ids.clear()
+
+
+post_migrate.connect(clear_content_types, dispatch_uid='clear_content_types_registry')
@@ -18,7 +18,7 @@ def get_current_periods_for_all_organizations():
     now = timezone.now()
     current_periods = set(Period.objects.filter(
         Q(start_date__lte=now) &
-        Q(end_date__gte=now)).values_list('id'))
+        Q(end_date__gte=now)).values_list('id', flat=True))
     return current_periods
 
 
@@ -0,0 +1,43 @@
+from typing import Dict, Optional
+
+from django.db.models.signals import post_delete, post_save
+
+from auth_app.models import EventTypes
+
+TRANSACTION_EVENT_TYPE = 'Новая публичная транзакция'
+INCOME_TRANSACTION_EVENT_TYPE = 'Входящая транзакция'
+CHALLENGE_EVENT_TYPE = 'Создан челлендж'
+WINNER_EVENT_TYPE = 'Новый победитель челленджа'
+
+_event_types: Optional[Dict[str, EventTypes]] = None
+
+
+def get_event_types() -> Dict[str, EventTypes]:
+    """
+    Типы событий по названию. Загружаются одним запросом при первом обращении в процессе
+    и сбрасываются при изменении типов событий
+    """
+    global _event_types
+    if _event_types is None:
+        _event_types = {event_type.name: event_type for event_type in EventTypes.objects.all()}
+    return _event_types
+
+
+def get_event_type(name: str) -> EventTypes:
+    event_type = get_event_types().get(name)
+    if event_type is None:
+        raise EventTypes.DoesNotExist(f"Не найден тип события '{name}'")
+    return event_type
+
+
+def get_event_type_id(name: str) -> int:
+    return get_event_type(name).pk
+
+
+def clear_event_types(**kwargs) -> None:
+    global _event_types
+    _event_types = None
+
+
+post_save.connect(clear_event_types, sender=EventTypes, dispatch_uid='clear_event_types_on_save')
+post_delete.connect(clear_event_types, sender=EventTypes, dispatch_uid='clear_event_types_on_delete')
@@ -9,3 +9,11 @@ def get_fcm_tokens_list(user_id):
 def get_multiple_users_tokens_list(users_id_list):
     return list(FCMToken.objects.filter(user_id__in=users_id_list)
                 .values_list('token', flat=True))
+
+
+def get_users_tokens_map(users_id_list):
+    tokens = {}
+    for user_id, token in (FCMToken.objects.filter(user_id__in=users_id_list)
+                           .values_list('user_id', 'token')):
+        tokens.setdefault(user_id, []).append(token)
+    return tokens
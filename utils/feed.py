@@ -0,0 +1,188 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection
+from django.db.models import F, Exists, OuterRef
+
+from auth_app.models import Event, FeedItem, Transaction, Challenge, ChallengeReport, Like
+from utils.challenges_logic import update_link_on_thumbnail, update_time
+from utils.content_types import get_content_type_id
+from utils.loaders import get_transactions_tags, get_engagement_stats
+from utils.paginates import paginate_queryset
+from utils.thumbnail_link import get_thumbnail_link
+
+logger = logging.getLogger(__name__)
+
+# селектор объекта события -> (модель объекта, ключ объекта в данных события)
+FEED_OBJECTS = {
+    'T': ('transaction', 'transaction'),
+    'Q': ('challenge', 'challenge'),
+    'R': ('challengereport', 'winner'),
+}
+
+FEED_ITEMS_LIKES_QUERY = """
+UPDATE feed_items AS f
+SET likes_amount = f.likes_amount + v.delta
+FROM (VALUES {values}) AS v (content_type_id, object_id, like_kind_id, delta)
+JOIN like_kind k ON (k.id = v.like_kind_id AND k.code = 'like')
+WHERE f.content_type_id = v.content_type_id AND f.object_id = v.object_id
+"""
+
+FEED_ITEMS_COMMENTS_QUERY = """
+UPDATE feed_items AS f
+SET comments_amount = f.comments_amount + v.delta
+FROM (VALUES {values}) AS v (content_type_id, object_id, delta)
+WHERE f.content_type_id = v.content_type_id AND f.object_id = v.object_id
+"""
+
+
+def create_feed_items(events: Iterable[Event]) -> List[FeedItem]:
+    """
+    Запись проекций событий ленты. Вызывается в той же транзакции, что и создание событий:
+    данные объектов и счётчики реакций собираются по одному запросу на тип объекта
+    """
+    events = [event for event in events
+              if event.object_selector in FEED_OBJECTS and event.event_object_id is not None]
+    object_ids = defaultdict(set)
+    for event in events:
+        object_ids[event.object_selector].add(event.event_object_id)
+    objects_data = {
+        'T': get_feed_transactions(object_ids['T']),
+        'Q': get_feed_challenges(object_ids['Q']),
+        'R': get_feed_winners(object_ids['R']),
+    }
+    stats = {selector: get_engagement_stats(FEED_OBJECTS[selector][0], ids) for selector, ids in object_ids.items()}
+    feed_items = []
+    for event in events:
+        object_data = objects_data[event.object_selector].get(event.event_object_id)
+        if object_data is None:
+            logger.warning(f"Не найден объект {event.object_selector} {event.event_object_id} "
+                           f"для события {event.pk}, событие не попадёт в ленту")
+            continue
+        event_stats = stats[event.object_selector][event.event_object_id]
+        data = event.to_json()
+        del data['time']
+        data[FEED_OBJECTS[event.object_selector][1]] = object_data
+        feed_items.append(FeedItem(event_id=event.pk,
+                                   scope_id=event.scope_id,
+                                   time=event.time,
+                                   content_type_id=get_content_type_id(FEED_OBJECTS[event.object_selector][0]),
+                                   object_id=event.event_object_id,
+                                   data=data,
+                                   likes_amount=event_stats['likes_amount'],
+                                   comments_amount=event_stats['comments_amount']))
+    return FeedItem.objects.bulk_create(feed_items, ignore_conflicts=True)
+
+
+def get_feed_items_data(scope_id: int, user_id: int, offset: int, limit: int,
+                        cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Страница ленты области видимости одним запросом по индексу (scope, time, id)
+    """
+    feed_items = (FeedItem.objects
+                  .filter(scope_id=scope_id)
+                  .annotate(user_liked=Exists(Like.objects
+                                              .filter(content_type_id=OuterRef('content_type_id'),
+                                                      object_id=OuterRef('object_id'),
+                                                      like_kind__code='like',
+                                                      is_liked=True,
+                                                      user_id=user_id)))
+                  .order_by('-time', '-event_id'))
+    page, next_cursor = paginate_queryset(feed_items, offset * limit, limit, cursor, time_field='time')
+    events_data = []
+    for feed_item in page:
+        item = {'id': feed_item.pk, 'time': feed_item.time + timedelta(hours=3), **feed_item.data}
+        item[FEED_OBJECTS[item['object_selector']][1]]['user_liked'] = feed_item.user_liked
+        item['likes_amount'] = feed_item.likes_amount
+        item['comments_amount'] = feed_item.comments_amount
+        events_data.append(item)
+    return events_data, next_cursor
+
+
+def change_feed_items_likes(cursor, deltas: List[Tuple[int, int, int, int]]) -> None:
+    """
+    Изменение счётчиков лайков в ленте, deltas - (content_type_id, object_id, like_kind_id, изменение)
+    """
+    if deltas:
+        cursor.execute(FEED_ITEMS_LIKES_QUERY.format(values=', '.join(['(%s, %s, %s, %s)'] * len(deltas))),
+                       [value for delta in deltas for value in delta])
+
+
+def change_feed_items_comments(cursor, deltas: List[Tuple[int, int, int]]) -> None:
+    """
+    Изменение счётчиков комментариев в ленте, deltas - (content_type_id, object_id, изменение)
+    """
+    if deltas:
+        cursor.execute(FEED_ITEMS_COMMENTS_QUERY.format(values=', '.join(['(%s, %s, %s)'] * len(deltas))),
+                       [value for delta in deltas for value in delta])
+
+
+def change_feed_item_comments_amount(content_type_id: int, object_id: int, delta: int) -> None:
+    with connection.cursor() as cursor:
+        change_feed_items_comments(cursor, [(content_type_id, object_id, delta)])
+
+
+def get_feed_transactions(transaction_ids: Iterable[int]) -> Dict[int, Dict]:
+    if not transaction_ids:
+        return {}
+    transactions = (Transaction.objects
+                    .select_related('sender__profile', 'recipient__profile')
+                    .filter(pk__in=transaction_ids)
+                    .only('id', 'amount', 'updated_at', 'sender_id', 'recipient_id', 'is_anonymous',
+                          'sender__profile__tg_name',
+                          'recipient__profile__tg_name',
+                          'recipient__profile__first_name',
+                          'recipient__profile__surname',
+                          'recipient__profile__photo'))
+    tags = get_transactions_tags(transaction_ids)
+    transactions_data = {}
+    for transaction in transactions:
+        recipient_photo = transaction.recipient.profile.get_photo_url()
+        transactions_data[transaction.pk] = {
+            "id": transaction.pk,
+            "amount": transaction.amount,
+            "updated_at": transaction.updated_at + timedelta(hours=3),
+            "sender_id": None if transaction.is_anonymous else transaction.sender_id,
+            "recipient_id": transaction.recipient_id,
+            "is_anonymous": transaction.is_anonymous,
+            "sender_tg_name": None if transaction.is_anonymous else transaction.sender.profile.tg_name,
+            "recipient_tg_name": transaction.recipient.profile.tg_name,
+            "recipient_first_name": transaction.recipient.profile.first_name,
+            "recipient_surname": transaction.recipient.profile.surname,
+            "recipient_photo": get_thumbnail_link(recipient_photo) if recipient_photo else None,
+            "tags": tags.get(transaction.pk, [])
+        }
+    return transactions_data
+
+
+def get_feed_challenges(challenge_ids: Iterable[int]) -> Dict[int, Dict]:
+    if not challenge_ids:
+        return {}
+    challenges = list(Challenge.objects
+                      .filter(pk__in=challenge_ids)
+                      .values('id', 'photo', 'created_at', 'name', 'creator_id', 'end_at',
+                              creator_first_name=F('creator__profile__first_name'),
+                              creator_surname=F('creator__profile__surname'),
+                              creator_tg_name=F('creator__profile__tg_name')))
+    update_link_on_thumbnail(challenges, 'photo')
+    update_time(challenges, 'created_at')
+    return {challenge['id']: challenge for challenge in challenges}
+
+
+def get_feed_winners(report_ids: Iterable[int]) -> Dict[int, Dict]:
+    if not report_ids:
+        return {}
+    winners = list(ChallengeReport.objects
+                   .filter(pk__in=report_ids)
+                   .values('id', 'updated_at', 'challenge_id',
+                           challenge_name=F('challenge__name'),
+                           winner_id=F('participant__user_participant_id'),
+                           winner_first_name=F('participant__user_participant__profile__first_name'),
+                           winner_surname=F('participant__user_participant__profile__surname'),
+                           winner_tg_name=F('participant__user_participant__profile__tg_name'),
+                           winner_photo=F('participant__user_participant__profile__photo')))
+    update_time(winners, 'updated_at')
+    update_link_on_thumbnail(winners, 'winner_photo')
+    return {winner['id']: winner for winner in winners}
@@ -0,0 +1,72 @@
+import json
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.utils.encoders import JSONEncoder
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+PAYLOAD_KEY = 'feed:payload:{object_type}:{pk}:{version}'
+PAYLOAD_STATS_KEY = 'feed:payload:stats'
+
+
+def get_payload_key(object_type: str, pk: int, updated_at: Optional[datetime]) -> str:
+    version = int(updated_at.timestamp() * 1000000) if updated_at is not None else 0
+    return PAYLOAD_KEY.format(object_type=object_type, pk=pk, version=version)
+
+
+def get_cached_payloads(object_type: str, versions: Dict[int, Optional[datetime]],
+                        build_payloads: Callable[[List[int]], Iterable[Dict]]) -> List[Dict]:
+    """
+    Не зависящие от пользователя данные объектов ленты из кэша по ключу (тип, id, время изменения).
+    versions - {id объекта: updated_at}; build_payloads собирает данные для не найденных в кэше id.
+    Данные возвращаются в том виде, в котором отдаются клиенту (после JSON-сериализации)
+    """
+    if not versions:
+        return []
+    keys = {pk: get_payload_key(object_type, pk, updated_at) for pk, updated_at in versions.items()}
+    client = get_redis()
+    try:
+        cached = dict(zip(keys, client.mget(list(keys.values()))))
+    except RedisError:
+        logger.exception("Кэш данных ленты недоступен")
+        return [render_payload(payload) for payload in build_payloads(list(versions))]
+    payloads = {pk: json.loads(value) for pk, value in cached.items() if value is not None}
+    missed = [pk for pk in versions if pk not in payloads]
+    pipeline = client.pipeline(transaction=False)
+    if missed:
+        for payload in build_payloads(missed):
+            payload = render_payload(payload)
+            payloads[payload['id']] = payload
+            pipeline.set(keys[payload['id']], json.dumps(payload), ex=settings.FEED_PAYLOAD_CACHE_TTL)
+    pipeline.hincrby(PAYLOAD_STATS_KEY, f'{object_type}:hits', len(versions) - len(missed))
+    pipeline.hincrby(PAYLOAD_STATS_KEY, f'{object_type}:misses', len(missed))
+    try:
+        pipeline.execute()
+    except RedisError:
+        logger.exception("Не удалось сохранить данные ленты в кэш")
+    return [payloads[pk] for pk in versions if pk in payloads]
+
+
+def render_payload(payload: Dict) -> Dict:
+    return json.loads(json.dumps(payload, cls=JSONEncoder))
+
+
+def get_payload_cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Попадания и промахи кэша данных ленты по типам объектов
+    """
+    counters = {key.decode(): int(value) for key, value in get_redis().hgetall(PAYLOAD_STATS_KEY).items()}
+    stats = {}
+    for key, value in counters.items():
+        object_type, counter = key.rsplit(':', 1)
+        stats.setdefault(object_type, {'hits': 0, 'misses': 0})[counter] = value
+    for object_stats in stats.values():
+        requests = object_stats['hits'] + object_stats['misses']
+        object_stats['hit_rate'] = round(object_stats['hits'] / requests, 4) if requests else 0
+    return stats
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import logging
+from functools import wraps
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def idempotent(func):
+    """
+    Обработка заголовка Idempotency-Key для POST-запросов.
+    Успешный ответ сохраняется в Redis на IDEMPOTENCY_KEY_TTL секунд, повторный запрос
+    с тем же ключом от того же пользователя получает сохранённый ответ без обращения к базе.
+    Пока первый запрос не завершён, повторные получают 409. Вместе с ключом хранится хэш тела запроса:
+    повтор ключа с другим телом получает 422, а не чужой сохранённый ответ
+    """
+    @wraps(func)
+    def inner_func(view, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return func(view, request, *args, **kwargs)
+        redis_key = f"idempotency:{request.user.pk}:{request.path}:{key}"
+        request_hash = get_request_hash(request)
+        try:
+            client = get_redis()
+            if not client.set(redis_key, json.dumps({'hash': request_hash}), nx=True,
+                              ex=settings.IDEMPOTENCY_KEY_TTL):
+                stored = json.loads(client.get(redis_key) or '{}')
+                if stored.get('hash', request_hash) != request_hash:
+                    logger.info(f"Ключ идемпотентности {key} повторно использован для другого запроса {request.path}")
+                    return Response("Ключ идемпотентности уже использован для запроса с другими данными",
+                                    status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if 'status' in stored:
+                    logger.info(f"Повторный запрос {request.path} от {request.user} с ключом {key}")
+                    response = Response(stored['data'], status=stored['status'])
+                    response['Idempotent-Replayed'] = 'true'
+                    return response
+                return Response("Запрос с таким ключом идемпотентности уже обрабатывается",
+                                status=status.HTTP_409_CONFLICT)
+        except RedisError as error:
+            logger.error(f"Ключ идемпотентности не проверен, Redis недоступен: {error}")
+            return func(view, request, *args, **kwargs)
+        try:
+            response = func(view, request, *args, **kwargs)
+        except Exception:
+            _forget(redis_key)
+            raise
+        if status.is_success(response.status_code):
+            try:
+                client.set(redis_key,
+                           json.dumps({'hash': request_hash, 'status': response.status_code, 'data': response.data},
+                                      cls=JSONEncoder),
+                           ex=settings.IDEMPOTENCY_KEY_TTL)
+            except RedisError as error:
+                logger.error(f"Не удалось сохранить ответ по ключу идемпотентности: {error}")
+        else:
+            _forget(redis_key)
+        return response
+    return inner_func
+
+
+def get_request_hash(request) -> str:
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = {key: values for key, values in data.lists()}
+    # файлы учитываются по имени
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _forget(redis_key):
+    try:
+        get_redis().delete(redis_key)
+    except RedisError as error:
+        logger.error(f"Не удалось удалить ключ идемпотентности: {error}")
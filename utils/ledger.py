@@ -0,0 +1,117 @@
+import logging
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from auth_app.models import AccountSnapshot, LedgerEntry
+
+logger = logging.getLogger(__name__)
+
+# записи моложе этого интервала не сворачиваются, чтобы не пропустить ещё не закоммиченные записи с меньшими id
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+LEDGER_DISCREPANCIES_QUERY = """
+SELECT "accounts"."id", "accounts"."amount", "s"."amount" + COALESCE("t"."delta", 0)
+FROM accounts
+JOIN (
+  SELECT DISTINCT ON ("account_id") "account_id", "amount", "last_entry_id"
+  FROM account_snapshots
+  ORDER BY "account_id", "last_entry_id" DESC
+) s ON ("s"."account_id" = "accounts"."id")
+LEFT JOIN LATERAL (
+  SELECT SUM("e"."amount") AS "delta"
+  FROM ledger_entries e
+  WHERE "e"."account_id" = "accounts"."id" AND "e"."id" > "s"."last_entry_id"
+) t ON true
+WHERE "accounts"."amount" <> "s"."amount" + COALESCE("t"."delta", 0)
+"""
+
+
+def write_ledger_entries(entries: Iterable[Tuple[int, Decimal, Optional[int]]]) -> None:
+    """
+    Запись изменений балансов в журнал одним запросом.
+    entries - последовательность (id счёта, изменение суммы, id транзакции)
+    """
+    LedgerEntry.objects.bulk_create([
+        LedgerEntry(account_id=account_id, amount=amount, transaction_id=transaction_id)
+        for account_id, amount, transaction_id in entries if amount])
+
+
+def get_accounts_balances(account_ids: List[int], moment: Optional[datetime] = None) -> Dict[int, Decimal]:
+    """
+    Балансы счетов по журналу: последний снимок плюс записи журнала после него.
+    Если передан moment, возвращаются балансы на этот момент времени.
+    Счета без снимков созданы после появления журнала с нулевым балансом и считаются с нуля;
+    счета, у которых все снимки сделаны позже moment, в результат не попадают
+    """
+    snapshots = AccountSnapshot.objects.filter(account_id__in=account_ids)
+    if moment is not None:
+        snapshots = snapshots.filter(created_at__lte=moment)
+    baselines = {snapshot.account_id: (snapshot.amount, snapshot.last_entry_id)
+                 for snapshot in snapshots
+                 .only('account_id', 'amount', 'last_entry_id')
+                 .order_by('account_id', '-last_entry_id')
+                 .distinct('account_id')}
+    without_snapshots = set(account_ids) - baselines.keys()
+    if moment is not None and without_snapshots:
+        without_snapshots -= set(AccountSnapshot.objects
+                                 .filter(account_id__in=without_snapshots)
+                                 .values_list('account_id', flat=True))
+    baselines.update({account_id: (0, 0) for account_id in without_snapshots})
+    if not baselines:
+        return {}
+    tail_filter = Q()
+    for account_id, (amount, last_entry_id) in baselines.items():
+        tail_filter |= Q(account_id=account_id, id__gt=last_entry_id)
+    tail = LedgerEntry.objects.filter(tail_filter)
+    if moment is not None:
+        tail = tail.filter(created_at__lte=moment)
+    deltas = dict(tail.values('account_id').annotate(delta=Sum('amount')).values_list('account_id', 'delta'))
+    return {account_id: amount + deltas.get(account_id, 0)
+            for account_id, (amount, last_entry_id) in baselines.items()}
+
+
+def make_accounts_snapshots() -> int:
+    """
+    Свёртка новых записей журнала в снимки балансов.
+    Снимок создаётся только для счетов, по которым были записи после предыдущей свёртки
+    """
+    with transaction.atomic():
+        watermark_from = AccountSnapshot.objects.aggregate(value=Max('last_entry_id')).get('value') or 0
+        watermark_to = (LedgerEntry.objects
+                        .filter(created_at__lte=timezone.now() - SNAPSHOT_LAG)
+                        .aggregate(value=Max('id')).get('value'))
+        if watermark_to is None or watermark_to <= watermark_from:
+            return 0
+        deltas = dict(LedgerEntry.objects
+                      .filter(id__gt=watermark_from, id__lte=watermark_to)
+                      .values('account_id')
+                      .annotate(delta=Sum('amount'))
+                      .values_list('account_id', 'delta'))
+        previous_amounts = {snapshot.account_id: snapshot.amount
+                            for snapshot in AccountSnapshot.objects
+                            .filter(account_id__in=deltas.keys())
+                            .only('account_id', 'amount')
+                            .order_by('account_id', '-last_entry_id')
+                            .distinct('account_id')}
+        AccountSnapshot.objects.bulk_create([
+            AccountSnapshot(account_id=account_id,
+                            amount=previous_amounts.get(account_id, 0) + delta,
+                            last_entry_id=watermark_to)
+            for account_id, delta in deltas.items()])
+        return len(deltas)
+
+
+def get_ledger_discrepancies() -> Iterator[Tuple[int, Decimal, Decimal]]:
+    """
+    Сверка балансов счетов с журналом одним потоковым запросом.
+    Возвращает (id счёта, баланс счёта, баланс по журналу) для расходящихся счетов
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LEDGER_DISCREPANCIES_QUERY)
+        while rows := cursor.fetchmany(1000):
+            yield from rows
@@ -0,0 +1,51 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List
+
+from django.db.models import F
+
+from auth_app.models import ObjectTag, LikeStatistics, LikeCommentStatistics
+from utils.content_types import get_content_type_id
+
+
+def get_transactions_tags(transaction_ids: Iterable[int]) -> Dict[int, List[Dict]]:
+    """
+    Ценности транзакций страницы одним запросом: {id транзакции: [{'tag_id', 'name'}]}
+    """
+    transaction_ids = set(transaction_ids)
+    tags = defaultdict(list)
+    if not transaction_ids:
+        return tags
+    for object_tag in (ObjectTag.objects
+                       .filter(tagged_object_id__in=transaction_ids)
+                       .order_by('pk')
+                       .values('tagged_object_id', 'tag_id', name=F('tag__name'))):
+        tags[object_tag.pop('tagged_object_id')].append(object_tag)
+    return tags
+
+
+def get_engagement_stats(model_name: str, object_ids: Iterable[int]) -> Dict[int, Dict]:
+    """
+    Реакции и количество комментариев объектов страницы двумя запросами по content_type_id:
+    {id объекта: {'reactions': [{'id', 'code', 'counter'}], 'likes_amount', 'comments_amount'}}
+    """
+    object_ids = set(object_ids)
+    stats = {object_id: {'reactions': [], 'likes_amount': 0, 'comments_amount': 0} for object_id in object_ids}
+    if not object_ids:
+        return stats
+    content_type_id = get_content_type_id(model_name)
+    for statistic in (LikeStatistics.objects
+                      .select_related('like_kind')
+                      .filter(content_type_id=content_type_id, object_id__in=object_ids)
+                      .only('id', 'object_id', 'like_counter', 'like_kind__code')
+                      .order_by('pk')):
+        object_stats = stats[statistic.object_id]
+        object_stats['reactions'].append({'id': statistic.id,
+                                          'code': statistic.like_kind.code,
+                                          'counter': statistic.like_counter})
+        if statistic.like_kind.code == 'like':
+            object_stats['likes_amount'] = statistic.like_counter
+    for object_id, comment_counter in (LikeCommentStatistics.objects
+                                       .filter(content_type_id=content_type_id, object_id__in=object_ids)
+                                       .values_list('object_id', 'comment_counter')):
+        stats[object_id]['comments_amount'] = comment_counter
+    return stats
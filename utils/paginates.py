@@ -1,5 +1,14 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from django.db.models import Q
 from rest_framework.exceptions import ValidationError
 
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
 
 def process_offset_and_limit(offset, limit):
     if offset is None and limit is None:
@@ -15,3 +24,66 @@ def process_offset_and_limit(offset, limit):
         return offset - 1 if offset > 0 else 0, limit
     except ValueError:
         raise ValidationError('Передайте числами параметры offset и limit')
+
+
+def process_cursor_offset_and_limit(cursor, offset, limit):
+    """
+    Параметры пагинации списка: при переданном курсоре offset не обязателен и не используется
+    """
+    if cursor:
+        offset, limit = process_offset_and_limit(1, limit if limit is not None else 20)
+        return cursor, offset, limit
+    offset, limit = process_offset_and_limit(offset, limit)
+    return None, offset, limit
+
+
+def encode_cursor(time: Optional[datetime], pk: int) -> str:
+    """
+    Непрозрачный курсор на позицию в списке, упорядоченном по (time, id)
+    """
+    value = json.dumps([time.isoformat() if time is not None else None, pk])
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        time, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (datetime.fromisoformat(time) if time is not None else None), int(pk)
+    except (binascii.Error, ValueError, TypeError):
+        raise ValidationError('Передан некорректный cursor')
+
+
+def paginate_queryset(queryset, start: int, limit: int, cursor: Optional[str] = None,
+                      time_field: Optional[str] = None, descending: bool = True) -> Tuple[List[Any], Optional[str]]:
+    """
+    Страница списка по курсору (keyset по (time_field, id)) либо, если курсора нет, по смещению start.
+    queryset должен быть упорядочен по (time_field, id) в направлении descending.
+    Возвращает элементы страницы и курсор следующей страницы
+    """
+    if cursor:
+        time, pk = decode_cursor(cursor)
+        lookup = 'lt' if descending else 'gt'
+        if time_field is not None and time is not None:
+            queryset = queryset.filter(Q(**{f'{time_field}__{lookup}': time}) |
+                                       Q(**{time_field: time, f'pk__{lookup}': pk}))
+        else:
+            queryset = queryset.filter(**{f'pk__{lookup}': pk})
+        page = list(queryset[:limit])
+    else:
+        page = list(queryset[start:start + limit])
+    return page, get_next_cursor(page, limit, time_field)
+
+
+def get_next_cursor(page: List[Any], limit: int, time_field: Optional[str] = None) -> Optional[str]:
+    if not page or len(page) < limit:
+        return None
+    last = page[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last.get(time_field) if time_field else None, last['id'])
+    return encode_cursor(getattr(last, time_field) if time_field else None, last.pk)
+
+
+def set_next_cursor(response, next_cursor: Optional[str]):
+    if next_cursor is not None:
+        response[NEXT_CURSOR_HEADER] = next_cursor
+    return response
@@ -0,0 +1,180 @@
+import logging
+import uuid
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from redis.exceptions import LockError
+
+from utils.feed import change_feed_items_likes, change_feed_items_comments
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+LIKE_DELTAS_KEY = 'reactions:likes'
+COMMENT_DELTAS_KEY = 'reactions:comments'
+
+FLUSH_CHUNK_SIZE = 1000
+# по истечении блокировки сброс может начать другой воркер; повторно хэш не запишется благодаря batch_id
+FLUSH_LOCK_TIMEOUT = 5 * 60
+
+START_FLUSH_QUERY = """
+INSERT INTO reaction_counters_flushes (batch_id, applied_at) VALUES (%s, now())
+ON CONFLICT (batch_id) DO NOTHING
+"""
+
+DELETE_OLD_FLUSHES_QUERY = """
+DELETE FROM reaction_counters_flushes WHERE applied_at < now() - interval '1 day'
+"""
+
+FLUSH_LIKES_QUERY = """
+INSERT INTO like_statistics (content_type_id, object_id, like_kind_id, like_counter, last_change_at)
+VALUES {values}
+ON CONFLICT (content_type_id, object_id, like_kind_id) DO UPDATE
+SET like_counter = like_statistics.like_counter + EXCLUDED.like_counter,
+    last_change_at = EXCLUDED.last_change_at
+"""
+
+TOUCH_LIKE_COMMENT_STATISTICS_QUERY = """
+INSERT INTO like_comment_statistics (content_type_id, object_id, last_like_or_comment_change_at, comment_counter)
+VALUES {values}
+ON CONFLICT (content_type_id, object_id) DO UPDATE
+SET last_like_or_comment_change_at = EXCLUDED.last_like_or_comment_change_at
+"""
+
+FLUSH_COMMENTS_QUERY = """
+UPDATE like_comment_statistics AS s
+SET comment_counter = s.comment_counter + v.delta
+FROM (VALUES {values}) AS v (content_type_id, object_id, delta)
+WHERE s.content_type_id = v.content_type_id AND s.object_id = v.object_id
+"""
+
+
+def is_write_behind_enabled() -> bool:
+    return settings.REACTION_COUNTERS_WRITE_BEHIND
+
+
+def add_like_deltas(content_type_id: int, object_id: int, deltas: Dict[int, int]) -> None:
+    """
+    Накопление изменений счётчиков лайков в Redis после фиксации транзакции
+    """
+    def push():
+        pipeline = get_redis().pipeline()
+        for like_kind_id, delta in deltas.items():
+            pipeline.hincrby(LIKE_DELTAS_KEY, f"{content_type_id}:{object_id}:{like_kind_id}", delta)
+        pipeline.execute()
+    transaction.on_commit(push)
+
+
+def add_comment_delta(content_type_id: int, object_id: int, delta: int) -> None:
+    """
+    Накопление изменения счётчика комментариев в Redis после фиксации транзакции
+    """
+    transaction.on_commit(
+        lambda: get_redis().hincrby(COMMENT_DELTAS_KEY, f"{content_type_id}:{object_id}", delta))
+
+
+def get_pending_like_deltas(keys: Iterable[Tuple[int, int, int]]) -> Dict[Tuple[int, int, int], int]:
+    """
+    Ещё не сброшенные в базу изменения счётчиков лайков по ключам (content_type_id, object_id, like_kind_id)
+    """
+    return _get_pending_deltas(LIKE_DELTAS_KEY, list(keys))
+
+
+def get_pending_comment_deltas(keys: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], int]:
+    """
+    Ещё не сброшенные в базу изменения счётчиков комментариев по ключам (content_type_id, object_id)
+    """
+    return _get_pending_deltas(COMMENT_DELTAS_KEY, list(keys))
+
+
+def _get_pending_deltas(redis_key, keys: List[tuple]) -> Dict[tuple, int]:
+    if not is_write_behind_enabled() or not keys:
+        return {}
+    fields = [':'.join(map(str, key)) for key in keys]
+    # изменения из сбрасываемого хэша ещё не в базе; между фиксацией сброса и удалением хэша
+    # они на короткое время учитываются дважды
+    pipeline = get_redis().pipeline(transaction=False)
+    pipeline.hmget(redis_key, fields)
+    pipeline.hmget(f"{redis_key}:flushing", fields)
+    values, flushing_values = pipeline.execute()
+    return {key: int(value or 0) + int(flushing_value or 0)
+            for key, value, flushing_value in zip(keys, values, flushing_values)
+            if value is not None or flushing_value is not None}
+
+
+def flush_reaction_counters() -> Tuple[int, int]:
+    """
+    Сброс накопленных изменений счётчиков в like_statistics и like_comment_statistics.
+    Хэш атомарно переименовывается вместе с записью идентификатора сброса, поэтому новые изменения
+    копятся в новом хэше. Идентификатор сохраняется в reaction_counters_flushes в той же транзакции,
+    что и счётчики, поэтому хэш, оставшийся после ошибки или падения воркера, записывается
+    при следующем сбросе, но не больше одного раза
+    """
+    return _flush(LIKE_DELTAS_KEY, _write_like_deltas), _flush(COMMENT_DELTAS_KEY, _write_comment_deltas)
+
+
+def _write_like_deltas(cursor, chunk):
+    cursor.execute(FLUSH_LIKES_QUERY.format(values=', '.join(['(%s, %s, %s, %s, now())'] * len(chunk))),
+                   [value for key, delta in chunk for value in (*key, delta)])
+    change_feed_items_likes(cursor, [(*key, delta) for key, delta in chunk])
+    objects = {tuple(key[:2]) for key, delta in chunk}
+    cursor.execute(TOUCH_LIKE_COMMENT_STATISTICS_QUERY.format(values=', '.join(['(%s, %s, now(), 0)'] * len(objects))),
+                   [value for key in sorted(objects) for value in key])
+
+
+def _write_comment_deltas(cursor, chunk):
+    cursor.execute(FLUSH_COMMENTS_QUERY.format(values=', '.join(['(%s, %s, %s)'] * len(chunk))),
+                   [value for key, delta in chunk for value in (*key, delta)])
+    change_feed_items_comments(cursor, [(*key, delta) for key, delta in chunk])
+
+
+def _flush(redis_key, write_chunk) -> int:
+    client = get_redis()
+    lock = client.lock(f"{redis_key}:flush_lock", timeout=FLUSH_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        # сброс уже выполняется другим воркером
+        return 0
+    try:
+        return _flush_locked(client, redis_key, write_chunk)
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            logger.warning(f"Блокировка сброса счётчиков {redis_key} истекла до окончания сброса")
+
+
+def _flush_locked(client, redis_key, write_chunk) -> int:
+    flushing_key = f"{redis_key}:flushing"
+    batch_key = f"{redis_key}:flushing:batch"
+    batch_id = client.get(batch_key)
+    if batch_id is None:
+        if not client.exists(redis_key):
+            # изменений с прошлого сброса не было
+            return 0
+        batch_id = uuid.uuid4().hex
+        pipeline = client.pipeline()
+        pipeline.rename(redis_key, flushing_key)
+        pipeline.set(batch_key, batch_id)
+        pipeline.execute()
+    else:
+        batch_id = batch_id.decode()
+        logger.warning(f"Найдены несброшенные счётчики реакций в {flushing_key}")
+    deltas = [(list(map(int, field.split(b':'))), int(delta))
+              for field, delta in client.hgetall(flushing_key).items() if int(delta)]
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(START_FLUSH_QUERY, [batch_id])
+            if cursor.rowcount:
+                for i in range(0, len(deltas), FLUSH_CHUNK_SIZE):
+                    write_chunk(cursor, deltas[i:i + FLUSH_CHUNK_SIZE])
+            else:
+                # хэш уже записан в базу, но не был удалён из Redis
+                logger.warning(f"Счётчики реакций из {flushing_key} уже записаны в базу")
+            cursor.execute(DELETE_OLD_FLUSHES_QUERY)
+    except Exception:
+        logger.exception(f"Не удалось сбросить счётчики реакций из {redis_key}, "
+                         f"изменения будут записаны при следующем сбросе")
+        raise
+    client.delete(flushing_key, batch_key)
+    return len(deltas)
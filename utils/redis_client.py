@@ -0,0 +1,14 @@
+import redis
+from django.conf import settings
+
+_redis_client = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Общее подключение к Redis (по умолчанию тот же инстанс, что и брокер Celery)
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return _redis_client
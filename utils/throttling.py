@@ -0,0 +1,117 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from redis.exceptions import RedisError
+from rest_framework.throttling import BaseThrottle
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# KEYS - ключи корзин, ARGV - тройки (ёмкость, скорость пополнения в секунду, время хранения ключа).
+# Токен списывается сразу из всех корзин и только если во всех он есть.
+# Возвращает {1, 0} при успехе либо {0, секунд до появления токена}
+TOKEN_BUCKET_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local capacity = tonumber(ARGV[i * 3 - 2])
+  local rate = tonumber(ARGV[i * 3 - 1])
+  local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+  local amount = tonumber(bucket[1]) or capacity
+  local ts = tonumber(bucket[2]) or now
+  amount = math.min(capacity, amount + math.max(0, now - ts) * rate)
+  tokens[i] = amount
+  if amount < 1 then
+    wait = math.max(wait, (1 - amount) / rate)
+  end
+end
+if wait > 0 then
+  return {0, tostring(wait)}
+end
+for i, key in ipairs(KEYS) do
+  redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+  redis.call('EXPIRE', key, tonumber(ARGV[i * 3]))
+end
+return {1, '0'}
+"""
+
+THROTTLE_STATS_KEY = 'throttle:stats:{scope}'
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+_token_bucket_script = None
+
+
+def parse_rate(rate: str) -> Tuple[int, float]:
+    """
+    Разбор ограничения вида "20/min" в ёмкость корзины и скорость пополнения (токенов в секунду)
+    """
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def get_throttle_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Счётчики пропущенных и отклонённых запросов по всем настроенным ограничениям
+    """
+    client = get_redis()
+    stats = {}
+    for scope in settings.THROTTLE_RATES:
+        counters = client.hgetall(THROTTLE_STATS_KEY.format(scope=scope))
+        stats[scope] = {'allowed': int(counters.get(b'allowed', 0)),
+                        'throttled': int(counters.get(b'throttled', 0))}
+    return stats
+
+
+class RedisTokenBucketThrottle(BaseThrottle):
+    """
+    Ограничение частоты запросов по алгоритму token bucket в Redis.
+    Область ограничения задаётся атрибутом throttle_scope представления, ограничения
+    для пользователя и для организации в целом - в settings.THROTTLE_RATES
+    """
+
+    def __init__(self):
+        self.wait_seconds: Optional[float] = None
+
+    def allow_request(self, request, view):
+        global _token_bucket_script
+
+        scope = getattr(view, 'throttle_scope', None)
+        rates = settings.THROTTLE_RATES.get(scope)
+        if not rates or not request.user.is_authenticated:
+            return True
+        keys, args = [], []
+        if 'user' in rates:
+            keys.append(f"throttle:{scope}:user:{request.user.pk}")
+            args.extend(self.get_bucket_args(rates['user']))
+        if 'organization' in rates:
+            organization_id = request.user.profile.organization_id
+            keys.append(f"throttle:{scope}:organization:{organization_id}")
+            args.extend(self.get_bucket_args(rates['organization']))
+        try:
+            client = get_redis()
+            if _token_bucket_script is None:
+                _token_bucket_script = client.register_script(TOKEN_BUCKET_SCRIPT)
+            allowed, wait = _token_bucket_script(keys=keys, args=args)
+            client.hincrby(THROTTLE_STATS_KEY.format(scope=scope), 'allowed' if allowed else 'throttled')
+        except RedisError as error:
+            logger.error(f"Ограничение частоты запросов {scope} не проверено, Redis недоступен: {error}")
+            return True
+        if not allowed:
+            self.wait_seconds = float(wait)
+            logger.info(f"Превышена частота запросов {scope} пользователем {request.user}")
+            return False
+        return True
+
+    @classmethod
+    def get_bucket_args(cls, rate):
+        capacity, refill_rate = parse_rate(rate)
+        return [capacity, refill_rate, int(capacity / refill_rate) + 1]
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,144 @@
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from redis.exceptions import RedisError
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+ORGANIZATION_TIMELINE_KEY = 'timeline:organization:{organization_id}'
+USER_TIMELINE_KEY = 'timeline:user:{user_id}'
+READY_SUFFIX = ':ready'
+
+# статусы транзакций, которые показываются в ленте
+FEED_STATUSES = ('A', 'R')
+
+
+def is_fanout_enabled() -> bool:
+    return settings.FEED_FANOUT_ENABLED
+
+
+def get_user_timeline_key(user_id: int) -> str:
+    return USER_TIMELINE_KEY.format(user_id=user_id)
+
+
+def get_organization_timeline_key(organization_id: int) -> str:
+    return ORGANIZATION_TIMELINE_KEY.format(organization_id=organization_id)
+
+
+def push_transactions_to_timelines(transactions: Iterable) -> None:
+    """
+    Раздача транзакций в ленты: публичные - в ленту организации отправителя, все - в ленту получателя.
+    Запись в Redis выполняется после фиксации транзакции в БД; ленты ограничены FEED_TIMELINE_SIZE
+    и удаляются через FEED_TIMELINE_TTL секунд после последнего добавления
+    """
+    if not is_fanout_enabled():
+        return
+    transactions = [_transaction for _transaction in transactions
+                    if _transaction.status in FEED_STATUSES and _transaction.updated_at is not None]
+    organizations = _get_senders_organizations([_transaction.sender_id for _transaction in transactions
+                                                if _transaction.is_public])
+    timelines = defaultdict(dict)
+    for _transaction in transactions:
+        score = _transaction.updated_at.timestamp()
+        # у наград и возвратов из челленджей получатель задан только счётом
+        if _transaction.recipient_id is not None:
+            timelines[get_user_timeline_key(_transaction.recipient_id)][_transaction.pk] = score
+        organization_id = organizations.get(_transaction.sender_id)
+        if _transaction.is_public and organization_id is not None:
+            timelines[get_organization_timeline_key(organization_id)][_transaction.pk] = score
+    if timelines:
+        transaction.on_commit(lambda: _add_to_timelines(timelines))
+
+
+def _add_to_timelines(timelines: Dict[str, Dict[int, float]]) -> None:
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for key, mapping in timelines.items():
+            pipeline.zadd(key, mapping)
+            pipeline.zremrangebyrank(key, 0, -settings.FEED_TIMELINE_SIZE - 1)
+            _expire_timeline(pipeline, key)
+        pipeline.execute()
+    except RedisError:
+        logger.exception("Не удалось добавить транзакции в ленты пользователей")
+
+
+def _expire_timeline(pipeline, key: str) -> None:
+    # лента и отметка о её построении истекают одновременно, иначе неполная лента сочлась бы построенной
+    pipeline.expire(key, settings.FEED_TIMELINE_TTL)
+    pipeline.expire(key + READY_SUFFIX, settings.FEED_TIMELINE_TTL)
+
+
+def _get_senders_organizations(senders_ids: List[int]) -> Dict[int, int]:
+    from auth_app.models import Profile
+
+    if not senders_ids:
+        return {}
+    return dict(Profile.objects.filter(user_id__in=set(senders_ids)).values_list('user_id', 'organization_id'))
+
+
+def get_timeline_transaction_ids(user_id: int, organization_id: int, offset: int, limit: int) -> Optional[List[int]]:
+    """
+    id транзакций страницы ленты пользователя по объединению ленты организации и личной ленты.
+    Не построенные ленты заполняются из БД. Возвращает None, если страница выходит
+    за пределы хранимых лент или Redis недоступен, - тогда ленту нужно читать из БД
+    """
+    end = offset * limit + limit
+    if end > settings.FEED_TIMELINE_SIZE:
+        return None
+    try:
+        timelines = {get_organization_timeline_key(organization_id): {'organization_id': organization_id},
+                     get_user_timeline_key(user_id): {'recipient_id': user_id}}
+        _build_timelines(timelines)
+        pipeline = get_redis().pipeline(transaction=False)
+        for key in timelines:
+            pipeline.zrevrange(key, 0, end - 1, withscores=True)
+        entries = {}
+        for timeline in pipeline.execute():
+            for member, score in timeline:
+                entries[int(member)] = score
+    except RedisError:
+        logger.exception(f"Не удалось прочитать ленту пользователя {user_id} из Redis")
+        return None
+    ordered = sorted(entries.items(), key=lambda item: (item[1], item[0]), reverse=True)
+    return [pk for pk, score in ordered[offset * limit:end]]
+
+
+def _build_timelines(timelines: Dict[str, Dict[str, int]]) -> None:
+    """
+    Заполнение из БД лент, которые ещё не построены. timelines - {ключ ленты: фильтр транзакций ленты}
+    """
+    client = get_redis()
+    ready = client.mget([key + READY_SUFFIX for key in timelines])
+    for (key, source), is_ready in zip(timelines.items(), ready):
+        if is_ready:
+            continue
+        entries = _get_timeline_entries_from_db(**source)
+        pipeline = client.pipeline()
+        if entries:
+            # без удаления: транзакции, добавленные во время построения, сохраняются
+            pipeline.zadd(key, entries)
+            pipeline.zremrangebyrank(key, 0, -settings.FEED_TIMELINE_SIZE - 1)
+        pipeline.set(key + READY_SUFFIX, 1)
+        _expire_timeline(pipeline, key)
+        pipeline.execute()
+
+
+def _get_timeline_entries_from_db(organization_id: Optional[int] = None,
+                                  recipient_id: Optional[int] = None) -> Dict[int, float]:
+    from auth_app.models import Transaction
+
+    transactions = Transaction.objects.filter(status__in=FEED_STATUSES)
+    if recipient_id is None:
+        transactions = transactions.filter(is_public=True, sender__profile__organization_id=organization_id)
+    else:
+        transactions = transactions.filter(recipient_id=recipient_id)
+    return {pk: updated_at.timestamp()
+            for pk, updated_at in (transactions
+                                   .exclude(updated_at=None)
+                                   .order_by('-updated_at', '-id')
+                                   .values_list('id', 'updated_at')[:settings.FEED_TIMELINE_SIZE])}